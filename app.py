@@ -1,18 +1,22 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import plotly.express as px
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
 import io
 import asyncio
 from pathlib import Path
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from threading import Thread
+from urllib.parse import urlparse
 import requests
-from openai import OpenAI
-from google.oauth2.service_account import Credentials
-import gspread
+
+import metrics
+from config import ConfigManager, definir_notificador
+from exporter import FORMATOS
+from load_generator import CORPUS_PADRAO, LoadGenerator
+from chart_data import barras_subcategoria, serie_temporal
+from rollup import MonthlyRollup
+from services import AIFinanceAssistant, DataManager, UserManager
+from webhook import iniciar_em_thread
 
 # Configuração inicial do Streamlit
 st.set_page_config(
@@ -22,506 +26,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Inicialização do Flask
-flask_app = Flask(__name__)
-CORS(flask_app)
-
-# Definição das categorias estilo Cerbasi
-CATEGORIAS = {
-    "moradia": {
-        "subcategorias": [
-            "aluguel",
-            "condomínio",
-            "luz",
-            "água",
-            "gás",
-            "internet",
-            "iptu",
-            "manutenção"
-        ]
-    },
-    "alimentacao": {
-        "subcategorias": [
-            "supermercado",
-            "restaurante",
-            "delivery",
-            "padaria"
-        ]
-    },
-    "transporte": {
-        "subcategorias": [
-            "combustível",
-            "estacionamento",
-            "manutenção",
-            "uber/99",
-            "transporte público",
-            "ipva"
-        ]
-    },
-    "saude": {
-        "subcategorias": [
-            "plano de saúde",
-            "medicamentos",
-            "consultas",
-            "exames",
-            "academia"
-        ]
-    },
-    "educacao": {
-        "subcategorias": [
-            "mensalidade",
-            "material",
-            "cursos",
-            "livros"
-        ]
-    },
-    "lazer": {
-        "subcategorias": [
-            "streaming",
-            "restaurantes",
-            "cinema/teatro",
-            "viagens",
-            "hobbies"
-        ]
-    },
-    "financeiro": {
-        "subcategorias": [
-            "investimentos",
-            "seguros",
-            "empréstimos",
-            "cartão de crédito"
-        ]
-    }
-}
-
-class ConfigManager:
-    """Gerencia as configurações e secrets do aplicativo"""
-    @staticmethod
-    def get_secret(key: str, default: str = None) -> str:
-        """Recupera um secret de forma segura"""
-        try:
-            return st.secrets.secrets[key]
-        except Exception as e:
-            if default:
-                return default
-            st.error(f"Erro ao acessar {key}: {str(e)}")
-            return None
-
-    @staticmethod
-    def send_whatsapp_message(phone_number: str, message: str) -> bool:
-        """Envia mensagem usando a API do WhatsApp"""
-        try:
-            token = ConfigManager.get_secret("WHATSAPP_TOKEN")
-            phone_number_id = ConfigManager.get_secret("PHONE_NUMBER_ID")
-            
-            url = f"https://graph.facebook.com/v17.0/{phone_number_id}/messages"
-            
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "messaging_product": "whatsapp",
-                "to": phone_number,
-                "type": "text",
-                "text": {"body": message}
-            }
-            
-            response = requests.post(url, headers=headers, json=data)
-            return response.status_code == 200
-            
-        except Exception as e:
-            st.error(f"Erro ao enviar mensagem WhatsApp: {str(e)}")
-            return False
+# Na interface os secrets vêm do Streamlit e os erros também aparecem na tela
+ConfigManager.definir_fonte_secrets(lambda: st.secrets.secrets)
 
-    @staticmethod
-    def initialize_openai():
-        """Inicializa a API da OpenAI"""
-        openai_key = ConfigManager.get_secret("OPENAI_API_KEY")
-        return OpenAI(api_key=openai_key) if openai_key else None
+def _notificar_interface(mensagem: str):
+    # Erros de threads de fundo (webhook, workers) ficam apenas no log
+    if get_script_run_ctx() is not None:
+        st.error(mensagem)
 
-class SheetsManager:
-    """Gerencia as operações com Google Sheets"""
-    def __init__(self):
-        self.credentials = Credentials.from_service_account_info(
-            st.secrets.secrets["google_credentials"],
-            scopes=[
-                "https://www.googleapis.com/auth/spreadsheets",
-                "https://www.googleapis.com/auth/drive"
-            ]
-        )
-        self.client = gspread.authorize(self.credentials)
-
-    def create_new_sheet(self, user_name: str) -> str:
-        """Cria uma nova planilha para o usuário"""
-        try:
-            # Criar planilha
-            spreadsheet = self.client.create(f"Finanças - {user_name}")
-            
-            # Configurar primeira aba
-            worksheet = spreadsheet.sheet1
-            worksheet.update_title("Registros")
-            
-            # Configurar cabeçalhos
-            headers = ["Data", "Categoria", "Subcategoria", "Valor", "Descrição"]
-            worksheet.update('A1:E1', [headers])
-            
-            # Formatar cabeçalhos
-            worksheet.format('A1:E1', {
-                "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.8},
-                "textFormat": {"bold": True}
-            })
-            
-            # Compartilhar planilha (opcional)
-            spreadsheet.share(None, perm_type='anyone', role='reader')
-            
-            return spreadsheet.url
-            
-        except Exception as e:
-            st.error(f"Erro ao criar planilha: {str(e)}")
-            return None
-
-    def save_transaction(self, sheet_id: str, transaction: dict):
-        """Salva uma nova transação na planilha"""
-        try:
-            sheet = self.client.open_by_key(sheet_id)
-            worksheet = sheet.sheet1
-            
-            # Preparar dados
-            row = [
-                transaction['data'].strftime("%Y-%m-%d %H:%M:%S"),
-                transaction['categoria'],
-                transaction.get('subcategoria', ''),
-                transaction['valor'],
-                transaction['descricao']
-            ]
-            
-            # Adicionar linha
-            worksheet.append_row(row)
-            
-        except Exception as e:
-            st.error(f"Erro ao salvar transação: {str(e)}")
-
-    def get_transactions(self, sheet_id: str) -> pd.DataFrame:
-        """Recupera todas as transações da planilha"""
-        try:
-            sheet = self.client.open_by_key(sheet_id)
-            worksheet = sheet.sheet1
-            
-            # Pegar todos os dados
-            data = worksheet.get_all_records()
-            
-            # Converter para DataFrame
-            df = pd.DataFrame(data)
-            if not df.empty:
-                df['Data'] = pd.to_datetime(df['Data'])
-            
-            return df
-            
-        except Exception as e:
-            st.error(f"Erro ao recuperar transações: {str(e)}")
-            return pd.DataFrame()
-
-class UserManager:
-    """Gerencia os usuários e seus estados"""
-    def __init__(self):
-        if 'users' not in st.session_state:
-            st.session_state.users = {}
-
-    def get_user_state(self, phone_number: str) -> dict:
-        """Retorna o estado atual do usuário"""
-        if phone_number not in st.session_state.users:
-            st.session_state.users[phone_number] = {
-                'status': 'new',  # new, pending_name, pending_email, active
-                'name': None,
-                'email': None,
-                'sheet_id': None
-            }
-        return st.session_state.users[phone_number]
-
-    def update_user_state(self, phone_number: str, updates: dict):
-        """Atualiza o estado do usuário"""
-        if phone_number in st.session_state.users:
-            st.session_state.users[phone_number].update(updates)
-
-    def handle_user_message(self, phone_number: str, message: str) -> str:
-        """Processa mensagem baseado no estado do usuário"""
-        user = self.get_user_state(phone_number)
-        
-        if user['status'] == 'new':
-            user['status'] = 'pending_name'
-            self.update_user_state(phone_number, user)
-            return """👋 Olá! Bem-vindo ao Assistente Financeiro!
-
-Para começar, preciso de algumas informações:
-
-Por favor, me diga seu nome completo:"""
-
-        elif user['status'] == 'pending_name':
-            user['name'] = message
-            user['status'] = 'pending_email'
-            self.update_user_state(phone_number, user)
-            return f"""Obrigado, {user['name']}! 
-
-Agora, por favor, me informe seu e-mail:"""
-
-        elif user['status'] == 'pending_email':
-            if '@' in message and '.' in message:  # Validação básica de email
-                user['email'] = message
-                user['status'] = 'active'
-                
-                # Criar planilha para o usuário
-                try:
-                    sheets_manager = SheetsManager()
-                    sheet_url = sheets_manager.create_new_sheet(user['name'])
-                    user['sheet_id'] = sheet_url
-                    self.update_user_state(phone_number, user)
-                    
-                    return f"""✨ Tudo pronto, {user['name']}!
-
-Sua planilha foi criada com sucesso! 
-Acesse aqui: {sheet_url}
-
-Para registrar gastos, você pode:
-1. Enviar mensagens como "Gastei 50 no almoço"
-2. Enviar fotos de comprovantes/notas
-3. Enviar extratos em CSV/PDF
-
-Para ver relatórios, digite "relatorio" a qualquer momento.
-
-Posso ajudar com mais alguma coisa?"""
-                except Exception as e:
-                    return "Desculpe, houve um erro ao criar sua planilha. Por favor, tente novamente mais tarde."
-            else:
-                return "Por favor, forneça um e-mail válido."
-
-        return "Como posso ajudar?"
-
-class DataManager:
-    """Gerencia o armazenamento e manipulação dos dados"""
-    def __init__(self, sheet_id: str = None):
-        self.sheet_id = sheet_id
-        self.sheets_manager = SheetsManager() if sheet_id else None
-
-    def adicionar_gasto(self, gasto: dict) -> bool:
-        """Adiciona um novo gasto"""
-        try:
-            if self.sheets_manager and self.sheet_id:
-                self.sheets_manager.save_transaction(self.sheet_id, gasto)
-            return True
-        except Exception as e:
-            st.error(f"Erro ao adicionar gasto: {str(e)}")
-            return False
-
-    def get_dataframe(self) -> pd.DataFrame:
-        """Retorna o DataFrame com todos os gastos"""
-        try:
-            if self.sheets_manager and self.sheet_id:
-                return self.sheets_manager.get_transactions(self.sheet_id)
-            return pd.DataFrame()
-        except Exception as e:
-            st.error(f"Erro ao recuperar dados: {str(e)}")
-            return pd.DataFrame()
-
-    def has_data(self) -> bool:
-        """Verifica se existem dados registrados"""
-        return not self.get_dataframe().empty
-
-class AIFinanceAssistant:
-    """Assistente de IA para processamento de mensagens e análise financeira"""
-    def __init__(self, openai_client):
-        self.client = openai_client
-
-    def processar_mensagem(self, mensagem: str) -> dict:
-        """Processa mensagem do usuário usando GPT-4"""
-        if not self.client:
-            return {
-                "sucesso": False,
-                "mensagem": "Cliente OpenAI não inicializado. Verifique as configurações."
-            }
-
-        system_prompt = f"""Você é um assistente financeiro especializado em:
-        1. Extrair informações de gastos de mensagens em linguagem natural
-        2. Categorizar gastos apropriadamente usando as categorias definidas
-        3. Identificar valores e descrições
-
-        Categorias e subcategorias disponíveis:
-        {json.dumps(CATEGORIAS, indent=2)}
-
-        Retorne apenas um JSON com os campos:
-        {{
-            "categoria": string,
-            "subcategoria": string,
-            "valor": float,
-            "descricao": string,
-            "sucesso": boolean,
-            "mensagem": string
-        }}"""
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": mensagem}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            resultado = json.loads(response.choices[0].message.content)
-            return resultado
-            
-        except Exception as e:
-            return {
-                "sucesso": False,
-                "mensagem": f"Erro ao processar mensagem: {str(e)}"
-            }
-
-    def analyze_image(self, image_content: bytes) -> dict:
-        """Analisa imagem usando GPT-4 Vision"""
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-vision-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em análise de extratos bancários e comprovantes. Identifique os gastos na imagem."
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "Identifique os gastos nesta imagem e retorne um JSON com uma lista de gastos encontrados, incluindo valor, descrição e categoria."
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_content.decode('utf-8')}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000
-            )
-            
-            return json.loads(response.choices[0].message.content)
-            
-        except Exception as e:
-            return {
-                "sucesso": False,
-                "mensagem": f"Erro ao analisar imagem: {str(e)}"
-            }
-
-    def analyze_bank_csv(self, df: pd.DataFrame) -> list:
-        """Analisa CSV do banco e identifica transações"""
-        try:
-            # Converter DataFrame para texto para enviar ao GPT-4
-            csv_text = df.to_string()
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"""Você é um especialista em análise de extratos bancários.
-                        Use estas categorias para classificar as transações:
-                        {json.dumps(CATEGORIAS, indent=2)}
-                        """
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Analise este extrato bancário e identifique os gastos:\n\n{csv_text}"
-                    }
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            return json.loads(response.choices[0].message.content)
-            
-        except Exception as e:
-            return []
-
-    def analisar_padroes(self, df: pd.DataFrame) -> str:
-        """Análise avançada dos padrões de gastos"""
-        if not self.client:
-            return "Cliente OpenAI não inicializado. Verifique as configurações."
-
-        if df.empty:
-            return "Ainda não há dados suficientes para análise."
-
-        resumo_categorias = df.groupby(['categoria', 'subcategoria'])['valor'].agg(['sum', 'count', 'mean'])
-        tendencia_mensal = df.groupby(df['data'].dt.strftime('%Y-%m'))['valor'].sum()
-        
-        contexto = f"""
-        Analise os seguintes dados financeiros e forneça insights detalhados:
-
-        Resumo por categoria:
-        {resumo_categorias.to_string()}
-        
-        Tendência mensal:
-        {tendencia_mensal.to_string()}
-        
-        Forneça:
-        1. Principais insights sobre os padrões de gastos
-        2. Sugestões específicas de economia baseadas nos dados
-        3. Identificação de possíveis gastos anormais ou excessivos
-        4. Previsões e tendências futuras
-        5. Recomendações práticas para melhor gestão financeira
-        """
-
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "Você é um analista financeiro especializado em finanças pessoais."},
-                    {"role": "user", "content": contexto}
-                ]
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            return f"Erro na análise: {str(e)}"
-
-    def gerar_relatorio_mensal(self, df: pd.DataFrame):
-        """Gera relatório mensal com visualizações"""
-        if df.empty:
-            return "Nenhum gasto registrado ainda.", None
-        
-        mes_atual = datetime.now().month
-        df['data'] = pd.to_datetime(df['data'])
-        df_mes = df[df['data'].dt.month == mes_atual]
-        
-        if df_mes.empty:
-            return "Nenhum gasto registrado este mês.", None
-        
-        gastos_categoria = df_mes.groupby('categoria')['valor'].sum()
-        total_gasto = df_mes['valor'].sum()
-        media_diaria = total_gasto / df_mes['data'].dt.day.nunique()
-        
-        fig = px.pie(
-            values=gastos_categoria.values,
-            names=gastos_categoria.index,
-            title='Distribuição de Gastos por Categoria'
-        )
-        fig.update_traces(textposition='inside', textinfo='percent+label')
-        
-        relatorio = f"""### 📊 Resumo Financeiro do Mês
-
-💰 **Total Gasto:** R$ {total_gasto:.2f}
-📅 **Média Diária:** R$ {media_diaria:.2f}
-
-#### Gastos por Categoria:
-"""
-        
-        for categoria, valor in gastos_categoria.items():
-            percentual = (valor / total_gasto) * 100
-            relatorio += f"- {categoria.title()}: R$ {valor:.2f} ({percentual:.1f}%)\n"
-        
-        return relatorio, fig
+definir_notificador(_notificar_interface)
 
 class WebhookTester:
     """Testa a funcionalidade do webhook"""
@@ -539,6 +52,84 @@ class WebhookTester:
         
         if st.button("🔄 Testar Webhook"):
             self.test_webhook(test_message)
+        
+        self.render_load_test()
+    
+    def render_load_test(self):
+        """Renderiza o teste de carga do webhook, com acompanhamento ao vivo"""
+        with st.expander("🚀 Teste de carga"):
+            st.caption(
+                "As mensagens são processadas como reais: números novos passam pelo cadastro "
+                "e recebem respostas pelo WhatsApp. Prefira o webhook local."
+            )
+            url = st.text_input("URL do webhook", value="http://localhost:5000/webhook", key="carga_url")
+            col1, col2 = st.columns(2)
+            concorrencia = col1.number_input("Concorrência", min_value=1, max_value=500, value=10)
+            taxa = col2.number_input("Envios por segundo", min_value=0.1, max_value=1000.0, value=10.0)
+            duracao = col1.number_input("Duração (s)", min_value=1, max_value=3600, value=30)
+            usuarios = col2.number_input("Usuários", min_value=1, max_value=10000, value=20)
+            por_envelope = col1.number_input("Mensagens por envelope", min_value=1, max_value=50, value=1)
+            duplicadas = col2.slider("IDs duplicados", 0.0, 1.0, 0.0, 0.05)
+            prefixo = st.text_input("Prefixo dos telefones de teste", value="5500000")
+            planilha_teste = st.text_input(
+                "Planilha de teste (ID)",
+                help="Se informada, os números de teste são cadastrados como ativos com esta planilha, "
+                     "para que o teste cubra o registro de gastos em vez do cadastro. "
+                     "Vale para o webhook que usa o mesmo armazenamento de usuários."
+            )
+            corpus = st.text_area("Mensagens (uma por linha)", value="\n".join(CORPUS_PADRAO))
+            
+            local = urlparse(url).hostname in ("localhost", "127.0.0.1", "0.0.0.0")
+            confirmado = local or st.checkbox(
+                "Confirmo que esta URL é um ambiente de teste (mensagens reais serão enviadas)"
+            )
+            
+            gerador = st.session_state.get('teste_carga')
+            if (gerador is None or not gerador.ativo) and \
+                    st.button("▶️ Iniciar teste de carga", disabled=not confirmado):
+                gerador = LoadGenerator(
+                    url,
+                    concorrencia=int(concorrencia),
+                    taxa=float(taxa),
+                    duracao=float(duracao),
+                    corpus=corpus.splitlines(),
+                    mensagens_por_envelope=int(por_envelope),
+                    taxa_duplicadas=duplicadas,
+                    usuarios=int(usuarios),
+                    prefixo_telefone=prefixo
+                )
+                if planilha_teste:
+                    store = UserManager.get_store()
+                    for telefone in gerador.telefones:
+                        store.update(telefone, {
+                            'status': 'active', 'name': "Teste de carga", 'sheet_id': planilha_teste
+                        })
+                gerador.iniciar()
+                st.session_state['teste_carga'] = gerador
+            
+            if gerador is not None:
+                # Fragmento atualizado a cada segundo sem bloquear o restante da página
+                st.fragment(run_every=1 if gerador.ativo else None)(self.render_load_stats)(gerador)
+    
+    @staticmethod
+    def render_load_stats(gerador: LoadGenerator):
+        """Números do teste em andamento (ou do último teste concluído)"""
+        ativo = gerador.ativo
+        resumo = gerador.stats.snapshot()
+        if ativo and st.button("⏹️ Parar teste"):
+            gerador.parar()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("RPS", f"{resumo['rps_recente']:.1f}", help=f"Média: {resumo['rps']:.1f}")
+        col2.metric("Erros", f"{resumo['taxa_erro']:.1%}")
+        col3.metric("Envios", resumo['enviados'])
+        st.text(
+            f"p50 {resumo['p50_ms']:.0f} ms · p95 {resumo['p95_ms']:.0f} ms · "
+            f"p99 {resumo['p99_ms']:.0f} ms · {resumo['decorrido_s']:.0f} s"
+        )
+        if resumo['status']:
+            st.json({str(status): total for status, total in resumo['status'].items()})
+        if not ativo:
+            st.caption(f"Teste concluído: {resumo['mensagens']} mensagens enviadas.")
     
     def test_webhook(self, message: str):
         """Executa o teste do webhook"""
@@ -591,110 +182,56 @@ class WebhookTester:
         except Exception as e:
             st.error(f"❌ Erro ao testar webhook: {str(e)}")
 
-# Rota única para o webhook
-@flask_app.route('/webhook', methods=['GET', 'POST'])
-def webhook():
-    if request.method == 'GET':
-        try:
-            verify_token = ConfigManager.get_secret("VERIFY_TOKEN")
-            mode = request.args.get('hub.mode')
-            token = request.args.get('hub.verify_token')
-            challenge = request.args.get('hub.challenge')
-
-            if mode == 'subscribe' and token == verify_token:
-                if challenge:
-                    return str(challenge), 200
-                return "OK", 200
-            return "Unauthorized", 403
-        except Exception as e:
-            st.error(f"Erro na verificação: {str(e)}")
-            return str(e), 500
-            
-    elif request.method == 'POST':
-        data = request.json
-        try:
-            if 'messages' in data and data['messages']:
-                message = data['messages'][0]
-                numero = message['from']
-                texto = message['text']['body']
-                
-                # Inicializar gerenciadores
-                user_manager = UserManager()
-                
-                # Verificar estado do usuário e processar mensagem
-                if user_manager.get_user_state(numero)['status'] != 'active':
-                    # Usuário ainda não completou o onboarding
-                    resposta = user_manager.handle_user_message(numero, texto)
-                    ConfigManager.send_whatsapp_message(numero, resposta)
-                else:
-                    # Usuário já ativo, processar normalmente
-                    user_data = user_manager.get_user_state(numero)
-                    data_manager = DataManager(user_data['sheet_id'])
-                    ai_assistant = AIFinanceAssistant(ConfigManager.initialize_openai())
-                    
-                    if texto.lower() == 'relatorio':
-                        relatorio, _ = ai_assistant.gerar_relatorio_mensal(
-                            data_manager.get_dataframe()
-                        )
-                        ConfigManager.send_whatsapp_message(numero, relatorio)
-                    else:
-                        resultado = ai_assistant.processar_mensagem(texto)
-                        if resultado['sucesso']:
-                            if data_manager.adicionar_gasto(resultado):
-                                mensagem = f"""✅ Gasto registrado com sucesso!
-                                
-Categoria: {resultado['categoria']}
-Valor: R$ {resultado['valor']:.2f}
-Descrição: {resultado['descricao']}"""
-                            else:
-                                mensagem = "❌ Erro ao salvar o gasto."
-                        else:
-                            mensagem = resultado['mensagem']
-                        
-                        ConfigManager.send_whatsapp_message(numero, mensagem)
-            
-            return jsonify({"status": "success"}), 200
-        except Exception as e:
-            st.error(f"Erro no webhook: {str(e)}")
-            return jsonify({"status": "error", "message": str(e)}), 500
+@st.cache_data(ttl=30, show_spinner=False)
+def carregar_dados_dashboard(sheet_id: str, versao: int, _data_manager) -> dict:
+    """Carrega o DataFrame e os agregados do dashboard uma vez por versão dos dados"""
+    df = _data_manager.get_dataframe()
+    dados = {'df': df, 'rollup': MonthlyRollup.from_dataframe(df)}
+    if not df.empty:
+        # Dados dos gráficos já agregados e limitados em número de pontos
+        max_pontos = int(ConfigManager.get_secret("DASHBOARD_MAX_POINTS", "500"))
+        dados['gastos_subcategoria'] = barras_subcategoria(df)
+        dados['tendencia'], dados['frequencia'] = serie_temporal(df, max_pontos)
+    return dados
 
 def render_dashboard(data_manager, ai_assistant):
     """Renderiza o dashboard principal"""
-    if data_manager.has_data():
+    # Buscar os dados uma única vez por execução
+    dados = carregar_dados_dashboard(data_manager.sheet_id, data_manager.versao(), data_manager)
+    df = dados['df']
+    
+    if not df.empty:
         tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "📝 Registros", "🤖 Análise IA"])
         
         with tab1:
             st.subheader("Dashboard Financeiro")
-            relatorio, fig = ai_assistant.gerar_relatorio_mensal(data_manager.get_dataframe())
+            relatorio, fig = ai_assistant.gerar_relatorio_mensal(dados['rollup'])
             if fig:
                 st.plotly_chart(fig, use_container_width=True)
             st.markdown(relatorio)
             
             # Gráficos extras
-            df = data_manager.get_dataframe()
-            
             # Gráfico de gastos por subcategoria
-            gastos_subcategoria = df.groupby('subcategoria')['valor'].sum().sort_values(ascending=True)
             fig_sub = px.bar(
-                gastos_subcategoria,
+                dados['gastos_subcategoria'],
                 orientation='h',
                 title='Gastos por Subcategoria'
             )
             st.plotly_chart(fig_sub, use_container_width=True)
             
             # Gráfico de tendência temporal
-            df_temporal = df.set_index('data')
             fig_temporal = px.line(
-                df_temporal,
+                dados['tendencia'].to_frame(),
                 y='valor',
-                title='Tendência de Gastos ao Longo do Tempo'
+                markers=len(dados['tendencia']) < 60,
+                title=f"Tendência de Gastos ao Longo do Tempo ({dados['frequencia']})"
             )
             st.plotly_chart(fig_temporal, use_container_width=True)
             
         with tab2:
             st.subheader("Registros de Gastos")
             st.dataframe(
-                data_manager.get_dataframe(),
+                df,
                 column_config={
                     "data": st.column_config.DatetimeColumn("Data", format="DD/MM/YYYY HH:mm"),
                     "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
@@ -703,21 +240,40 @@ def render_dashboard(data_manager, ai_assistant):
             )
             
             # Exportar dados
-            if st.button("📥 Exportar Dados"):
-                df = data_manager.get_dataframe()
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    label="Download CSV",
-                    data=csv,
-                    file_name="gastos.csv",
-                    mime="text/csv"
-                )
+            with st.expander("📥 Exportar Dados"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    periodo = st.date_input(
+                        "Período",
+                        value=(df['data'].min().date(), df['data'].max().date())
+                    )
+                with col2:
+                    categorias = st.multiselect("Categorias", sorted(df['categoria'].unique()))
+                with col3:
+                    formato = st.selectbox("Formato", list(FORMATOS))
+                
+                if st.button("Gerar arquivo"):
+                    inicio = periodo[0] if len(periodo) > 0 else None
+                    fim = periodo[1] + timedelta(days=1) if len(periodo) > 1 else None
+                    try:
+                        arquivo = data_manager.exportar(formato, inicio, fim, categorias or None)
+                    except Exception as e:
+                        st.error(f"Erro ao exportar dados: {str(e)}")
+                    else:
+                        extensao, mime = FORMATOS[formato]
+                        with arquivo:
+                            st.download_button(
+                                label=f"Download {formato.upper()}",
+                                data=arquivo,
+                                file_name=f"gastos.{extensao}",
+                                mime=mime
+                            )
             
         with tab3:
             st.subheader("Análise de IA")
             if st.button("🔄 Gerar Nova Análise"):
                 with st.spinner("Analisando seus dados..."):
-                    analise = ai_assistant.analisar_padroes(data_manager.get_dataframe())
+                    analise = ai_assistant.analisar_padroes(dados['rollup'])
                     st.markdown(analise)
     
     else:
@@ -739,6 +295,28 @@ def render_dashboard(data_manager, ai_assistant):
         - 📑 PDFs de faturas
         """)
 
+def render_metricas():
+    """Painel com os tempos por etapa e contadores deste processo"""
+    with st.expander("📈 Métricas"):
+        if ConfigManager.get_secret("WEBHOOK_MODE", "embedded") != "embedded":
+            st.caption("O webhook roda em outro processo; veja as métricas dele em /metrics.")
+        dados = metrics.REGISTRY.snapshot()
+        if dados['etapas']:
+            st.dataframe(
+                pd.DataFrame.from_dict(dados['etapas'], orient='index').sort_index(),
+                column_config={
+                    "media_ms": st.column_config.NumberColumn("Média (ms)", format="%.1f"),
+                    "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.0f"),
+                }
+            )
+        else:
+            st.caption("Nenhuma etapa medida ainda.")
+        for nome, valor in sorted(dados['contadores'].items()):
+            st.write(f"{nome}: {valor:g}")
+        for coletor, valores in sorted(dados['coletores'].items()):
+            if valores:
+                st.write(f"**{coletor}**: " + ", ".join(f"{chave}={valor:g}" for chave, valor in valores.items()))
+
 def main():
     """Função principal do aplicativo"""
     # Inicialização dos componentes
@@ -764,6 +342,8 @@ def main():
         st.write(f"WhatsApp API: {whatsapp_status}")
         st.write(f"Google Sheets: {sheets_status}")
         
+        render_metricas()
+        
         # Teste do Webhook
         webhook_tester.render_test_interface()
     
@@ -771,10 +351,11 @@ def main():
     render_dashboard(data_manager, ai_assistant)
 
 if __name__ == "__main__":
-    # Iniciar o servidor webhook em uma thread separada
-    flask_thread = Thread(target=lambda: flask_app.run(host='0.0.0.0', port=5000))
-    flask_thread.daemon = True
-    flask_thread.start()
+    # Modo embutido: webhook no servidor de desenvolvimento, dentro do processo
+    # do Streamlit. Em produção use WEBHOOK_MODE=external e
+    # "python -m webhook serve-webhook" em um processo separado.
+    if ConfigManager.get_secret("WEBHOOK_MODE", "embedded") == "embedded":
+        iniciar_em_thread()
     
     # Iniciar a aplicação Streamlit
     main()
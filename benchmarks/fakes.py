@@ -0,0 +1,362 @@
+"""Substitutos locais de OpenAI, Google Sheets e Graph API (WhatsApp) para benchmarks
+
+- FakeOpenAIServer: servidor HTTP compatível com POST /v1/chat/completions;
+  o cliente oficial é apontado para ele com OPENAI_BASE_URL.
+- FakeGraphAPIServer: servidor HTTP com /{phone_number_id}/messages e
+  download de mídia; o WhatsAppClient usa WHATSAPP_API_URL.
+- FakeSheetsClient: cliente em memória com a parte da API do gspread usada
+  pelo SheetsManager (instalado com instalar_sheets_falso).
+
+Todos contam as chamadas recebidas em .chamadas.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from categorias import PROMPT_SISTEMA_COMPROVANTE, PROMPT_SISTEMA_EXTRATO, PROMPT_SISTEMA_LOTE
+
+_VALOR_RE = re.compile(r"\d+(?:[.,]\d{1,2})?")
+
+
+def _categorizar(texto: str) -> dict:
+    """Resposta sintética de categorização para uma mensagem"""
+    valor = _VALOR_RE.search(texto)
+    if not valor:
+        return {"sucesso": False, "mensagem": "Não encontrei o valor do gasto."}
+    return {
+        "categoria": "lazer",
+        "subcategoria": "streaming",
+        "valor": float(valor.group(0).replace(",", ".")),
+        "descricao": texto[:60],
+        "sucesso": True,
+        "mensagem": ""
+    }
+
+
+def resposta_padrao(messages: list) -> dict:
+    """Escolhe o formato da resposta pelo prompt de sistema da chamada"""
+    sistema = messages[0].get("content", "") if messages else ""
+    usuario = messages[-1].get("content", "") if messages else ""
+    if sistema == PROMPT_SISTEMA_LOTE:
+        linhas = [linha.split(". ", 1)[-1] for linha in usuario.splitlines() if linha.strip()]
+        return {"resultados": [dict(_categorizar(linha), indice=i) for i, linha in enumerate(linhas, 1)]}
+    if sistema == PROMPT_SISTEMA_EXTRATO:
+        return {"transacoes": []}
+    if sistema == PROMPT_SISTEMA_COMPROVANTE:
+        return {"gastos": [{"data": "2024-01-15", "categoria": "alimentacao", "subcategoria": "supermercado",
+                            "valor": 87.5, "descricao": "Supermercado"}]}
+    return _categorizar(usuario if isinstance(usuario, str) else "")
+
+
+class _Servidor:
+    """Servidor HTTP em thread, com contador de chamadas por rota"""
+    def __init__(self, handler_cls, host: str = "127.0.0.1", port: int = 0):
+        self.chamadas = Counter()
+        self._lock = threading.Lock()
+        servidor = self
+
+        class Handler(handler_cls):
+            fake = servidor
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def contar(self, rota: str):
+        with self._lock:
+            self.chamadas[rota] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _ler_json(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(tamanho) or b"{}")
+
+    def _responder(self, status: int, corpo, headers: dict = None, content_type: str = "application/json"):
+        dados = corpo if isinstance(corpo, bytes) else json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(dados)))
+        for chave, valor in (headers or {}).items():
+            self.send_header(chave, str(valor))
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+class _OpenAIHandler(_JSONHandler):
+    def do_POST(self):
+        fake = self.fake
+        pedido = self._ler_json()
+        if not self.path.endswith("/chat/completions"):
+            return self._responder(404, {"error": {"message": "rota desconhecida"}})
+        fake.contar("chat.completions")
+
+        time.sleep(fake.latencia + random.uniform(0, fake.variacao))
+        if fake.taxa_429 and random.random() < fake.taxa_429:
+            fake.contar("429")
+            return self._responder(
+                429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"retry-after": "0.1"}
+            )
+
+        conteudo = json.dumps(fake.responder(pedido.get("messages", [])), ensure_ascii=False)
+        tokens_prompt = sum(len(str(m.get("content", ""))) for m in pedido.get("messages", [])) // 4
+        tokens_resposta = len(conteudo) // 4
+        self._responder(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": pedido.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": conteudo},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": tokens_prompt,
+                "completion_tokens": tokens_resposta,
+                "total_tokens": tokens_prompt + tokens_resposta
+            }
+        }, headers={
+            "x-ratelimit-limit-requests": 10000,
+            "x-ratelimit-remaining-requests": 9999,
+            "x-ratelimit-limit-tokens": 10000000,
+            "x-ratelimit-remaining-tokens": 9999999
+        })
+
+
+class FakeOpenAIServer(_Servidor):
+    """API de chat da OpenAI simulada, com latência e taxa de 429 configuráveis
+
+    responder(messages) -> dict define o JSON devolvido como conteúdo da
+    mensagem; o padrão gera categorizações sintéticas.
+    """
+    def __init__(self, latencia: float = 0.3, variacao: float = 0.1, taxa_429: float = 0.0,
+                 responder=resposta_padrao, **kwargs):
+        super().__init__(_OpenAIHandler, **kwargs)
+        self.latencia = latencia
+        self.variacao = variacao
+        self.taxa_429 = taxa_429
+        self.responder = responder
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+
+class _GraphAPIHandler(_JSONHandler):
+    def do_POST(self):
+        fake = self.fake
+        pedido = self._ler_json()
+        if not self.path.endswith("/messages"):
+            return self._responder(404, {"error": {"message": "rota desconhecida"}})
+        fake.contar("messages")
+        time.sleep(fake.latencia)
+        fake.registrar_envio(pedido.get("to"), pedido.get("text", {}).get("body", ""))
+        self._responder(200, {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]})
+
+    def do_GET(self):
+        fake = self.fake
+        partes = self.path.strip("/").split("/")
+        if partes[0] == "midia" and len(partes) == 2:
+            fake.contar("midia.download")
+            conteudo = fake.midias.get(partes[1])
+            if conteudo is None:
+                return self._responder(404, {"error": {"message": "mídia não encontrada"}})
+            return self._responder(200, conteudo, content_type="image/jpeg")
+        fake.contar("midia.url")
+        self._responder(200, {"url": f"{fake.url}/midia/{partes[-1]}", "mime_type": "image/jpeg"})
+
+
+class FakeGraphAPIServer(_Servidor):
+    """Graph API simulada: registra as mensagens enviadas e serve mídias"""
+    def __init__(self, latencia: float = 0.05, **kwargs):
+        super().__init__(_GraphAPIHandler, **kwargs)
+        self.latencia = latencia
+        self.midias = {}   # media_id -> bytes
+        self.enviadas = []  # (telefone, texto, instante)
+        self.ao_enviar = None
+
+    def registrar_envio(self, telefone: str, texto: str):
+        instante = time.perf_counter()
+        with self._lock:
+            self.enviadas.append((telefone, texto, instante))
+        if self.ao_enviar:
+            self.ao_enviar(telefone, texto, instante)
+
+
+class FakeWorksheet:
+    """Aba em memória com os métodos do gspread.Worksheet usados pelo app"""
+    def __init__(self, cliente, latencia: float = 0.0, titulo: str = "Sheet1", cabecalho: list = None):
+        self.cliente = cliente
+        self.latencia = latencia
+        self.title = titulo
+        if cabecalho is None:
+            cabecalho = ["Data", "Categoria", "Subcategoria", "Valor", "Descrição"]
+        self.linhas = [list(cabecalho)] if cabecalho else []
+        self._lock = threading.Lock()
+
+    def _chamada(self, nome: str):
+        self.cliente.contar(nome)
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def append_rows(self, rows: list, **kwargs) -> dict:
+        self._chamada("append_rows")
+        with self._lock:
+            inicio = len(self.linhas) + 1
+            self.linhas.extend(list(row) for row in rows)
+            fim = len(self.linhas)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{inicio}:E{fim}", "updatedRows": len(rows)}}
+
+    def append_row(self, row: list, **kwargs):
+        self.append_rows([row])
+
+    def get_all_values(self) -> list:
+        self._chamada("get_all_values")
+        with self._lock:
+            return [[str(celula) for celula in linha] for linha in self.linhas]
+
+    def get(self, intervalo: str, **kwargs) -> list:
+        """Aceita intervalos no formato A{linha}:E"""
+        self._chamada("get")
+        inicio = int(re.match(r"A(\d+)", intervalo).group(1))
+        with self._lock:
+            return [list(linha) for linha in self.linhas[inicio - 1:]]
+
+    def update(self, intervalo: str, valores: list, **kwargs):
+        """Aceita intervalos no formato A{linha}:X{linha}"""
+        self._chamada("update")
+        inicio = int(re.match(r"A(\d+)", intervalo).group(1))
+        with self._lock:
+            for offset, valor in enumerate(valores):
+                indice = inicio - 1 + offset
+                self.linhas.extend([] for _ in range(indice + 1 - len(self.linhas)))
+                self.linhas[indice] = list(valor)
+
+    def insert_row(self, valores: list, index: int = 1, **kwargs):
+        self._chamada("insert_row")
+        with self._lock:
+            self.linhas.insert(index - 1, list(valores))
+
+    def update_title(self, titulo: str):
+        self._chamada("update_title")
+        self.title = titulo
+
+    def format(self, intervalo, formato):
+        self._chamada("format")
+
+
+def _erro_api(status: int, mensagem: str):
+    """gspread.exceptions.APIError com a resposta de erro no formato do Google"""
+    import requests
+    from gspread.exceptions import APIError
+
+    resposta = requests.Response()
+    resposta.status_code = status
+    resposta._content = json.dumps({"error": {"code": status, "message": mensagem, "status": "INVALID_ARGUMENT"}}).encode()
+    return APIError(resposta)
+
+
+class FakeSpreadsheet:
+    def __init__(self, cliente, chave: str, latencia: float = 0.0):
+        self.id = chave
+        self.url = f"https://docs.google.com/spreadsheets/d/{chave}"
+        self.latencia = latencia
+        self.sheet1 = FakeWorksheet(cliente, latencia)
+        self.abas = [self.sheet1]
+        self.cliente = cliente
+
+    def worksheet(self, titulo: str) -> FakeWorksheet:
+        from gspread.exceptions import WorksheetNotFound
+
+        self.cliente.contar("worksheet")
+        for aba in self.abas:
+            if aba.title == titulo:
+                return aba
+        raise WorksheetNotFound(titulo)
+
+    def add_worksheet(self, titulo: str, rows: int = 1000, cols: int = 26) -> FakeWorksheet:
+        """Como a API real, falha com APIError se já existir uma aba com o título"""
+        self.cliente.contar("add_worksheet")
+        with self.cliente._lock:
+            if any(aba.title == titulo for aba in self.abas):
+                raise _erro_api(400, f'A sheet with the name "{titulo}" already exists.')
+            aba = FakeWorksheet(self.cliente, self.latencia, titulo, cabecalho=[])
+            self.abas.append(aba)
+        return aba
+
+    def share(self, *args, **kwargs):
+        self.cliente.contar("share")
+
+
+class FakeSheetsClient:
+    """Cliente gspread em memória: open_by_key, open_by_url e create"""
+    def __init__(self, latencia: float = 0.05):
+        self.latencia = latencia
+        self.planilhas = {}
+        self.chamadas = Counter()
+        self._lock = threading.Lock()
+
+    def contar(self, nome: str):
+        with self._lock:
+            self.chamadas[nome] += 1
+
+    def _obter(self, chave: str) -> FakeSpreadsheet:
+        with self._lock:
+            if chave not in self.planilhas:
+                self.planilhas[chave] = FakeSpreadsheet(self, chave, self.latencia)
+            return self.planilhas[chave]
+
+    def open_by_key(self, chave: str) -> FakeSpreadsheet:
+        self.contar("open")
+        time.sleep(self.latencia)
+        return self._obter(chave)
+
+    def open_by_url(self, url: str) -> FakeSpreadsheet:
+        return self.open_by_key(url.rstrip("/").split("/")[-1])
+
+    def create(self, titulo: str) -> FakeSpreadsheet:
+        self.contar("create")
+        time.sleep(self.latencia)
+        return self._obter(uuid.uuid4().hex)
+
+
+class _CredenciaisFalsas:
+    token = None
+    valid = True
+
+
+def instalar_sheets_falso(cliente: FakeSheetsClient):
+    """Faz o SheetsManager usar o cliente em memória em vez do Google Sheets"""
+    from services import SheetsManager
+
+    with SheetsManager._client_lock:
+        SheetsManager._client = cliente
+        SheetsManager._credentials = _CredenciaisFalsas()
+    SheetsManager._handles.clear()
@@ -0,0 +1,71 @@
+"""Tempo de importação do caminho do webhook, medido com python -X importtime
+
+Uso:
+    python benchmarks/import_time.py [--modulo webhook] [--limite-ms 800] [--repeticoes 5]
+
+Falha (código 1) se o melhor tempo cumulativo passar do limite ou se algum
+módulo pesado da interface for carregado pelo caminho do webhook.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que o webhook não deve importar na inicialização
+PROIBIDOS = ["streamlit", "plotly", "pandas", "numpy", "gspread", "google.oauth2", "openai"]
+
+_LINHA_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def medir(modulo: str) -> dict:
+    """Importa o módulo em um interpretador novo e retorna {módulo: (próprio_us, cumulativo_us)}"""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {modulo}:\n{resultado.stderr[-2000:]}")
+
+    tempos = {}
+    for linha in resultado.stderr.splitlines():
+        encontrado = _LINHA_RE.match(linha)
+        if encontrado:
+            proprio, cumulativo, _, nome = encontrado.groups()
+            tempos[nome] = (int(proprio), int(cumulativo))
+    return tempos
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modulo", default="webhook")
+    parser.add_argument("--limite-ms", type=float, default=float(os.environ.get("IMPORT_TIME_LIMIT_MS", "800")))
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Módulos mais lentos a exibir")
+    args = parser.parse_args(argv)
+
+    # O menor tempo entre as repetições descarta o ruído do cache de disco
+    medicoes = [medir(args.modulo) for _ in range(args.repeticoes)]
+    melhor = min(medicoes, key=lambda tempos: tempos[args.modulo][1])
+    total_ms = melhor[args.modulo][1] / 1000
+
+    print(f"{'próprio (ms)':>13} {'cumulativo (ms)':>16}  módulo")
+    for nome, (proprio, cumulativo) in sorted(melhor.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"{proprio / 1000:>13.1f} {cumulativo / 1000:>16.1f}  {nome}")
+    print(f"\nimport {args.modulo}: {total_ms:.1f} ms (limite {args.limite_ms:.0f} ms)")
+
+    falhou = False
+    carregados = [m for m in PROIBIDOS if m in melhor]
+    if carregados:
+        print(f"ERRO: módulos pesados importados na inicialização: {', '.join(carregados)}")
+        falhou = True
+    if total_ms > args.limite_ms:
+        print("ERRO: tempo de importação acima do limite")
+        falhou = True
+    return 1 if falhou else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
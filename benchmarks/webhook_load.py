@@ -0,0 +1,243 @@
+"""Benchmark offline do webhook com OpenAI, Sheets e WhatsApp simulados
+
+Uso:
+    python benchmarks/webhook_load.py [--mensagens 500] [--usuarios 50] [--concorrencia 8]
+                                      [--latencia-llm 0.3] [--latencia-sheets 0.05]
+
+Reenvia N mensagens sintéticas pelo /webhook (cliente de teste do Flask) e
+mede, do POST até a resposta chegar à Graph API simulada, a vazão, os
+percentis p50/p95/p99 e as chamadas externas por mensagem. Nenhuma chamada
+sai da máquina: ver benchmarks/fakes.py.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from fakes import FakeGraphAPIServer, FakeOpenAIServer, FakeSheetsClient, instalar_sheets_falso  # noqa: E402
+
+# Mensagens resolvidas pelas regras locais e mensagens que dependem do modelo
+TEMPLATES_REGRAS = ["gastei {valor} no uber", "almoço {valor}", "mercado {valor}", "gasolina {valor}"]
+TEMPLATES_LLM = ["comprei um presente de {valor}", "paguei {valor} naquela loja", "{valor} com a assinatura nova"]
+
+# Trechos da resposta do webhook que correspondem a uma mensagem de gasto (um por mensagem)
+RESPOSTA_GASTO_RE = re.compile(
+    r"Gasto registrado com sucesso|Erro ao salvar o gasto|Não encontrei o valor|"
+    r"Não foi possível interpretar"
+)
+
+
+def percentil(valores: list, q: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def gerar_mensagens(quantidade: int, usuarios: list, taxa_llm: float, taxa_repeticao: float) -> list:
+    """Payloads do WhatsApp com uma mensagem cada; parte reaproveita textos para exercitar o cache"""
+    textos = []
+    payloads = []
+    for i in range(quantidade):
+        if textos and random.random() < taxa_repeticao:
+            texto = random.choice(textos)
+        else:
+            templates = TEMPLATES_LLM if random.random() < taxa_llm else TEMPLATES_REGRAS
+            texto = random.choice(templates).format(valor=f"{random.uniform(5, 300):.2f}".replace(".", ","))
+            textos.append(texto)
+        mensagem = {
+            "from": usuarios[i % len(usuarios)],
+            "id": f"wamid.{uuid.uuid4().hex}",
+            "timestamp": str(int(time.time())),
+            "type": "text",
+            "text": {"body": texto}
+        }
+        payloads.append({
+            "object": "whatsapp_business_account",
+            "entry": [{"changes": [{"field": "messages", "value": {"messages": [mensagem]}}]}]
+        })
+    return payloads
+
+
+def configurar_ambiente(openai: FakeOpenAIServer, graph: FakeGraphAPIServer, diretorio: str, workers: int):
+    """Aponta os clientes para os servidores simulados e usa bancos temporários"""
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": openai.base_url,
+        "WHATSAPP_TOKEN": "benchmark",
+        "PHONE_NUMBER_ID": "123456",
+        "WHATSAPP_API_URL": graph.url,
+        "USER_STORE_PATH": os.path.join(diretorio, "usuarios.db"),
+        "LOCAL_STORE_PATH": os.path.join(diretorio, "transacoes.db"),
+        "WEBHOOK_DEDUP_PATH": "",
+        "WEBHOOK_QUEUE_BACKEND": "memory",
+        "WEBHOOK_WORKERS": str(workers),
+        "LLM_CACHE_PATH": "",
+    })
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mensagens", type=int, default=500)
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--concorrencia", type=int, default=8, help="POSTs simultâneos no webhook")
+    parser.add_argument("--workers", type=int, default=4, help="Workers da fila do webhook")
+    parser.add_argument("--latencia-llm", type=float, default=0.3)
+    parser.add_argument("--latencia-sheets", type=float, default=0.05)
+    parser.add_argument("--latencia-whatsapp", type=float, default=0.05)
+    parser.add_argument("--taxa-llm", type=float, default=0.4, help="Fração de mensagens que exigem o modelo")
+    parser.add_argument("--taxa-repeticao", type=float, default=0.2, help="Fração de textos repetidos")
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+
+    openai = FakeOpenAIServer(latencia=args.latencia_llm, taxa_429=args.taxa_429).start()
+    graph = FakeGraphAPIServer(latencia=args.latencia_whatsapp).start()
+    sheets = FakeSheetsClient(latencia=args.latencia_sheets)
+    diretorio = tempfile.mkdtemp(prefix="financas-bench-")
+    try:
+        return _executar(args, openai, graph, sheets, diretorio)
+    finally:
+        openai.stop()
+        graph.stop()
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def _executar(args, openai: FakeOpenAIServer, graph: FakeGraphAPIServer, sheets: FakeSheetsClient,
+              diretorio: str) -> int:
+    configurar_ambiente(openai, graph, diretorio, args.workers)
+
+    import metrics
+    from services import UserManager
+    from webhook import flask_app, get_worker_pool
+
+    instalar_sheets_falso(sheets)
+    usuarios = [f"55119{i:08d}" for i in range(args.usuarios)]
+    store = UserManager.get_store()
+    for i, numero in enumerate(usuarios):
+        store.update(numero, {'status': 'active', 'name': f"Usuário {i}", 'sheet_id': f"planilha-{i}"})
+
+    # Mensagens aceitas aguardando resposta, por usuário, em ordem de envio
+    pendentes = {numero: [] for numero in usuarios}
+    latencias = []
+    lock = threading.Lock()
+    concluido = threading.Event()
+    aceitas = [0]
+    envios_encerrados = threading.Event()
+
+    def verificar_conclusao():
+        # Chamado com o lock: todas as mensagens aceitas já receberam a própria resposta
+        if envios_encerrados.is_set() and len(latencias) >= aceitas[0]:
+            concluido.set()
+
+    def ao_enviar(telefone, texto, instante):
+        # A resposta de um lote traz um bloco por gasto; outros textos não concluem mensagens
+        respondidas = len(RESPOSTA_GASTO_RE.findall(texto))
+        with lock:
+            enviados = pendentes.get(telefone, [])
+            for inicio in enviados[:respondidas]:
+                latencias.append(instante - inicio)
+            del enviados[:respondidas]
+            verificar_conclusao()
+
+    graph.ao_enviar = ao_enviar
+    payloads = gerar_mensagens(args.mensagens, usuarios, args.taxa_llm, args.taxa_repeticao)
+    cliente = flask_app.test_client()
+    get_worker_pool()
+    tempos_post = []
+    status = {}
+
+    def postar(payload):
+        numero = payload["entry"][0]["changes"][0]["value"]["messages"][0]["from"]
+        inicio = time.perf_counter()
+        with lock:
+            pendentes[numero].append(inicio)
+        resposta = cliente.post("/webhook", json=payload)
+        fim = time.perf_counter()
+        with lock:
+            tempos_post.append(fim - inicio)
+            status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+            if resposta.status_code == 200 and resposta.get_json().get("status") == "queued":
+                aceitas[0] += 1
+            elif inicio in pendentes[numero]:
+                pendentes[numero].remove(inicio)
+
+    inicio_total = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        list(executor.map(postar, payloads))
+    with lock:
+        envios_encerrados.set()
+        verificar_conclusao()
+    completo = concluido.wait(args.timeout)
+    duracao = time.perf_counter() - inicio_total
+
+    with lock:
+        processadas = len(latencias)
+    fila = get_worker_pool().metrics()
+    divisor = processadas or 1
+    resultado = {
+        'mensagens': args.mensagens,
+        'aceitas': aceitas[0],
+        'processadas': processadas,
+        'nao_processadas': aceitas[0] - processadas,
+        'na_fila': fila['profundidade'] + fila['em_processamento'],
+        'completo': completo,
+        'status_http': status,
+        'duracao_s': duracao,
+        'vazao_msg_s': processadas / duracao if duracao else 0.0,
+        'webhook_ms': {f"p{int(q * 100)}": percentil(tempos_post, q) * 1000 for q in (0.5, 0.95, 0.99)},
+        'ponta_a_ponta_ms': {f"p{int(q * 100)}": percentil(latencias, q) * 1000 for q in (0.5, 0.95, 0.99)},
+        'chamadas_por_mensagem': {
+            'openai': sum(openai.chamadas.values()) / divisor,
+            'sheets': sum(sheets.chamadas.values()) / divisor,
+            'whatsapp': sum(graph.chamadas.values()) / divisor,
+        },
+        'chamadas': {
+            'openai': dict(openai.chamadas),
+            'sheets': dict(sheets.chamadas),
+            'whatsapp': dict(graph.chamadas),
+        },
+        'etapas': metrics.REGISTRY.snapshot()['etapas'],
+    }
+
+    get_worker_pool().drain()
+
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+    else:
+        print(f"Mensagens: {processadas}/{aceitas[0]} aceitas processadas em {duracao:.2f} s "
+              f"({resultado['vazao_msg_s']:.1f} msg/s){'' if completo else ' - TIMEOUT'}")
+        if resultado['nao_processadas']:
+            print(f"Não processadas: {resultado['nao_processadas']} "
+                  f"({resultado['na_fila']} ainda na fila ao encerrar)")
+        print(f"Respostas HTTP: {status}")
+        for nome in ('webhook_ms', 'ponta_a_ponta_ms'):
+            percentis = resultado[nome]
+            print(f"{nome:>18}: " + "  ".join(f"{q}={v:.1f}" for q, v in percentis.items()))
+        print("Chamadas externas por mensagem: " + "  ".join(
+            f"{servico}={valor:.2f}" for servico, valor in resultado['chamadas_por_mensagem'].items()
+        ))
+        for servico, chamadas in resultado['chamadas'].items():
+            print(f"  {servico}: {chamadas}")
+        print(f"\n{'etapa':<20} {'chamadas':>9} {'média (ms)':>11} {'p95 (ms)':>9}")
+        for etapa, dados in sorted(resultado['etapas'].items()):
+            print(f"{etapa:<20} {dados['chamadas']:>9} {dados['media_ms']:>11.1f} {dados['p95_ms']:>9.1f}")
+    return 0 if completo else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
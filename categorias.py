@@ -0,0 +1,172 @@
+"""Registro das categorias de gastos e fragmentos de prompt pré-compilados"""
+from expense_parser import normalizar_texto
+
+# Definição das categorias estilo Cerbasi
+CATEGORIAS = {
+    "moradia": {
+        "subcategorias": [
+            "aluguel",
+            "condomínio",
+            "luz",
+            "água",
+            "gás",
+            "internet",
+            "iptu",
+            "manutenção"
+        ]
+    },
+    "alimentacao": {
+        "subcategorias": [
+            "supermercado",
+            "restaurante",
+            "delivery",
+            "padaria"
+        ]
+    },
+    "transporte": {
+        "subcategorias": [
+            "combustível",
+            "estacionamento",
+            "manutenção",
+            "uber/99",
+            "transporte público",
+            "ipva"
+        ]
+    },
+    "saude": {
+        "subcategorias": [
+            "plano de saúde",
+            "medicamentos",
+            "consultas",
+            "exames",
+            "academia"
+        ]
+    },
+    "educacao": {
+        "subcategorias": [
+            "mensalidade",
+            "material",
+            "cursos",
+            "livros"
+        ]
+    },
+    "lazer": {
+        "subcategorias": [
+            "streaming",
+            "restaurantes",
+            "cinema/teatro",
+            "viagens",
+            "hobbies"
+        ]
+    },
+    "financeiro": {
+        "subcategorias": [
+            "investimentos",
+            "seguros",
+            "empréstimos",
+            "cartão de crédito"
+        ]
+    },
+    "outros": {
+        "subcategorias": [
+            "outros"
+        ]
+    }
+}
+
+# Par usado para gastos cuja categoria não existe no registro
+CATEGORIA_PADRAO = ("outros", "outros")
+
+# Fragmento compacto das categorias para os prompts (uma linha por categoria)
+PROMPT_CATEGORIAS = "\n".join(
+    f"{categoria}: {', '.join(dados['subcategorias'])}"
+    for categoria, dados in CATEGORIAS.items()
+)
+
+# Índice reverso subcategoria -> categorias (manutenção aparece em duas)
+SUBCATEGORIA_PARA_CATEGORIAS = {}
+for _categoria, _dados in CATEGORIAS.items():
+    for _subcategoria in _dados["subcategorias"]:
+        SUBCATEGORIA_PARA_CATEGORIAS.setdefault(_subcategoria, []).append(_categoria)
+SUBCATEGORIA_PARA_CATEGORIAS = {
+    subcategoria: tuple(categorias) for subcategoria, categorias in SUBCATEGORIA_PARA_CATEGORIAS.items()
+}
+
+# Pares válidos indexados pela forma normalizada (sem acento, minúsculas)
+PARES_VALIDOS = {
+    (normalizar_texto(categoria), normalizar_texto(subcategoria)): (categoria, subcategoria)
+    for categoria, dados in CATEGORIAS.items()
+    for subcategoria in dados["subcategorias"]
+}
+_SUBCATEGORIAS_NORMALIZADAS = {
+    normalizar_texto(subcategoria): subcategoria for subcategoria in SUBCATEGORIA_PARA_CATEGORIAS
+}
+
+# Prompts de sistema montados uma vez, na importação
+PROMPT_SISTEMA_MENSAGEM = f"""Você é um assistente financeiro especializado em:
+1. Extrair informações de gastos de mensagens em linguagem natural
+2. Categorizar gastos apropriadamente usando as categorias definidas
+3. Identificar valores e descrições
+
+Categorias e subcategorias disponíveis (categoria: subcategorias):
+{PROMPT_CATEGORIAS}
+
+Retorne apenas um JSON com os campos:
+{{"categoria": string, "subcategoria": string, "valor": float, "descricao": string, "sucesso": boolean, "mensagem": string}}"""
+
+PROMPT_SISTEMA_LOTE = f"""Você é um assistente financeiro especializado em:
+1. Extrair informações de gastos de mensagens em linguagem natural
+2. Categorizar gastos apropriadamente usando as categorias definidas
+3. Identificar valores e descrições
+
+Categorias e subcategorias disponíveis (categoria: subcategorias):
+{PROMPT_CATEGORIAS}
+
+Você receberá várias mensagens numeradas. Retorne apenas um JSON com um resultado por mensagem, na mesma ordem:
+{{"resultados": [{{"indice": int, "categoria": string, "subcategoria": string, "valor": float, "descricao": string, "sucesso": boolean, "mensagem": string}}]}}"""
+
+PROMPT_SISTEMA_COMPROVANTE = f"""Você é um especialista em análise de extratos bancários e comprovantes. Identifique os gastos na imagem.
+Use estas categorias para classificar os gastos (categoria: subcategorias):
+{PROMPT_CATEGORIAS}
+
+Retorne apenas um JSON no formato:
+{{"gastos": [{{"data": "AAAA-MM-DD", "categoria": string, "subcategoria": string, "valor": float, "descricao": string}}]}}"""
+
+PROMPT_SISTEMA_EXTRATO = f"""Você é um especialista em análise de extratos bancários.
+Use estas categorias para classificar as transações (categoria: subcategorias):
+{PROMPT_CATEGORIAS}
+
+Retorne apenas um JSON no formato:
+{{"transacoes": [{{"data": "AAAA-MM-DD", "categoria": string, "subcategoria": string, "valor": float, "descricao": string}}]}}"""
+
+
+def validar(categoria: str, subcategoria: str):
+    """Retorna o par canônico (categoria, subcategoria) ou None se inválido
+
+    A comparação ignora maiúsculas e acentos. Se apenas a subcategoria for
+    conhecida e pertencer a uma única categoria, a categoria é corrigida.
+    """
+    chave_subcategoria = normalizar_texto(str(subcategoria or ""))
+    par = PARES_VALIDOS.get((normalizar_texto(str(categoria or "")), chave_subcategoria))
+    if par:
+        return par
+    subcategoria = _SUBCATEGORIAS_NORMALIZADAS.get(chave_subcategoria)
+    if subcategoria and len(SUBCATEGORIA_PARA_CATEGORIAS[subcategoria]) == 1:
+        return SUBCATEGORIA_PARA_CATEGORIAS[subcategoria][0], subcategoria
+    return None
+
+
+def validar_resultado(resultado: dict) -> bool:
+    """Valida (e normaliza no lugar) a categoria retornada pelo LLM"""
+    par = validar(resultado.get("categoria"), resultado.get("subcategoria"))
+    if par is None:
+        return False
+    resultado["categoria"], resultado["subcategoria"] = par
+    return True
+
+
+def normalizar_categoria(gasto: dict) -> dict:
+    """Normaliza no lugar a categoria do gasto; pares fora do registro viram 'outros'"""
+    if not validar_resultado(gasto):
+        gasto["categoria"], gasto["subcategoria"] = CATEGORIA_PADRAO
+    return gasto
@@ -0,0 +1,62 @@
+"""Dados reduzidos para os gráficos do dashboard"""
+import pandas as pd
+
+from categorias import CATEGORIA_PADRAO
+
+# Frequências de agregação, da mais fina para a mais grossa: (regra, nome, dias por período)
+FREQUENCIAS = [
+    ("D", "Diário", 1),
+    ("W-MON", "Semanal", 7),
+    ("MS", "Mensal", 30.44),
+    ("QS", "Trimestral", 91.31),
+    ("YS", "Anual", 365.25),
+]
+
+# Limites padrão de pontos por série e de barras por gráfico
+MAX_PONTOS = 500
+MAX_BARRAS = 25
+
+
+def escolher_frequencia(inicio, fim, max_pontos: int = MAX_PONTOS) -> tuple:
+    """Frequência mais fina cujo número de períodos entre inicio e fim cabe em max_pontos"""
+    dias = (pd.Timestamp(fim) - pd.Timestamp(inicio)).days + 1
+    for frequencia, nome, dias_periodo in FREQUENCIAS:
+        # +1 cobre o período parcial em cada ponta do intervalo
+        if dias / dias_periodo + 1 <= max_pontos:
+            return frequencia, nome
+    return FREQUENCIAS[-1][:2]
+
+
+def serie_temporal(df: pd.DataFrame, max_pontos: int = MAX_PONTOS) -> tuple:
+    """Soma dos gastos por período, com no máximo max_pontos pontos
+
+    Retorna (série indexada pela data de início do período, nome da frequência).
+    """
+    datas = pd.to_datetime(df['data'], errors='coerce')
+    valores = pd.Series(df['valor'].to_numpy(), index=datas)[datas.notna().to_numpy()]
+    if valores.empty:
+        return pd.Series(dtype=float, name='valor'), FREQUENCIAS[0][1]
+
+    frequencia, nome = escolher_frequencia(valores.index.min(), valores.index.max(), max_pontos)
+    serie = valores.resample(frequencia, label='left', closed='left').sum()
+    if len(serie) > max_pontos:
+        # Períodos demais mesmo na frequência anual: agrupar períodos vizinhos
+        passo = -(-len(serie) // max_pontos)
+        grupos = [i // passo for i in range(len(serie))]
+        serie = pd.Series(
+            serie.groupby(grupos).sum().to_numpy(),
+            index=serie.index[::passo]
+        )
+    serie.name = 'valor'
+    return serie, nome
+
+
+def barras_subcategoria(df: pd.DataFrame, max_barras: int = MAX_BARRAS) -> pd.Series:
+    """Total por subcategoria, mantendo as maiores e somando o resto à subcategoria 'outros'"""
+    totais = df.groupby('subcategoria')['valor'].sum().sort_values(ascending=False)
+    if len(totais) > max_barras:
+        # O excedente entra na barra "outros" já existente, em vez de criar uma segunda
+        resto = CATEGORIA_PADRAO[1]
+        principais = totais.drop(resto, errors='ignore').iloc[:max_barras - 1]
+        totais = pd.concat([principais, pd.Series({resto: totais.sum() - principais.sum()})])
+    return totais.sort_values(ascending=True)
@@ -0,0 +1,131 @@
+"""Configuração, secrets e clientes compartilhados, sem dependência do Streamlit"""
+import logging
+import os
+import tomllib
+from threading import Lock
+
+import metrics
+from openai_scheduler import RateLimitScheduler, ScheduledOpenAI
+from whatsapp_client import GRAPH_API_URL, WhatsAppClient
+
+logger = logging.getLogger("financas")
+
+# Arquivo de secrets no mesmo formato usado pelo Streamlit (tabela [secrets])
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+# Destino extra dos erros (a interface registra st.error aqui)
+_notificador = None
+
+
+def definir_notificador(notificador):
+    """Define uma função que também recebe as mensagens de erro (ou None)"""
+    global _notificador
+    _notificador = notificador
+
+
+def reportar_erro(mensagem: str):
+    """Registra o erro no log e, se houver, no notificador da interface"""
+    logger.error(mensagem)
+    metrics.incrementar("erros")
+    if _notificador is not None:
+        try:
+            _notificador(mensagem)
+        except Exception:
+            logger.debug("Notificador de erros falhou", exc_info=True)
+
+
+def carregar_secrets_toml(caminho: str = None) -> dict:
+    """Lê a tabela [secrets] do secrets.toml (SECRETS_PATH ou variável de ambiente)"""
+    caminho = caminho or os.environ.get("SECRETS_PATH", SECRETS_PATH)
+    try:
+        with open(caminho, "rb") as arquivo:
+            return tomllib.load(arquivo).get("secrets", {})
+    except FileNotFoundError:
+        return {}
+
+
+class ConfigManager:
+    """Gerencia as configurações e secrets do aplicativo"""
+    # Clientes compartilhados pelo processo
+    _whatsapp_client = None
+    _whatsapp_lock = Lock()
+    _openai_client = None
+    _openai_lock = Lock()
+
+    # Função que retorna o mapeamento de secrets; None usa ambiente + secrets.toml
+    _fonte_secrets = None
+    _secrets_arquivo = None
+
+    @classmethod
+    def definir_fonte_secrets(cls, fonte):
+        """Define de onde vêm os secrets (ex.: lambda: st.secrets.secrets)"""
+        cls._fonte_secrets = fonte
+
+    @classmethod
+    def _secrets(cls):
+        if cls._fonte_secrets is not None:
+            return cls._fonte_secrets()
+        if cls._secrets_arquivo is None:
+            cls._secrets_arquivo = carregar_secrets_toml()
+        return cls._secrets_arquivo
+
+    @classmethod
+    def get_secret(cls, key: str, default: str = None) -> str:
+        """Recupera um secret de forma segura (variável de ambiente tem precedência)"""
+        if key in os.environ:
+            return os.environ[key]
+        try:
+            return cls._secrets()[key]
+        except Exception as e:
+            if default is not None:
+                return default
+            reportar_erro(f"Erro ao acessar {key}: {str(e)}")
+            return None
+
+    @classmethod
+    def get_whatsapp_client(cls) -> WhatsAppClient:
+        """Retorna o cliente WhatsApp compartilhado (secrets lidos uma única vez)"""
+        with cls._whatsapp_lock:
+            if cls._whatsapp_client is None:
+                cls._whatsapp_client = WhatsAppClient(
+                    cls.get_secret("WHATSAPP_TOKEN"),
+                    cls.get_secret("PHONE_NUMBER_ID"),
+                    base_url=cls.get_secret("WHATSAPP_API_URL", GRAPH_API_URL)
+                )
+            return cls._whatsapp_client
+
+    @staticmethod
+    def send_whatsapp_message(phone_number: str, message: str) -> bool:
+        """Envia mensagem usando a API do WhatsApp"""
+        try:
+            return ConfigManager.get_whatsapp_client().send_text(phone_number, message)
+        except Exception as e:
+            reportar_erro(f"Erro ao enviar mensagem WhatsApp: {str(e)}")
+            return False
+
+    @staticmethod
+    def send_whatsapp_messages(mensagens: list) -> list:
+        """Envia vários (telefone, mensagem) em paralelo pela mesma sessão"""
+        try:
+            return ConfigManager.get_whatsapp_client().send_many(mensagens)
+        except Exception as e:
+            reportar_erro(f"Erro ao enviar mensagens WhatsApp: {str(e)}")
+            return [False] * len(mensagens)
+
+    @classmethod
+    def initialize_openai(cls):
+        """Retorna o cliente OpenAI compartilhado, com limite de taxa por prioridade"""
+        with cls._openai_lock:
+            if cls._openai_client is None:
+                openai_key = cls.get_secret("OPENAI_API_KEY")
+                if not openai_key:
+                    return None
+                scheduler = RateLimitScheduler(
+                    rpm=int(cls.get_secret("OPENAI_RPM", "500")),
+                    tpm=int(cls.get_secret("OPENAI_TPM", "150000")),
+                    max_fila=int(cls.get_secret("OPENAI_MAX_QUEUE", "100"))
+                )
+                from openai import OpenAI
+                cls._openai_client = ScheduledOpenAI(OpenAI(api_key=openai_key, max_retries=0), scheduler)
+                metrics.registrar_coletor("openai_scheduler", lambda: scheduler.stats)
+            return cls._openai_client
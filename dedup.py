@@ -0,0 +1,89 @@
+"""Deduplicação das mensagens reentregues pelo webhook do WhatsApp"""
+import sqlite3
+import threading
+import time
+
+from cache import LRUCache
+
+
+class MessageDeduplicator:
+    """Índice limitado dos IDs de mensagens vistos na janela de tempo
+
+    A verificação em memória (LRU com TTL) atende as repetições no mesmo
+    processo; com path, um SQLite compartilhado cobre também reentregas
+    que caem em outro processo do servidor.
+    """
+    def __init__(self, janela: float = 86400.0, maxsize: int = 100000, path: str = None,
+                 limpeza_a_cada: int = 1000):
+        self.janela = janela
+        self._vistos = LRUCache(maxsize=maxsize, ttl=janela)
+        self._lock = threading.Lock()
+        self._limpeza_a_cada = limpeza_a_cada
+        self._insercoes = 0
+        self.verificadas = 0
+        self.repetidas = 0
+
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS mensagens_vistas (
+                        message_id TEXT PRIMARY KEY,
+                        visto_em REAL NOT NULL
+                    )
+                """)
+
+    def _registrar_sqlite(self, message_id: str, agora: float) -> bool:
+        limite = agora - self.janela
+        with self._conn:
+            # Insere o ID, ou renova um registro já vencido; 0 linhas = repetida
+            nova = self._conn.execute("""
+                INSERT INTO mensagens_vistas (message_id, visto_em) VALUES (?, ?)
+                ON CONFLICT(message_id) DO UPDATE SET visto_em = excluded.visto_em
+                WHERE visto_em < ?
+            """, (message_id, agora, limite)).rowcount > 0
+
+            self._insercoes += 1
+            if self._insercoes % self._limpeza_a_cada == 0:
+                self._conn.execute("DELETE FROM mensagens_vistas WHERE visto_em < ?", (limite,))
+        return nova
+
+    def registrar(self, message_id: str) -> bool:
+        """Registra o ID e retorna True se a mensagem ainda não foi vista"""
+        with self._lock:
+            self.verificadas += 1
+            if message_id in self._vistos:
+                self.repetidas += 1
+                return False
+
+            nova = True
+            if self._conn is not None:
+                nova = self._registrar_sqlite(message_id, time.time())
+            self._vistos.set(message_id, True)
+            if not nova:
+                self.repetidas += 1
+            return nova
+
+    def esquecer(self, message_id: str):
+        """Remove o ID, para que uma reentrega seja processada (ex.: fila cheia)"""
+        with self._lock:
+            self._vistos.invalidate(message_id)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM mensagens_vistas WHERE message_id = ?", (message_id,))
+
+    def stats(self) -> dict:
+        """Retorna os contadores de mensagens verificadas e repetidas"""
+        with self._lock:
+            cache = self._vistos.stats()
+            return {
+                'verificadas': self.verificadas,
+                'repetidas': self.repetidas,
+                'taxa_repeticao': self.repetidas / self.verificadas if self.verificadas else 0.0,
+                'tamanho': cache['tamanho'],
+                'capacidade': cache['capacidade'],
+                'evictions': cache['evictions'],
+                'persistente': self._conn is not None,
+            }
@@ -0,0 +1,219 @@
+"""Interpretação local de mensagens de gasto, sem chamada ao LLM"""
+import re
+import threading
+import unicodedata
+
+# Palavras usuais nas mensagens que não aparecem como subcategoria.
+# Chaves sem acento; valores em (categoria, subcategoria) de CATEGORIAS.
+PALAVRAS_CHAVE = {
+    "almoco": ("alimentacao", "restaurante"),
+    "jantar": ("alimentacao", "restaurante"),
+    "janta": ("alimentacao", "restaurante"),
+    "lanche": ("alimentacao", "restaurante"),
+    "marmita": ("alimentacao", "restaurante"),
+    "cafe": ("alimentacao", "padaria"),
+    "pao": ("alimentacao", "padaria"),
+    "mercado": ("alimentacao", "supermercado"),
+    "feira": ("alimentacao", "supermercado"),
+    "ifood": ("alimentacao", "delivery"),
+    "uber eats": ("alimentacao", "delivery"),
+    "rappi": ("alimentacao", "delivery"),
+    "aluguel": ("moradia", "aluguel"),
+    "condominio": ("moradia", "condomínio"),
+    "energia": ("moradia", "luz"),
+    "conta de luz": ("moradia", "luz"),
+    "conta de agua": ("moradia", "água"),
+    "botijao": ("moradia", "gás"),
+    "wifi": ("moradia", "internet"),
+    "gasolina": ("transporte", "combustível"),
+    "etanol": ("transporte", "combustível"),
+    "diesel": ("transporte", "combustível"),
+    "abastecer": ("transporte", "combustível"),
+    "abasteci": ("transporte", "combustível"),
+    "uber": ("transporte", "uber/99"),
+    "taxi": ("transporte", "uber/99"),
+    "onibus": ("transporte", "transporte público"),
+    "metro": ("transporte", "transporte público"),
+    "pedagio": ("transporte", "estacionamento"),
+    "farmacia": ("saude", "medicamentos"),
+    "remedio": ("saude", "medicamentos"),
+    "remedios": ("saude", "medicamentos"),
+    "medico": ("saude", "consultas"),
+    "dentista": ("saude", "consultas"),
+    "consulta": ("saude", "consultas"),
+    "exame": ("saude", "exames"),
+    "faculdade": ("educacao", "mensalidade"),
+    "escola": ("educacao", "mensalidade"),
+    "curso": ("educacao", "cursos"),
+    "livro": ("educacao", "livros"),
+    "netflix": ("lazer", "streaming"),
+    "spotify": ("lazer", "streaming"),
+    "cinema": ("lazer", "cinema/teatro"),
+    "teatro": ("lazer", "cinema/teatro"),
+    "viagem": ("lazer", "viagens"),
+    "hotel": ("lazer", "viagens"),
+    "seguro": ("financeiro", "seguros"),
+    "fatura": ("financeiro", "cartão de crédito"),
+    "cartao": ("financeiro", "cartão de crédito"),
+    "emprestimo": ("financeiro", "empréstimos"),
+}
+
+# Palavras que indicam que a mensagem não é um gasto simples (entradas de dinheiro e perguntas)
+_PALAVRAS_BLOQUEIO = {
+    "recebi", "recebido", "recebida", "ganhei", "salario", "vendi", "vendeu", "vendido", "venda",
+    "reembolso", "reembolsado", "estorno", "estornado", "devolucao",
+    "quanto", "quando", "qual", "como", "relatorio",
+}
+
+_VALOR_RE = re.compile(
+    r"(?:r\$\s*)?(\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?)(?!\d)(\s*(?:reais|real|conto|contos))?",
+    re.IGNORECASE
+)
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+def converter_valor(texto: str) -> float:
+    """Converte um valor em formato brasileiro (1.234,56 / 150,90 / 45.9) em float"""
+    if "," in texto:
+        return float(texto.replace(".", "").replace(",", "."))
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", texto):
+        return float(texto.replace(".", ""))
+    return float(texto)
+
+
+def extrair_valores(texto: str) -> list:
+    """Retorna os valores monetários da mensagem como (valor, explícito, início, fim)
+
+    Um valor é explícito quando vem com "R$" ou seguido de "reais".
+    """
+    valores = []
+    for match in _VALOR_RE.finditer(texto):
+        inicio = match.start()
+        # Ignorar números colados a letras ou barras (ex.: "uber/99", "4g")
+        if inicio > 0 and (texto[inicio - 1].isalpha() or texto[inicio - 1] == "/"):
+            continue
+        explicito = match.group(0).lower().startswith("r$") or bool(match.group(2))
+        valores.append((converter_valor(match.group(1)), explicito, match.start(), match.end()))
+    return valores
+
+
+def mascarar_valores(texto: str) -> str:
+    """Substitui os valores monetários da mensagem por um marcador"""
+    return _VALOR_RE.sub("<valor>", texto)
+
+
+def extrair_valor(texto: str):
+    """Retorna o único valor da mensagem, ou None se ausente ou ambíguo"""
+    valores = extrair_valores(texto)
+    explicitos = [v for v in valores if v[1]]
+    if len(explicitos) == 1:
+        return explicitos[0][0]
+    if len(valores) == 1:
+        return valores[0][0]
+    return None
+
+
+def construir_indice(categorias: dict, palavras_chave: dict = None) -> dict:
+    """Monta o índice termo normalizado -> (categoria, subcategoria)"""
+    indice = {}
+    ambiguas = set()
+    for categoria, dados in categorias.items():
+        for subcategoria in dados["subcategorias"]:
+            for termo in subcategoria.split("/"):
+                chave = normalizar_texto(termo)
+                if chave.isdigit():
+                    continue
+                if chave in indice and indice[chave] != (categoria, subcategoria):
+                    ambiguas.add(chave)
+                indice[chave] = (categoria, subcategoria)
+    # Subcategorias repetidas (ex.: manutenção) não decidem a categoria sozinhas
+    for chave in ambiguas:
+        del indice[chave]
+    indice.update(palavras_chave if palavras_chave is not None else PALAVRAS_CHAVE)
+    return indice
+
+
+class ExpenseParser:
+    """Reconhece gastos simples por regras, a partir do vocabulário de CATEGORIAS"""
+    def __init__(self, categorias: dict, palavras_chave: dict = None):
+        self.indice = construir_indice(categorias, palavras_chave)
+        self.max_palavras = max(len(chave.split()) for chave in self.indice)
+
+    def _encontrar_categorias(self, palavras: list) -> dict:
+        """Retorna {(categoria, subcategoria): (posição, tamanho)} dos termos encontrados
+
+        Termos mais longos têm precedência: palavras já cobertas por um termo
+        encontrado (ex.: "uber eats") não contam de novo isoladas ("uber").
+        """
+        encontrados = {}
+        cobertas = set()
+        for tamanho in range(self.max_palavras, 0, -1):
+            for i in range(len(palavras) - tamanho + 1):
+                if cobertas.intersection(range(i, i + tamanho)):
+                    continue
+                termo = " ".join(palavras[i:i + tamanho])
+                if termo in self.indice:
+                    encontrados.setdefault(self.indice[termo], (i, tamanho))
+                    cobertas.update(range(i, i + tamanho))
+        return encontrados
+
+    def parse(self, mensagem: str):
+        """Interpreta a mensagem; retorna o resultado ou None se não houver alta confiança"""
+        texto = normalizar_texto(mensagem)
+        if "?" in texto:
+            return None
+
+        valor = extrair_valor(texto)
+        if valor is None or valor <= 0:
+            return None
+
+        tokens = re.findall(r"[^\W_]+", mensagem.lower())
+        palavras = [normalizar_texto(token) for token in tokens]
+        if _PALAVRAS_BLOQUEIO.intersection(palavras):
+            return None
+
+        encontrados = self._encontrar_categorias(palavras)
+        if len(encontrados) != 1:
+            return None
+
+        (categoria, subcategoria), (inicio, tamanho) = next(iter(encontrados.items()))
+        return {
+            "categoria": categoria,
+            "subcategoria": subcategoria,
+            "valor": valor,
+            "descricao": " ".join(tokens[inicio:inicio + tamanho]).capitalize(),
+            "sucesso": True,
+            "mensagem": ""
+        }
+
+
+class PathStats:
+    """Contadores de uso e latência por caminho de processamento"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caminhos = {}
+
+    def registrar(self, caminho: str, segundos: float):
+        with self._lock:
+            dados = self._caminhos.setdefault(caminho, {'chamadas': 0, 'tempo_total': 0.0})
+            dados['chamadas'] += 1
+            dados['tempo_total'] += segundos
+
+    def snapshot(self) -> dict:
+        """Retorna chamadas, fração do total e latência média de cada caminho"""
+        with self._lock:
+            total = sum(d['chamadas'] for d in self._caminhos.values())
+            return {
+                caminho: {
+                    'chamadas': d['chamadas'],
+                    'taxa': d['chamadas'] / total if total else 0.0,
+                    'latencia_media': d['tempo_total'] / d['chamadas'] if d['chamadas'] else 0.0,
+                }
+                for caminho, d in self._caminhos.items()
+            }
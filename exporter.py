@@ -0,0 +1,92 @@
+"""Exportação das transações em partes, sem montar o arquivo inteiro em memória"""
+import gzip
+import io
+import os
+import tempfile
+
+# Formatos disponíveis: nome -> (extensão, mime)
+FORMATOS = {
+    "csv": ("csv", "text/csv"),
+    "csv.gz": ("csv.gz", "application/gzip"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+class ArquivoExportado(io.BufferedReader):
+    """Arquivo temporário somente leitura, apagado do disco ao ser fechado
+
+    Por ser um BufferedReader, pode ser passado direto ao st.download_button.
+    """
+    def __init__(self, caminho: str):
+        super().__init__(io.FileIO(caminho, "rb"))
+        self.caminho = caminho
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            try:
+                os.remove(self.caminho)
+            except FileNotFoundError:
+                pass
+
+
+def gerar_csv(partes):
+    """Gera o CSV em pedaços de bytes, um por parte do DataFrame"""
+    cabecalho = True
+    for parte in partes:
+        yield parte.to_csv(index=False, header=cabecalho, date_format="%Y-%m-%d %H:%M:%S").encode("utf-8")
+        cabecalho = False
+
+
+def escrever_csv(partes, destino, comprimir: bool = False):
+    """Escreve o CSV (opcionalmente gzip) no arquivo binário destino"""
+    saida = gzip.GzipFile(fileobj=destino, mode="wb") if comprimir else destino
+    try:
+        for pedaco in gerar_csv(partes):
+            saida.write(pedaco)
+    finally:
+        if comprimir:
+            saida.close()
+
+
+def escrever_parquet(partes, destino):
+    """Escreve as partes como row groups de um único arquivo Parquet"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow") from e
+
+    writer = None
+    try:
+        for parte in partes:
+            tabela = pa.Table.from_pandas(parte, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(destino, tabela.schema, compression="snappy")
+            writer.write_table(tabela.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def exportar(partes, formato: str = "csv") -> ArquivoExportado:
+    """Exporta as partes para um arquivo temporário em disco e o retorna aberto para leitura
+
+    As partes são gravadas uma a uma, sem montar o arquivo em memória; quem
+    chama deve fechá-lo ao terminar, o que também apaga o arquivo.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+    descritor, caminho = tempfile.mkstemp(prefix="financas-export-", suffix=f".{FORMATOS[formato][0]}")
+    try:
+        with open(descritor, "wb") as destino:
+            if formato == "parquet":
+                escrever_parquet(partes, destino)
+            else:
+                escrever_csv(partes, destino, comprimir=formato == "csv.gz")
+        return ArquivoExportado(caminho)
+    except Exception:
+        os.remove(caminho)
+        raise
@@ -0,0 +1,99 @@
+"""Cache das categorizações feitas pelo LLM"""
+import json
+import logging
+import os
+import threading
+import time
+
+from cache import LRUCache
+from expense_parser import extrair_valor, mascarar_valores, normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_GLOBAL = "global"
+
+# Campos do resultado do LLM que não dependem do valor informado
+_CAMPOS = ("categoria", "subcategoria", "descricao")
+
+
+class CategorizationCache:
+    """Cache LRU das respostas do LLM, indexado pela mensagem normalizada
+
+    A chave ignora maiúsculas, acentos e o valor do gasto, então
+    "Café 5,50" e "cafe 7" reaproveitam a mesma categorização com o novo
+    valor. Cada resultado é guardado no namespace do usuário e no global.
+    """
+    def __init__(self, maxsize: int = 5000, path: str = None, intervalo_persistencia: float = 30.0):
+        self._cache = LRUCache(maxsize=maxsize)
+        self.path = path
+        self.intervalo_persistencia = intervalo_persistencia
+        self._lock = threading.Lock()
+        self._alterado = False
+        self._salvo_em = time.monotonic()
+        if path and os.path.exists(path):
+            self._carregar()
+
+    @staticmethod
+    def chave(mensagem: str) -> str:
+        """Mensagem normalizada, com os valores mascarados"""
+        return mascarar_valores(normalizar_texto(mensagem)).strip(" .!")
+
+    def get(self, mensagem: str, usuario: str = None):
+        """Retorna a categorização em cache com o valor da nova mensagem, ou None"""
+        valor = extrair_valor(normalizar_texto(mensagem))
+        if valor is None:
+            return None
+
+        chave = self.chave(mensagem)
+        namespaces = ([usuario] if usuario else []) + [NAMESPACE_GLOBAL]
+        for namespace in namespaces:
+            resultado = self._cache.get((namespace, chave))
+            if resultado:
+                return {**resultado, "valor": valor, "sucesso": True, "mensagem": ""}
+        return None
+
+    def set(self, mensagem: str, resultado: dict, usuario: str = None):
+        """Guarda uma categorização bem-sucedida do LLM"""
+        if not resultado.get("sucesso") or not resultado.get("categoria"):
+            return
+
+        chave = self.chave(mensagem)
+        entrada = {campo: resultado.get(campo, "") for campo in _CAMPOS}
+        if usuario:
+            self._cache.set((usuario, chave), entrada)
+        self._cache.set((NAMESPACE_GLOBAL, chave), entrada)
+
+        with self._lock:
+            self._alterado = True
+            vencido = time.monotonic() - self._salvo_em >= self.intervalo_persistencia
+        if self.path and vencido:
+            self.salvar()
+
+    def salvar(self):
+        """Grava o cache em disco (se configurado com path)"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._alterado:
+                return
+            entradas = [[ns, chave, valor] for (ns, chave), valor in self._cache.items()]
+            self._alterado = False
+            self._salvo_em = time.monotonic()
+        try:
+            temporario = f"{self.path}.tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(entradas, arquivo, ensure_ascii=False)
+            os.replace(temporario, self.path)
+        except OSError as e:
+            logger.warning("Não foi possível salvar o cache de categorização: %s", e)
+
+    def _carregar(self):
+        try:
+            with open(self.path, encoding="utf-8") as arquivo:
+                for namespace, chave, valor in json.load(arquivo):
+                    self._cache.set((namespace, chave), valor)
+        except (OSError, ValueError) as e:
+            logger.warning("Cache de categorização ignorado: %s", e)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
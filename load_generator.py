@@ -0,0 +1,176 @@
+"""Gerador de carga para o /webhook: envios assíncronos com taxa, concorrência e duração"""
+import asyncio
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+# Mensagens usadas quando nenhum corpus é informado
+CORPUS_PADRAO = [
+    "Gastei 50 reais no almoço",
+    "uber 23,90",
+    "mercado 187,45",
+    "gasolina 200",
+    "comprei um presente de 89,90",
+    "netflix 55,90",
+    "farmácia 42,30",
+    "relatorio",
+]
+
+# Janela (s) usada para a taxa de envios recente exibida ao vivo
+JANELA_RECENTE = 5.0
+
+
+def _percentil(ordenados: list, q: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+class LoadStats:
+    """Contadores do teste de carga, atualizados pelos envios e lidos pela interface"""
+    def __init__(self, max_amostras: int = 100000):
+        self._lock = threading.Lock()
+        self.inicio = None
+        self.fim = None
+        self.enviados = 0
+        self.mensagens = 0
+        self.erros = 0
+        self.status = {}
+        self._latencias = deque(maxlen=max_amostras)
+        self._recentes = deque()  # instantes de conclusão dentro da janela recente
+
+    def registrar(self, latencia: float, status, mensagens: int):
+        """status é o código HTTP ou o nome da exceção do envio"""
+        agora = time.monotonic()
+        with self._lock:
+            self.enviados += 1
+            self.mensagens += mensagens
+            self.status[status] = self.status.get(status, 0) + 1
+            if not (isinstance(status, int) and status < 400):
+                self.erros += 1
+            self._latencias.append(latencia)
+            self._recentes.append(agora)
+            while self._recentes and self._recentes[0] < agora - JANELA_RECENTE:
+                self._recentes.popleft()
+
+    def snapshot(self) -> dict:
+        """RPS total e recente, taxa de erro e percentis de latência (ms)"""
+        agora = time.monotonic()
+        with self._lock:
+            decorrido = ((self.fim or agora) - self.inicio) if self.inicio else 0.0
+            latencias = sorted(self._latencias)
+            recentes = sum(1 for instante in self._recentes if instante >= agora - JANELA_RECENTE)
+            return {
+                'decorrido_s': decorrido,
+                'enviados': self.enviados,
+                'mensagens': self.mensagens,
+                'rps': self.enviados / decorrido if decorrido else 0.0,
+                'rps_recente': recentes / min(JANELA_RECENTE, decorrido) if decorrido else 0.0,
+                'taxa_erro': self.erros / self.enviados if self.enviados else 0.0,
+                'status': dict(self.status),
+                'p50_ms': _percentil(latencias, 0.50) * 1000,
+                'p95_ms': _percentil(latencias, 0.95) * 1000,
+                'p99_ms': _percentil(latencias, 0.99) * 1000,
+            }
+
+
+class LoadGenerator:
+    """Envia payloads sintéticos do WhatsApp ao webhook a uma taxa fixa
+
+    Os envios são agendados em malha aberta (taxa por segundo, independente
+    das respostas) e limitados por concorrencia requisições em andamento.
+    Cada envelope leva mensagens_por_envelope mensagens; com taxa_duplicadas,
+    parte das mensagens repete o ID de uma mensagem já enviada, como nas
+    reentregas do WhatsApp.
+    """
+    def __init__(self, url: str, concorrencia: int = 10, taxa: float = 10.0, duracao: float = 30.0,
+                 corpus: list = None, mensagens_por_envelope: int = 1, taxa_duplicadas: float = 0.0,
+                 usuarios: int = 20, prefixo_telefone: str = "5500000", timeout: float = 10.0):
+        self.url = url
+        self.concorrencia = max(1, concorrencia)
+        self.taxa = max(0.1, taxa)
+        self.duracao = duracao
+        self.corpus = [texto for texto in (corpus or CORPUS_PADRAO) if texto.strip()] or CORPUS_PADRAO
+        self.mensagens_por_envelope = max(1, mensagens_por_envelope)
+        self.taxa_duplicadas = taxa_duplicadas
+        self.telefones = [f"{prefixo_telefone}{i:06d}" for i in range(max(1, usuarios))]
+        self.timeout = timeout
+        self.stats = LoadStats()
+        self._enviadas = deque(maxlen=1000)  # mensagens que podem ser reenviadas como duplicadas
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _mensagem(self) -> dict:
+        if self._enviadas and random.random() < self.taxa_duplicadas:
+            return random.choice(self._enviadas)
+        mensagem = {
+            "from": random.choice(self.telefones),
+            "id": f"wamid.carga.{uuid.uuid4().hex}",
+            "timestamp": str(int(time.time())),
+            "type": "text",
+            "text": {"body": random.choice(self.corpus)}
+        }
+        self._enviadas.append(mensagem)
+        return mensagem
+
+    def gerar_payload(self) -> dict:
+        """Envelope no formato do webhook do WhatsApp Business"""
+        return {
+            "object": "whatsapp_business_account",
+            "entry": [{
+                "id": "LOAD_TEST",
+                "changes": [{
+                    "value": {
+                        "messaging_product": "whatsapp",
+                        "metadata": {"display_phone_number": "LOAD_TEST", "phone_number_id": "LOAD_TEST"},
+                        "messages": [self._mensagem() for _ in range(self.mensagens_por_envelope)]
+                    },
+                    "field": "messages"
+                }]
+            }]
+        }
+
+    async def _enviar(self, cliente, limite: asyncio.Semaphore, payload: dict):
+        async with limite:
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.post(self.url, json=payload)
+                status = resposta.status_code
+            except Exception as e:
+                status = type(e).__name__
+            self.stats.registrar(time.perf_counter() - inicio, status, self.mensagens_por_envelope)
+
+    async def executar(self):
+        """Envia à taxa configurada até a duração acabar ou parar() ser chamado"""
+        import httpx
+
+        limite = asyncio.Semaphore(self.concorrencia)
+        conexoes = httpx.Limits(max_connections=self.concorrencia, max_keepalive_connections=self.concorrencia)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=conexoes) as cliente:
+            self.stats.inicio = time.monotonic()
+            intervalo = 1.0 / self.taxa
+            proximo = self.stats.inicio
+            tarefas = set()
+            while not self._parar.is_set() and time.monotonic() - self.stats.inicio < self.duracao:
+                tarefa = asyncio.create_task(self._enviar(cliente, limite, self.gerar_payload()))
+                tarefas.add(tarefa)
+                tarefa.add_done_callback(tarefas.discard)
+                proximo += intervalo
+                await asyncio.sleep(max(0.0, proximo - time.monotonic()))
+            if tarefas:
+                await asyncio.wait(tarefas, timeout=self.timeout)
+            self.stats.fim = time.monotonic()
+
+    def iniciar(self):
+        """Executa o teste em uma thread própria; acompanhe por stats.snapshot()"""
+        self._thread = threading.Thread(target=asyncio.run, args=(self.executar(),), daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
@@ -0,0 +1,234 @@
+"""Fila de ingestão do webhook e pool de workers em background"""
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryQueueBackend:
+    """Fila limitada em memória (perde as mensagens pendentes ao reiniciar)"""
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, envelope: dict) -> bool:
+        """Enfileira um envelope; retorna False se a fila estiver cheia"""
+        try:
+            self._queue.put_nowait(envelope)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout: float):
+        """Retorna o próximo envelope ou None se nada chegar no timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def ack(self, envelope: dict):
+        """Confirma o processamento do envelope"""
+
+    def nack(self, envelope: dict) -> bool:
+        """Devolve o envelope para a fila para nova tentativa"""
+        return self.put(envelope)
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class SQLiteQueueBackend:
+    """Fila durável em SQLite; mensagens em processamento voltam à fila ao reiniciar"""
+    def __init__(self, path: str = "webhook_queue.db", maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fila (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pendente',
+                criado_em REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_fila_status ON fila (status, id)")
+        # Recuperar mensagens que estavam em processamento quando o processo caiu
+        self._conn.execute("UPDATE fila SET status = 'pendente' WHERE status = 'processando'")
+
+    def put(self, envelope: dict) -> bool:
+        with self._lock:
+            pendentes = self._conn.execute(
+                "SELECT COUNT(*) FROM fila WHERE status = 'pendente'"
+            ).fetchone()[0]
+            if pendentes >= self.maxsize:
+                return False
+            self._conn.execute(
+                "INSERT INTO fila (payload, criado_em) VALUES (?, ?)",
+                (json.dumps(envelope), time.time())
+            )
+            self._available.notify()
+            return True
+
+    def get(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self._conn.execute(
+                        "SELECT id, payload FROM fila WHERE status = 'pendente' ORDER BY id LIMIT 1"
+                    ).fetchone()
+                    if row:
+                        self._conn.execute(
+                            "UPDATE fila SET status = 'processando' WHERE id = ?", (row[0],)
+                        )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+                if row:
+                    envelope = json.loads(row[1])
+                    envelope['_id'] = row[0]
+                    return envelope
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._available.wait(remaining)
+
+    def ack(self, envelope: dict):
+        with self._lock:
+            self._conn.execute("DELETE FROM fila WHERE id = ?", (envelope['_id'],))
+
+    def nack(self, envelope: dict) -> bool:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE fila SET status = 'pendente', payload = ? WHERE id = ?",
+                (json.dumps({k: v for k, v in envelope.items() if k != '_id'}), envelope['_id'])
+            )
+            self._available.notify()
+            return True
+
+    def qsize(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM fila WHERE status = 'pendente'"
+            ).fetchone()[0]
+
+
+class WorkerPool:
+    """Pool de workers que consome a fila de ingestão do webhook"""
+    def __init__(self, handler, backend=None, num_workers: int = 4, max_tentativas: int = 3):
+        self.handler = handler
+        self.backend = backend or MemoryQueueBackend()
+        self.num_workers = num_workers
+        self.max_tentativas = max_tentativas
+        self._threads = []
+        self._stop = threading.Event()
+        self._accepting = True
+        self._lock = threading.Lock()
+        self._stats = {
+            'enfileiradas': 0,
+            'rejeitadas': 0,
+            'processadas': 0,
+            'falhas': 0,
+            'retentativas': 0,
+            'em_processamento': 0,
+            'profundidade_maxima': 0,
+            'espera_total': 0.0,
+        }
+
+    def start(self):
+        """Inicia as threads dos workers"""
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, item: dict) -> bool:
+        """Enfileira um item; retorna False quando há backpressure"""
+        if not self._accepting:
+            return False
+
+        envelope = {'item': item, 'enfileirado_em': time.time(), 'tentativas': 0}
+        ok = self.backend.put(envelope)
+        with self._lock:
+            if ok:
+                self._stats['enfileiradas'] += 1
+                self._stats['profundidade_maxima'] = max(
+                    self._stats['profundidade_maxima'], self.backend.qsize()
+                )
+            else:
+                self._stats['rejeitadas'] += 1
+        return ok
+
+    def _run(self):
+        while True:
+            envelope = self.backend.get(timeout=0.5)
+            if envelope is None:
+                if self._stop.is_set():
+                    return
+                continue
+
+            with self._lock:
+                self._stats['em_processamento'] += 1
+                self._stats['espera_total'] += time.time() - envelope['enfileirado_em']
+
+            try:
+                self.handler(envelope['item'])
+                self.backend.ack(envelope)
+                with self._lock:
+                    self._stats['processadas'] += 1
+            except Exception as e:
+                envelope['tentativas'] += 1
+                if envelope['tentativas'] < self.max_tentativas and self.backend.nack(envelope):
+                    logger.warning("Erro ao processar mensagem (tentativa %d): %s", envelope['tentativas'], e)
+                    with self._lock:
+                        self._stats['retentativas'] += 1
+                else:
+                    logger.exception("Mensagem descartada após %d tentativas", envelope['tentativas'])
+                    self.backend.ack(envelope)
+                    with self._lock:
+                        self._stats['falhas'] += 1
+            finally:
+                with self._lock:
+                    self._stats['em_processamento'] -= 1
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Para de aceitar mensagens e aguarda a fila esvaziar"""
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                ocupado = self._stats['em_processamento']
+            if self.backend.qsize() == 0 and ocupado == 0:
+                break
+            time.sleep(0.05)
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        drained = self.backend.qsize() == 0
+        if not drained:
+            logger.warning("Fila encerrada com %d mensagens pendentes", self.backend.qsize())
+        return drained
+
+    def metrics(self) -> dict:
+        """Retorna as métricas de backpressure da fila"""
+        with self._lock:
+            stats = dict(self._stats)
+        espera_total = stats.pop('espera_total')
+        atendidas = stats['processadas'] + stats['falhas'] + stats['retentativas']
+        stats['profundidade'] = self.backend.qsize()
+        stats['capacidade'] = self.backend.maxsize
+        stats['workers'] = self.num_workers
+        stats['espera_media'] = espera_total / atendidas if atendidas else 0.0
+        return stats
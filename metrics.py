@@ -0,0 +1,157 @@
+"""Métricas do processo (tempos por etapa e contadores) no formato do Prometheus"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIXO = "financas"
+
+# Limites (em segundos) dos buckets dos histogramas de tempo
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _nome_metrica(*partes) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(partes))
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{chave}="{_escapar(valor)}"' for chave, valor in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    """Contagens cumulativas por bucket, soma e total de observações"""
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+    def quantil(self, q: float) -> float:
+        """Estimativa do quantil pelo limite do primeiro bucket que o contém"""
+        if not self.total:
+            return 0.0
+        alvo = q * self.total
+        for limite, contagem in zip(self.buckets, self.contagens):
+            if contagem >= alvo:
+                return limite
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Histogramas de tempo por etapa, contadores e coletores de estatísticas
+
+    Coletores são funções registradas pelos componentes que já mantêm
+    seus próprios contadores (caches, writer, agendador); são lidos apenas
+    quando as métricas são exportadas.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._etapas = {}      # etapa -> Histogram
+        self._contadores = {}  # (nome, labels ordenados) -> valor
+        self._coletores = {}   # nome -> função que retorna dict de números
+
+    def observar(self, etapa: str, segundos: float):
+        with self._lock:
+            histograma = self._etapas.get(etapa)
+            if histograma is None:
+                histograma = self._etapas[etapa] = Histogram()
+            histograma.observar(segundos)
+
+    @contextmanager
+    def medir(self, etapa: str):
+        """Mede o tempo do bloco e registra no histograma da etapa"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def incrementar(self, nome: str, valor: float = 1, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+
+    def registrar_coletor(self, nome: str, coletor):
+        """Registra uma função que retorna {métrica: valor} lida a cada exportação"""
+        with self._lock:
+            self._coletores[nome] = coletor
+
+    def _coletar(self) -> dict:
+        with self._lock:
+            coletores = dict(self._coletores)
+        valores = {}
+        for nome, coletor in coletores.items():
+            try:
+                dados = coletor() or {}
+            except Exception:
+                continue
+            valores[nome] = {
+                chave: float(valor) for chave, valor in dados.items()
+                if isinstance(valor, (int, float)) and not isinstance(valor, bool)
+            }
+        return valores
+
+    def snapshot(self) -> dict:
+        """Resumo para exibição: tempos por etapa, contadores e estatísticas coletadas"""
+        with self._lock:
+            etapas = {
+                etapa: {
+                    'chamadas': h.total,
+                    'media_ms': h.soma / h.total * 1000 if h.total else 0.0,
+                    'p95_ms': h.quantil(0.95) * 1000,
+                }
+                for etapa, h in self._etapas.items()
+            }
+            contadores = {
+                nome + _rotulos(dict(labels)): valor
+                for (nome, labels), valor in self._contadores.items()
+            }
+        return {'etapas': etapas, 'contadores': contadores, 'coletores': self._coletar()}
+
+    def exportar_prometheus(self) -> str:
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        linhas = []
+        with self._lock:
+            nome = f"{PREFIXO}_etapa_segundos"
+            linhas += [f"# HELP {nome} Tempo das etapas do processamento", f"# TYPE {nome} histogram"]
+            for etapa, h in sorted(self._etapas.items()):
+                for limite, contagem in zip(h.buckets, h.contagens):
+                    linhas.append(f"{nome}_bucket{_rotulos({'etapa': etapa, 'le': limite})} {contagem}")
+                linhas.append(f"{nome}_bucket{_rotulos({'etapa': etapa, 'le': '+Inf'})} {h.total}")
+                linhas.append(f"{nome}_sum{_rotulos({'etapa': etapa})} {h.soma}")
+                linhas.append(f"{nome}_count{_rotulos({'etapa': etapa})} {h.total}")
+
+            por_nome = {}
+            for (nome, labels), valor in self._contadores.items():
+                por_nome.setdefault(nome, []).append((dict(labels), valor))
+        for nome, series in sorted(por_nome.items()):
+            metrica = _nome_metrica(PREFIXO, nome, "total")
+            linhas.append(f"# TYPE {metrica} counter")
+            linhas += [f"{metrica}{_rotulos(labels)} {valor}" for labels, valor in series]
+
+        for coletor, valores in sorted(self._coletar().items()):
+            for chave, valor in sorted(valores.items()):
+                metrica = _nome_metrica(PREFIXO, coletor, chave)
+                linhas += [f"# TYPE {metrica} gauge", f"{metrica} {valor}"]
+        return "\n".join(linhas) + "\n"
+
+
+# Registro único do processo
+REGISTRY = MetricsRegistry()
+
+medir = REGISTRY.medir
+incrementar = REGISTRY.incrementar
+registrar_coletor = REGISTRY.registrar_coletor
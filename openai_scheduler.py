@@ -0,0 +1,203 @@
+"""Agendamento das chamadas à OpenAI respeitando os limites de taxa"""
+import heapq
+import itertools
+import logging
+import re
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Prioridades (menor valor é atendido primeiro)
+PRIORIDADE_INTERATIVA = 0  # categorização de mensagens do usuário
+PRIORIDADE_EXTRATO = 1     # análise de extratos
+PRIORIDADE_RELATORIO = 2   # análises e relatórios
+
+# Tokens reservados por imagem enviada ao modelo de visão
+TOKENS_POR_IMAGEM = 1000
+
+_DURACAO_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIDADES = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimitExceeded(Exception):
+    """Chamada descartada por falta de capacidade dentro do tempo de espera"""
+
+
+def converter_duracao(texto: str) -> float:
+    """Converte durações dos headers da OpenAI ("1s", "6m0s", "20ms") em segundos"""
+    return sum(float(valor) * _UNIDADES[unidade] for valor, unidade in _DURACAO_RE.findall(texto or ""))
+
+
+def estimar_tokens_mensagens(messages: list, max_tokens: int = None) -> int:
+    """Estimativa dos tokens de entrada e saída de uma chamada de chat"""
+    caracteres = 0
+    imagens = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            caracteres += len(content)
+        elif isinstance(content, list):
+            for parte in content:
+                if parte.get("type") == "text":
+                    caracteres += len(parte.get("text", ""))
+                else:
+                    imagens += 1
+    return caracteres // 4 + imagens * TOKENS_POR_IMAGEM + (max_tokens or 500)
+
+
+class TokenBucket:
+    """Balde de fichas reabastecido continuamente até a capacidade por minuto"""
+    def __init__(self, por_minuto: float):
+        self.capacidade = float(por_minuto)
+        self.disponivel = float(por_minuto)
+        self._atualizado_em = time.monotonic()
+
+    def _reabastecer(self):
+        agora = time.monotonic()
+        self.disponivel = min(
+            self.capacidade,
+            self.disponivel + (agora - self._atualizado_em) * self.capacidade / 60.0
+        )
+        self._atualizado_em = agora
+
+    def tempo_ate(self, quantidade: float) -> float:
+        """Segundos até haver quantidade fichas disponíveis"""
+        self._reabastecer()
+        falta = min(quantidade, self.capacidade) - self.disponivel
+        return max(0.0, falta * 60.0 / self.capacidade)
+
+    def consumir(self, quantidade: float):
+        self._reabastecer()
+        self.disponivel -= quantidade
+
+    def limitar(self, restante: float):
+        """Ajusta o saldo ao valor informado pelo servidor, se for menor"""
+        self._reabastecer()
+        self.disponivel = min(self.disponivel, restante)
+
+
+class RateLimitScheduler:
+    """Fila de prioridade com orçamentos de requisições e tokens por minuto
+
+    Cada chamada reserva uma estimativa de tokens antes de ser enviada; o
+    saldo é corrigido com o uso real e com os headers x-ratelimit-* da
+    resposta. Com a fila cheia, chamadas não interativas são descartadas.
+    """
+    def __init__(self, rpm: int = 500, tpm: int = 150000, max_fila: int = 100, max_espera: float = 60.0):
+        self.requisicoes = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_fila = max_fila
+        self.max_espera = max_espera
+        self._cond = threading.Condition()
+        self._fila = []
+        self._sequencia = itertools.count()
+        self._pausado_ate = 0.0
+        self.stats = {'chamadas': 0, 'espera_total': 0.0, 'descartadas': 0, 'rate_limited': 0}
+
+    def acquire(self, tokens: int, prioridade: int = PRIORIDADE_INTERATIVA, timeout: float = None):
+        """Bloqueia até haver capacidade para a chamada ou levanta RateLimitExceeded"""
+        timeout = self.max_espera if timeout is None else timeout
+        inicio = time.monotonic()
+        prazo = inicio + timeout
+        with self._cond:
+            if len(self._fila) >= self.max_fila and prioridade > PRIORIDADE_INTERATIVA:
+                self.stats['descartadas'] += 1
+                raise RateLimitExceeded("Fila de chamadas à OpenAI cheia")
+
+            entrada = (prioridade, next(self._sequencia))
+            heapq.heappush(self._fila, entrada)
+            try:
+                while True:
+                    agora = time.monotonic()
+                    if self._fila[0] == entrada:
+                        espera = max(
+                            self._pausado_ate - agora,
+                            self.requisicoes.tempo_ate(1),
+                            self.tokens.tempo_ate(tokens)
+                        )
+                        if espera <= 0:
+                            self.requisicoes.consumir(1)
+                            self.tokens.consumir(tokens)
+                            self.stats['chamadas'] += 1
+                            self.stats['espera_total'] += agora - inicio
+                            return
+                    else:
+                        espera = self.max_espera
+
+                    if agora >= prazo:
+                        self.stats['descartadas'] += 1
+                        raise RateLimitExceeded("Tempo de espera por capacidade da OpenAI esgotado")
+                    self._cond.wait(min(espera, prazo - agora))
+            finally:
+                self._fila.remove(entrada)
+                heapq.heapify(self._fila)
+                self._cond.notify_all()
+
+    def ajustar_tokens(self, estimados: int, usados: int):
+        """Corrige o saldo de tokens com o uso real informado na resposta"""
+        with self._cond:
+            self.tokens.consumir(usados - estimados)
+
+    def atualizar_com_headers(self, headers):
+        """Sincroniza os saldos com os headers x-ratelimit-* da OpenAI"""
+        with self._cond:
+            for bucket, nome in ((self.requisicoes, "requests"), (self.tokens, "tokens")):
+                limite = headers.get(f"x-ratelimit-limit-{nome}")
+                restante = headers.get(f"x-ratelimit-remaining-{nome}")
+                if limite:
+                    bucket.capacidade = float(limite)
+                if restante is not None:
+                    bucket.limitar(float(restante))
+            self._cond.notify_all()
+
+    def registrar_429(self, retry_after: float):
+        """Pausa o envio de novas chamadas após um 429"""
+        with self._cond:
+            self.stats['rate_limited'] += 1
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + retry_after)
+
+
+class ScheduledOpenAI:
+    """Cliente OpenAI compartilhado cujas chamadas passam pelo agendador
+
+    O cliente deve ser criado com max_retries=0: um 429 pausa o agendador e
+    a chamada volta para a fila, em vez de ser repetida pelo SDK por fora
+    dos limites de taxa.
+    """
+    def __init__(self, client, scheduler: RateLimitScheduler, max_tentativas: int = 3):
+        self.client = client
+        self.scheduler = scheduler
+        self.max_tentativas = max_tentativas
+
+    def chat_completion(self, prioridade: int = PRIORIDADE_INTERATIVA, **kwargs):
+        """Executa chat.completions.create respeitando os limites de taxa"""
+        import openai
+
+        estimados = estimar_tokens_mensagens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        for tentativa in range(1, self.max_tentativas + 1):
+            with metrics.medir("llm_espera"):
+                self.scheduler.acquire(estimados, prioridade)
+            try:
+                with metrics.medir("llm"):
+                    raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+                break
+            except openai.RateLimitError as e:
+                metrics.incrementar("rate_limited", servico="openai")
+                headers = getattr(e.response, "headers", {}) or {}
+                retry_after = float(headers.get("retry-after") or 0) or \
+                    converter_duracao(headers.get("x-ratelimit-reset-requests")) or 1.0
+                self.scheduler.registrar_429(retry_after)
+                if tentativa == self.max_tentativas:
+                    raise
+                metrics.incrementar("retentativas", servico="openai")
+
+        self.scheduler.atualizar_com_headers(raw.headers)
+        response = raw.parse()
+        if getattr(response, "usage", None):
+            self.scheduler.ajustar_tokens(estimados, response.usage.total_tokens)
+            metrics.incrementar("openai_tokens", response.usage.prompt_tokens, tipo="prompt")
+            metrics.incrementar("openai_tokens", response.usage.completion_tokens, tipo="completion")
+        return response
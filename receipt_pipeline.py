@@ -0,0 +1,155 @@
+"""Processamento de fotos de comprovantes: download, redução, hash exato do conteúdo e extração"""
+import hashlib
+import io
+import json
+import re
+import time
+from datetime import datetime
+
+from cache import LRUCache
+from categorias import CATEGORIA_PADRAO, validar
+from expense_parser import PathStats, converter_valor
+
+# Etapas do pipeline, na ordem em que são executadas
+ETAPAS = ("download", "preprocessamento", "hash", "cache", "extracao", "parse")
+
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+
+def _importar_pil():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError as e:
+        raise RuntimeError("Processamento de comprovantes requer o pacote Pillow") from e
+    return Image, ImageOps
+
+
+def preprocessar(conteudo: bytes, max_pixels: int = 1_000_000, max_bytes: int = 300_000):
+    """Reduz a foto a tons de cinza, dentro dos orçamentos de pixels e de bytes
+
+    Retorna (imagem PIL em tons de cinza, JPEG comprimido). A qualidade do
+    JPEG é reduzida e, se necessário, a imagem encolhe até caber em max_bytes.
+    """
+    Image, ImageOps = _importar_pil()
+    imagem = Image.open(io.BytesIO(conteudo))
+    imagem = ImageOps.exif_transpose(imagem).convert("L")
+
+    pixels = imagem.width * imagem.height
+    if pixels > max_pixels:
+        escala = (max_pixels / pixels) ** 0.5
+        imagem = imagem.resize(
+            (max(1, int(imagem.width * escala)), max(1, int(imagem.height * escala))),
+            Image.LANCZOS
+        )
+
+    while True:
+        for qualidade in (85, 70, 55, 40):
+            saida = io.BytesIO()
+            imagem.save(saida, format="JPEG", quality=qualidade, optimize=True)
+            if saida.tell() <= max_bytes:
+                return imagem, saida.getvalue()
+        if min(imagem.size) <= 64:
+            return imagem, saida.getvalue()
+        imagem = imagem.resize((imagem.width * 3 // 4, imagem.height * 3 // 4), Image.LANCZOS)
+
+
+def hash_conteudo(jpeg: bytes) -> str:
+    """SHA-256 do JPEG reduzido, chave do cache de extrações"""
+    return hashlib.sha256(jpeg).hexdigest()
+
+
+def extrair_json(texto: str) -> dict:
+    """Lê o JSON da resposta do modelo, tolerando texto ou blocos ``` ao redor"""
+    try:
+        return json.loads(texto)
+    except (TypeError, ValueError):
+        encontrado = _JSON_RE.search(texto or "")
+        if not encontrado:
+            raise ValueError("Resposta sem JSON")
+        return json.loads(encontrado.group(0))
+
+
+def converter_gastos(resultado: dict) -> list:
+    """Converte a extração do modelo em linhas no formato de save_transaction"""
+    gastos = resultado.get("gastos", []) if isinstance(resultado, dict) else resultado
+    linhas = []
+    for gasto in gastos if isinstance(gastos, list) else []:
+        if not isinstance(gasto, dict):
+            continue
+        try:
+            valor = gasto.get("valor")
+            valor = float(valor) if isinstance(valor, (int, float)) else \
+                converter_valor(str(valor).replace("R$", "").strip())
+        except (TypeError, ValueError):
+            continue
+        if valor <= 0:
+            continue
+
+        par = validar(gasto.get("categoria"), gasto.get("subcategoria")) or CATEGORIA_PADRAO
+        data = None
+        try:
+            data = datetime.strptime(str(gasto.get("data", ""))[:10], "%Y-%m-%d")
+        except ValueError:
+            pass
+        linhas.append({
+            "data": data,
+            "categoria": par[0],
+            "subcategoria": par[1],
+            "valor": valor,
+            "descricao": str(gasto.get("descricao") or "Comprovante")
+        })
+    return linhas
+
+
+class ReceiptPipeline:
+    """Transforma a foto de um comprovante em transações
+
+    Etapas: baixar a mídia, reduzir (tons de cinza, pixels e bytes
+    limitados), calcular o hash do conteúdo, consultar o cache de extrações,
+    extrair com o modelo de visão e converter em linhas. O cache só é usado
+    para a mesma imagem (hash exato): comprovantes diferentes costumam ser
+    visualmente muito parecidos, e reaproveitar a extração de outro
+    registraria os valores errados. A latência de cada etapa é registrada
+    em stats e retornada no resultado.
+    """
+    def __init__(self, baixar, max_pixels: int = 1_000_000, max_bytes: int = 300_000,
+                 cache_size: int = 1000):
+        self.baixar = baixar
+        self.max_pixels = max_pixels
+        self.max_bytes = max_bytes
+        self._cache = LRUCache(maxsize=cache_size)
+        self.stats = PathStats()
+
+    def processar(self, media_id: str, extrair) -> dict:
+        """Executa o pipeline para uma mídia do WhatsApp
+
+        extrair(jpeg_bytes) deve retornar o dict da extração do modelo.
+        Retorna {'transacoes', 'cache', 'latencias'}.
+        """
+        latencias = {}
+
+        def medir(etapa, funcao, *args):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args)
+            finally:
+                latencias[etapa] = time.perf_counter() - inicio
+                self.stats.registrar(etapa, latencias[etapa])
+
+        conteudo = medir("download", self.baixar, media_id)
+        _, jpeg = medir("preprocessamento", preprocessar, conteudo, self.max_pixels, self.max_bytes)
+        chave = medir("hash", hash_conteudo, jpeg)
+
+        extracao = medir("cache", self._cache.get, chave)
+        em_cache = extracao is not None
+        if not em_cache:
+            extracao = medir("extracao", extrair, jpeg)
+
+        transacoes = medir("parse", converter_gastos, extracao)
+        if transacoes and not em_cache:
+            self._cache.set(chave, extracao)
+
+        return {'transacoes': transacoes, 'cache': em_cache, 'latencias': latencias}
+
+    def cache_stats(self) -> dict:
+        return self._cache.stats()
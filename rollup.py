@@ -0,0 +1,95 @@
+"""Agregados mensais de gastos, atualizados a cada transação"""
+import pandas as pd
+
+
+def chave_mes(data) -> str:
+    """Ano-mês (AAAA-MM) da data da transação"""
+    return pd.Timestamp(data).strftime("%Y-%m")
+
+
+class MonthlyRollup:
+    """Totais e contagens por (ano-mês, categoria, subcategoria)
+
+    Cada nova transação atualiza uma única célula em O(1); as consultas
+    percorrem apenas as células do período, não o histórico de transações.
+    """
+    def __init__(self):
+        self.celulas = {}  # (ano_mes, categoria, subcategoria) -> [total, quantidade]
+        self.dias = {}     # ano_mes -> dias do mês com algum gasto
+
+    def adicionar(self, data, categoria: str, subcategoria: str, valor: float):
+        """Soma uma transação ao agregado"""
+        data = pd.Timestamp(data)
+        ano_mes = data.strftime("%Y-%m")
+        celula = self.celulas.setdefault((ano_mes, categoria, subcategoria or ""), [0.0, 0])
+        celula[0] += float(valor)
+        celula[1] += 1
+        self.dias.setdefault(ano_mes, set()).add(data.day)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> "MonthlyRollup":
+        """Monta o agregado a partir de um DataFrame de transações"""
+        rollup = cls()
+        if df.empty:
+            return rollup
+        datas = pd.to_datetime(df['data'])
+        meses = datas.dt.strftime("%Y-%m")
+        subcategorias = df['subcategoria'].fillna("") if 'subcategoria' in df else ""
+        agrupado = df.assign(ano_mes=meses, subcategoria=subcategorias).groupby(
+            ['ano_mes', 'categoria', 'subcategoria']
+        )['valor'].agg(['sum', 'count'])
+        for (ano_mes, categoria, subcategoria), linha in agrupado.iterrows():
+            rollup.celulas[(ano_mes, categoria, subcategoria)] = [float(linha['sum']), int(linha['count'])]
+        for ano_mes, dias in datas.dt.day.groupby(meses):
+            rollup.dias[ano_mes] = set(int(dia) for dia in dias.unique())
+        return rollup
+
+    @classmethod
+    def from_rows(cls, celulas: list, dias: list) -> "MonthlyRollup":
+        """Recria o agregado a partir das linhas persistidas"""
+        rollup = cls()
+        for ano_mes, categoria, subcategoria, total, quantidade in celulas:
+            rollup.celulas[(ano_mes, categoria, subcategoria)] = [total, quantidade]
+        for ano_mes, dia in dias:
+            rollup.dias.setdefault(ano_mes, set()).add(dia)
+        return rollup
+
+    @property
+    def vazio(self) -> bool:
+        return not self.celulas
+
+    def resumo_mes(self, ano_mes: str) -> dict:
+        """Total, média diária e gastos por categoria de um mês"""
+        por_categoria = {}
+        total = 0.0
+        for (mes, categoria, _), (valor, _) in self.celulas.items():
+            if mes == ano_mes:
+                por_categoria[categoria] = por_categoria.get(categoria, 0.0) + valor
+                total += valor
+        dias = len(self.dias.get(ano_mes, ()))
+        return {
+            'total': total,
+            'media_diaria': total / dias if dias else 0.0,
+            'por_categoria': pd.Series(por_categoria, dtype=float),
+        }
+
+    def resumo_categorias(self) -> pd.DataFrame:
+        """Soma, contagem e média por (categoria, subcategoria) em todo o histórico"""
+        acumulado = {}
+        for (_, categoria, subcategoria), (valor, quantidade) in self.celulas.items():
+            soma = acumulado.setdefault((categoria, subcategoria), [0.0, 0])
+            soma[0] += valor
+            soma[1] += quantidade
+        resumo = pd.DataFrame(
+            [(c, s, v, q) for (c, s), (v, q) in acumulado.items()],
+            columns=['categoria', 'subcategoria', 'sum', 'count']
+        ).set_index(['categoria', 'subcategoria']).sort_index()
+        resumo['mean'] = resumo['sum'] / resumo['count']
+        return resumo
+
+    def tendencia_mensal(self) -> pd.Series:
+        """Total gasto por ano-mês"""
+        por_mes = {}
+        for (ano_mes, _, _), (valor, _) in self.celulas.items():
+            por_mes[ano_mes] = por_mes.get(ano_mes, 0.0) + valor
+        return pd.Series(por_mes, dtype=float, name='valor').sort_index()
@@ -0,0 +1,997 @@
+"""Planilhas, usuários, dados e assistente de IA (usados pela interface e pelo webhook)
+
+Bibliotecas pesadas (pandas, gspread, google-auth, classificador de
+extratos) são importadas no primeiro uso, para que o webhook suba rápido.
+"""
+from __future__ import annotations
+
+import atexit
+import base64
+import json
+import re
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from cache import LRUCache
+from categorias import (
+    CATEGORIAS, PROMPT_SISTEMA_COMPROVANTE, PROMPT_SISTEMA_EXTRATO, PROMPT_SISTEMA_LOTE,
+    PROMPT_SISTEMA_MENSAGEM, normalizar_categoria, validar_resultado
+)
+import metrics
+from config import ConfigManager, reportar_erro
+from expense_parser import ExpenseParser, PathStats, converter_valor
+from exporter import exportar
+from llm_cache import CategorizationCache
+from openai_scheduler import PRIORIDADE_EXTRATO, PRIORIDADE_INTERATIVA, PRIORIDADE_RELATORIO
+from sheets_writer import SheetsBatchWriter
+from transaction_store import LocalTransactionStore, chave_particao
+from user_store import CachedUserStore, SQLiteUserStore
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from rollup import MonthlyRollup
+
+
+_DATA_ISO_RE = re.compile(r"(\d{4})-(\d{2})")
+_DATA_BR_RE = re.compile(r"\d{1,2}/(\d{1,2})/(\d{4})")
+_INTERVALO_RE = re.compile(r"(\d+)$")
+
+
+def titulo_particao(ano_mes: str) -> str:
+    """Título da aba mensal de registros"""
+    return f"Registros {ano_mes}"
+
+
+def particao_da_linha(row: list) -> str:
+    """Mês (AAAA-MM) da partição de uma linha, pela coluna de data"""
+    texto = str(row[0]).strip() if row else ""
+    encontrado = _DATA_ISO_RE.match(texto)
+    if encontrado:
+        return f"{encontrado.group(1)}-{encontrado.group(2)}"
+    encontrado = _DATA_BR_RE.match(texto)
+    if encontrado:
+        return f"{encontrado.group(2)}-{int(encontrado.group(1)):02d}"
+    return datetime.now().strftime("%Y-%m")
+
+
+def ultima_linha_gravada(resposta) -> int:
+    """Última linha escrita por um append, segundo o updatedRange da resposta da API"""
+    intervalo = (resposta or {}).get('updates', {}).get('updatedRange', '') if isinstance(resposta, dict) else ''
+    encontrado = _INTERVALO_RE.search(intervalo)
+    return int(encontrado.group(1)) if encontrado else None
+
+
+def meses_no_periodo(inicio, fim) -> list:
+    """Meses (AAAA-MM) cobertos pelo período inicio <= data < fim; None se aberto"""
+    if inicio is None or fim is None:
+        return None
+    ano, mes = inicio.year, inicio.month
+    ultimo = fim - timedelta(microseconds=1) if isinstance(fim, datetime) else fim - timedelta(days=1)
+    meses = []
+    while (ano, mes) <= (ultimo.year, ultimo.month):
+        meses.append(f"{ano}-{mes:02d}")
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return meses
+
+
+def validar_gasto(resultado: dict) -> dict:
+    """Confere (e normaliza no lugar) valor e descrição de um gasto vindo do LLM
+
+    O valor é convertido para float e precisa ser positivo, e a descrição não
+    pode ser vazia; do contrário o resultado passa a sucesso False e não é
+    gravado.
+    """
+    if not resultado.get("sucesso"):
+        return resultado
+    try:
+        valor = resultado.get("valor")
+        valor = float(valor) if isinstance(valor, (int, float)) else \
+            converter_valor(str(valor).replace("R$", "").strip())
+    except (TypeError, ValueError):
+        valor = None
+    descricao = str(resultado.get("descricao") or "").strip()
+    if valor is None or not valor > 0 or not descricao:
+        resultado["sucesso"] = False
+        resultado["mensagem"] = "Não foi possível interpretar o valor ou a descrição do gasto."
+        return resultado
+    resultado["valor"], resultado["descricao"] = valor, descricao
+    return resultado
+
+
+class SheetsManager:
+    """Gerencia as operações com Google Sheets
+
+    Planilhas novas são particionadas por mês: uma aba "Registros AAAA-MM"
+    por mês e a aba de manifesto "Partições", com a última linha de cada
+    partição. Planilhas antigas, sem manifesto, continuam com uma única aba.
+    """
+    SCOPES = [
+        "https://www.googleapis.com/auth/spreadsheets",
+        "https://www.googleapis.com/auth/drive"
+    ]
+
+    CABECALHO = ["Data", "Categoria", "Subcategoria", "Valor", "Descrição"]
+    ABA_MANIFESTO = "Partições"
+    CABECALHO_MANIFESTO = ["Partição", "Aba", "Última linha", "Atualizado em"]
+
+    # Cliente autorizado compartilhado pelo processo
+    _client = None
+    _credentials = None
+    _client_lock = Lock()
+
+    # Handles de planilha/aba já abertos, por sheet_id
+    _handles = LRUCache(maxsize=256, ttl=600)
+
+    # Buffer de escrita em lote compartilhado
+    _writer = None
+    _writer_lock = Lock()
+
+    def __init__(self):
+        self.client = SheetsManager.get_client()
+
+    @classmethod
+    def get_client(cls):
+        """Retorna o cliente gspread compartilhado, renovando o token se expirado"""
+        import gspread
+        from google.auth.transport.requests import Request as GoogleAuthRequest
+        from google.oauth2.service_account import Credentials
+
+        with cls._client_lock:
+            if cls._client is None:
+                info = ConfigManager.get_secret("google_credentials")
+                if isinstance(info, str):
+                    # Em variável de ambiente as credenciais vêm como JSON
+                    info = json.loads(info)
+                cls._credentials = Credentials.from_service_account_info(
+                    dict(info),
+                    scopes=cls.SCOPES
+                )
+                cls._client = gspread.authorize(cls._credentials)
+            elif cls._credentials.token and not cls._credentials.valid:
+                cls._credentials.refresh(GoogleAuthRequest())
+            return cls._client
+
+    @classmethod
+    def get_writer(cls) -> SheetsBatchWriter:
+        """Retorna o writer em lote compartilhado, criando-o se necessário"""
+        with cls._writer_lock:
+            if cls._writer is None:
+                cls._writer = SheetsBatchWriter(
+                    cls._append_rows,
+                    max_linhas=int(ConfigManager.get_secret("SHEETS_BATCH_ROWS", "50")),
+                    max_espera=float(ConfigManager.get_secret("SHEETS_BATCH_DELAY", "1.0"))
+                )
+                metrics.registrar_coletor("sheets_writer", lambda: cls._writer.stats)
+            return cls._writer
+
+    @classmethod
+    def fechar_writer(cls):
+        """Grava as linhas ainda no buffer e encerra o writer (no encerramento do processo)"""
+        with cls._writer_lock:
+            writer = cls._writer
+        if writer is not None:
+            writer.close()
+
+    @classmethod
+    def _append_rows(cls, sheet_id: str, rows: list):
+        """Grava várias linhas de uma vez na aba de registros (uma gravação por partição)"""
+        sheets_manager = SheetsManager()
+        try:
+            with metrics.medir("sheets_append"):
+                if not sheets_manager.particionada(sheet_id):
+                    sheets_manager._get_worksheet(sheet_id).append_rows(rows)
+                else:
+                    por_mes = {}
+                    for row in rows:
+                        por_mes.setdefault(particao_da_linha(row), []).append(row)
+                    for ano_mes, linhas in sorted(por_mes.items()):
+                        sheets_manager._append_particao(sheet_id, ano_mes, linhas)
+        except Exception:
+            cls._invalidar_handles(sheet_id)
+            raise
+        # A cópia local precisa buscar as linhas novas na próxima leitura
+        DataManager.get_store().marcar_desatualizado(sheet_id)
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """Retorna os contadores do cache de planilhas"""
+        return cls._handles.stats()
+
+    def _open_spreadsheet(self, sheet_id: str):
+        """Abre a planilha pelo id ou URL"""
+        if sheet_id.startswith("http"):
+            return self.client.open_by_url(sheet_id)
+        return self.client.open_by_key(sheet_id)
+
+    @classmethod
+    def _invalidar_handles(cls, sheet_id: str, ano_mes: str = None):
+        cls._handles.invalidate(sheet_id)
+        cls._handles.invalidate((sheet_id, cls.ABA_MANIFESTO))
+        cls._handles.invalidate((sheet_id, 'manifesto'))
+        if ano_mes:
+            cls._handles.invalidate((sheet_id, ano_mes))
+
+    def _get_spreadsheet(self, sheet_id: str):
+        def abrir():
+            with metrics.medir("sheets_open"):
+                spreadsheet = self._open_spreadsheet(sheet_id)
+                return spreadsheet, spreadsheet.sheet1
+        return SheetsManager._handles.get_or_set(sheet_id, abrir)
+
+    def _get_worksheet(self, sheet_id: str):
+        """Retorna a aba de registros da planilha, usando o cache de handles"""
+        return self._get_spreadsheet(sheet_id)[1]
+
+    def _get_aba(self, sheet_id: str, chave: str, titulo: str, criar: bool = False):
+        """Aba pelo título, usando o cache de handles; None se não existir e criar=False"""
+        from gspread.exceptions import APIError, WorksheetNotFound
+
+        def abrir():
+            spreadsheet = self._get_spreadsheet(sheet_id)[0]
+            with metrics.medir("sheets_open"):
+                try:
+                    return spreadsheet.worksheet(titulo)
+                except WorksheetNotFound:
+                    if not criar:
+                        return None
+                try:
+                    worksheet = spreadsheet.add_worksheet(titulo, rows=1000, cols=len(self.CABECALHO))
+                except APIError as erro:
+                    # Outro worker criou a aba ao mesmo tempo (título duplicado): usar a dele
+                    try:
+                        return spreadsheet.worksheet(titulo)
+                    except WorksheetNotFound:
+                        raise erro from None
+                # Inserir (e não sobrescrever A1): outro worker que reabriu a aba pode já ter gravado nela
+                worksheet.insert_row(self.CABECALHO, 1)
+                return worksheet
+
+        worksheet = SheetsManager._handles.get_or_set((sheet_id, chave), abrir)
+        if worksheet is None and criar:
+            SheetsManager._handles.invalidate((sheet_id, chave))
+            worksheet = SheetsManager._handles.get_or_set((sheet_id, chave), abrir)
+        return worksheet
+
+    def particionada(self, sheet_id: str) -> bool:
+        """Indica se a planilha usa abas mensais com manifesto"""
+        return self._get_aba(sheet_id, self.ABA_MANIFESTO, self.ABA_MANIFESTO) is not None
+
+    def ler_manifesto(self, sheet_id: str) -> dict:
+        """Lê o manifesto: {AAAA-MM: (linha no manifesto, última linha da partição)}"""
+        worksheet = self._get_aba(sheet_id, self.ABA_MANIFESTO, self.ABA_MANIFESTO)
+        with metrics.medir("sheets_read"):
+            linhas = worksheet.get_all_values()[1:]
+        manifesto = {}
+        for indice, linha in enumerate(linhas, 2):
+            if len(linha) < 3 or not linha[0]:
+                continue
+            try:
+                ultima = int(float(linha[2]))
+            except ValueError:
+                continue
+            # Linhas repetidas (processos concorrentes) valem pelo maior total
+            if linha[0] not in manifesto or ultima > manifesto[linha[0]][1]:
+                manifesto[linha[0]] = (indice, ultima)
+        SheetsManager._handles.set((sheet_id, 'manifesto'), manifesto)
+        return manifesto
+
+    def _append_particao(self, sheet_id: str, ano_mes: str, rows: list):
+        """Grava as linhas na aba do mês e atualiza a última linha no manifesto"""
+        worksheet = self._get_aba(sheet_id, ano_mes, titulo_particao(ano_mes), criar=True)
+        resposta = worksheet.append_rows(rows)
+
+        manifesto = SheetsManager._handles.get((sheet_id, 'manifesto'))
+        if manifesto is None:
+            manifesto = self.ler_manifesto(sheet_id)
+        indice, anterior = manifesto.get(ano_mes, (None, 1))
+        ultima = ultima_linha_gravada(resposta) or anterior + len(rows)
+
+        aba_manifesto = self._get_aba(sheet_id, self.ABA_MANIFESTO, self.ABA_MANIFESTO)
+        registro = [ano_mes, titulo_particao(ano_mes), ultima, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
+        if indice is None:
+            aba_manifesto.append_row(registro)
+            # A posição da linha nova só é conhecida relendo o manifesto
+            SheetsManager._handles.invalidate((sheet_id, 'manifesto'))
+        else:
+            aba_manifesto.update(f'A{indice}:D{indice}', [registro])
+            manifesto[ano_mes] = (indice, ultima)
+
+    def create_new_sheet(self, user_name: str) -> str:
+        """Cria uma nova planilha para o usuário, com o manifesto de partições mensais"""
+        try:
+            # Criar planilha
+            spreadsheet = self.client.create(f"Finanças - {user_name}")
+            
+            # A primeira aba guarda o manifesto; as abas mensais são criadas na primeira gravação
+            worksheet = spreadsheet.sheet1
+            worksheet.update_title(self.ABA_MANIFESTO)
+            worksheet.update('A1:D1', [self.CABECALHO_MANIFESTO])
+            
+            # Formatar cabeçalhos
+            worksheet.format('A1:D1', {
+                "backgroundColor": {"red": 0.8, "green": 0.8, "blue": 0.8},
+                "textFormat": {"bold": True}
+            })
+            
+            # Compartilhar planilha (opcional)
+            spreadsheet.share(None, perm_type='anyone', role='reader')
+            
+            return spreadsheet.url
+            
+        except Exception as e:
+            reportar_erro(f"Erro ao criar planilha: {str(e)}")
+            return None
+
+    @staticmethod
+    def _transaction_row(transaction: dict) -> list:
+        """Converte uma transação na linha da planilha"""
+        data = transaction.get('data') or datetime.now()
+        if isinstance(data, datetime):
+            data = data.strftime("%Y-%m-%d %H:%M:%S")
+        return [
+            data,
+            transaction['categoria'],
+            transaction.get('subcategoria', ''),
+            transaction['valor'],
+            transaction['descricao']
+        ]
+
+    def save_transaction(self, sheet_id: str, transaction: dict) -> Future:
+        """Enfileira uma nova transação para gravação em lote na planilha"""
+        return SheetsManager.get_writer().submit(sheet_id, self._transaction_row(transaction))
+
+    def save_transactions(self, sheet_id: str, transactions: list) -> list:
+        """Enfileira várias transações para um único append na planilha"""
+        return SheetsManager.get_writer().submit_many(
+            sheet_id, [self._transaction_row(transaction) for transaction in transactions]
+        )
+
+    def sync_transactions(self, sheet_id: str, store: LocalTransactionStore, completo: bool = False,
+                          particao: str = None):
+        """Copia para o armazenamento local as linhas novas da planilha (ou de uma partição)"""
+        try:
+            if particao:
+                worksheet = self._get_aba(sheet_id, particao, titulo_particao(particao))
+                if worksheet is None:
+                    raise RuntimeError(f"Aba da partição {particao} não encontrada")
+                ultima = store.ultima_linha(chave_particao(sheet_id, particao))
+            else:
+                worksheet = self._get_worksheet(sheet_id)
+                ultima = store.ultima_linha(sheet_id)
+            primeira_linha = 2 if completo else ultima + 1
+            
+            # Baixar apenas o intervalo após a última linha sincronizada
+            with metrics.medir("sheets_read"):
+                linhas = worksheet.get(
+                    f"A{primeira_linha}:E",
+                    value_render_option="UNFORMATTED_VALUE"
+                )
+            store.aplicar_linhas(sheet_id, primeira_linha, linhas, completo=completo, particao=particao)
+            
+        except Exception as e:
+            SheetsManager._invalidar_handles(sheet_id, particao)
+            reportar_erro(f"Erro ao sincronizar transações: {str(e)}")
+
+    def sync_particoes(self, sheet_id: str, store: LocalTransactionStore, meses: list = None):
+        """Sincroniza apenas as partições (dos meses pedidos) que mudaram desde a última leitura
+
+        O manifesto é relido quando a cópia local pode estar atrasada. Os
+        meses encerrados não passam por recarga completa periódica: só são
+        baixados de novo se o total de linhas no manifesto mudar.
+        """
+        if store.precisa_sincronizar(sheet_id):
+            try:
+                manifesto = self.ler_manifesto(sheet_id)
+            except Exception as e:
+                SheetsManager._invalidar_handles(sheet_id)
+                reportar_erro(f"Erro ao ler o manifesto de partições: {str(e)}")
+                return
+            store.registrar_manifesto(sheet_id, {ano_mes: ultima for ano_mes, (_, ultima) in manifesto.items()})
+
+        desatualizadas = {ano_mes: (local, remota) for ano_mes, local, remota
+                          in store.particoes_desatualizadas(sheet_id, meses)}
+        # O mês corrente ainda pode ser editado na planilha: recarga completa periódica
+        mes_atual = datetime.now().strftime("%Y-%m")
+        if (meses is None or mes_atual in meses) and mes_atual in store.particoes(sheet_id) \
+                and store.precisa_recarregar(chave_particao(sheet_id, mes_atual)):
+            desatualizadas[mes_atual] = (None, None)
+
+        for ano_mes, (local, remota) in sorted(desatualizadas.items()):
+            # Menos linhas que a cópia local indica exclusão: recarregar a partição
+            completo = local is None or remota < local
+            self.sync_transactions(sheet_id, store, completo=completo, particao=ano_mes)
+
+class UserManager:
+    """Gerencia os usuários e seus estados"""
+    # Armazenamento de estado compartilhado pelo processo
+    _store = None
+    _store_lock = Lock()
+
+    def __init__(self, store=None):
+        self.store = store or UserManager.get_store()
+
+    @classmethod
+    def get_store(cls) -> CachedUserStore:
+        """Retorna o armazenamento de estado dos usuários"""
+        with cls._store_lock:
+            if cls._store is None:
+                cls._store = CachedUserStore(
+                    SQLiteUserStore(ConfigManager.get_secret("USER_STORE_PATH", "usuarios.db"))
+                )
+                metrics.registrar_coletor("usuarios_cache", cls._store.stats)
+            return cls._store
+
+    def get_user_state(self, phone_number: str) -> dict:
+        """Retorna o estado atual do usuário"""
+        with metrics.medir("usuario"):
+            return self.store.get(phone_number)
+
+    def update_user_state(self, phone_number: str, updates: dict):
+        """Atualiza o estado do usuário"""
+        self.store.update(phone_number, updates)
+
+    def handle_user_message(self, phone_number: str, message: str) -> str:
+        """Processa mensagem baseado no estado do usuário"""
+        user = self.get_user_state(phone_number)
+        
+        # As transições só são aplicadas se o status não mudou desde a leitura,
+        # evitando que mensagens simultâneas pulem etapas do cadastro
+        if user['status'] == 'new':
+            if self.store.transition(phone_number, 'new', {'status': 'pending_name'}):
+                return """👋 Olá! Bem-vindo ao Assistente Financeiro!
+
+Para começar, preciso de algumas informações:
+
+Por favor, me diga seu nome completo:"""
+
+        elif user['status'] == 'pending_name':
+            if self.store.transition(phone_number, 'pending_name', {'name': message, 'status': 'pending_email'}):
+                return f"""Obrigado, {message}! 
+
+Agora, por favor, me informe seu e-mail:"""
+
+        elif user['status'] == 'pending_email':
+            if '@' in message and '.' in message:  # Validação básica de email
+                if not self.store.transition(phone_number, 'pending_email', {'email': message, 'status': 'creating_sheet'}):
+                    return "Sua planilha já está sendo criada, aguarde um instante."
+                
+                # Criar planilha para o usuário
+                try:
+                    sheets_manager = SheetsManager()
+                    sheet_url = sheets_manager.create_new_sheet(user['name'])
+                    if not sheet_url:
+                        raise RuntimeError("Planilha não criada")
+                    self.store.transition(phone_number, 'creating_sheet', {'sheet_id': sheet_url, 'status': 'active'})
+                    
+                    return f"""✨ Tudo pronto, {user['name']}!
+
+Sua planilha foi criada com sucesso! 
+Acesse aqui: {sheet_url}
+
+Para registrar gastos, você pode:
+1. Enviar mensagens como "Gastei 50 no almoço"
+2. Enviar fotos de comprovantes/notas
+3. Enviar extratos em CSV/PDF
+
+Para ver relatórios, digite "relatorio" a qualquer momento.
+
+Posso ajudar com mais alguma coisa?"""
+                except Exception as e:
+                    self.store.transition(phone_number, 'creating_sheet', {'status': 'pending_email'})
+                    return "Desculpe, houve um erro ao criar sua planilha. Por favor, tente novamente mais tarde."
+            else:
+                return "Por favor, forneça um e-mail válido."
+
+        elif user['status'] == 'creating_sheet':
+            return "Sua planilha já está sendo criada, aguarde um instante."
+
+        return "Como posso ajudar?"
+
+class DataManager:
+    """Gerencia o armazenamento e manipulação dos dados"""
+    # Cópia local das transações, compartilhada pelo processo
+    _store = None
+    _store_lock = Lock()
+
+    # Versão dos dados de cada planilha, incrementada a cada novo gasto
+    _versoes = {}
+    _versoes_lock = Lock()
+
+    def __init__(self, sheet_id: str = None):
+        self.sheet_id = sheet_id
+        self.sheets_manager = SheetsManager() if sheet_id else None
+        self._snapshot = None
+
+    @classmethod
+    def get_store(cls) -> LocalTransactionStore:
+        """Retorna o armazenamento local de transações"""
+        with cls._store_lock:
+            if cls._store is None:
+                cls._store = LocalTransactionStore(
+                    ConfigManager.get_secret("LOCAL_STORE_PATH", "transacoes.db"),
+                    intervalo_sync=float(ConfigManager.get_secret("LOCAL_STORE_SYNC_INTERVAL", "30"))
+                )
+            return cls._store
+
+    @classmethod
+    def invalidar_cache(cls, sheet_id: str):
+        """Invalida os snapshots em cache da planilha"""
+        with cls._versoes_lock:
+            cls._versoes[sheet_id] = cls._versoes.get(sheet_id, 0) + 1
+
+    def versao(self) -> int:
+        """Versão atual dos dados, usada como chave dos caches"""
+        with DataManager._versoes_lock:
+            return DataManager._versoes.get(self.sheet_id, 0)
+
+    def adicionar_gasto(self, gasto: dict, aguardar: bool = True):
+        """Adiciona um novo gasto
+
+        Com aguardar=False retorna o Future da gravação em lote em vez de
+        esperar a confirmação da planilha.
+        """
+        try:
+            if self.sheets_manager and self.sheet_id:
+                future = self.sheets_manager.save_transaction(self.sheet_id, normalizar_categoria(gasto))
+                future.add_done_callback(lambda _: DataManager.invalidar_cache(self.sheet_id))
+                if not aguardar:
+                    return future
+                future.result(timeout=60)
+            return True
+        except Exception as e:
+            reportar_erro(f"Erro ao adicionar gasto: {str(e)}")
+            return False
+
+    def adicionar_gastos(self, gastos: list, timeout: float = 60) -> list:
+        """Adiciona vários gastos na mesma gravação em lote e retorna o resultado de cada um"""
+        if not gastos:
+            return []
+        if not (self.sheets_manager and self.sheet_id):
+            return [True] * len(gastos)
+        try:
+            # Categorias inventadas pelo modelo não chegam à planilha
+            futures = self.sheets_manager.save_transactions(
+                self.sheet_id, [normalizar_categoria(gasto) for gasto in gastos]
+            )
+        except Exception as e:
+            reportar_erro(f"Erro ao adicionar gastos: {str(e)}")
+            return [False] * len(gastos)
+
+        resultados = []
+        for future in futures:
+            try:
+                future.result(timeout=timeout)
+                resultados.append(True)
+            except Exception as e:
+                reportar_erro(f"Erro ao adicionar gasto: {str(e)}")
+                resultados.append(False)
+        DataManager.invalidar_cache(self.sheet_id)
+        return resultados
+
+    def get_dataframe(self) -> pd.DataFrame:
+        """Retorna o DataFrame com todos os gastos, memorizado por versão dos dados"""
+        versao = self.versao()
+        if self._snapshot is None or self._snapshot[0] != versao:
+            self._snapshot = (versao, self._carregar_dataframe())
+        return self._snapshot[1]
+
+    def _sincronizar(self, meses: list = None) -> LocalTransactionStore:
+        """Atualiza a cópia local com as linhas novas da planilha, se necessário
+
+        Em planilhas particionadas, meses limita a sincronização às abas
+        desses meses.
+        """
+        store = DataManager.get_store()
+        if self.sheets_manager.particionada(self.sheet_id):
+            self.sheets_manager.sync_particoes(self.sheet_id, store, meses)
+        elif store.precisa_recarregar(self.sheet_id):
+            self.sheets_manager.sync_transactions(self.sheet_id, store, completo=True)
+        elif store.precisa_sincronizar(self.sheet_id):
+            self.sheets_manager.sync_transactions(self.sheet_id, store)
+        return store
+
+    def _carregar_dataframe(self) -> pd.DataFrame:
+        """Lê os gastos do armazenamento local, sincronizando se necessário"""
+        import pandas as pd
+
+        try:
+            if self.sheets_manager and self.sheet_id:
+                return self._sincronizar().ler(self.sheet_id)
+            return pd.DataFrame()
+        except Exception as e:
+            reportar_erro(f"Erro ao recuperar dados: {str(e)}")
+            return pd.DataFrame()
+
+    def get_rollup(self, meses: list = None) -> MonthlyRollup:
+        """Retorna os agregados mensais dos gastos (dos meses informados), sem ler o histórico completo"""
+        from rollup import MonthlyRollup
+
+        try:
+            if self.sheets_manager and self.sheet_id:
+                return self._sincronizar(meses).carregar_rollup(self.sheet_id, meses)
+            return MonthlyRollup()
+        except Exception as e:
+            reportar_erro(f"Erro ao recuperar agregados: {str(e)}")
+            return MonthlyRollup()
+
+    def exportar(self, formato: str = "csv", inicio=None, fim=None, categorias: list = None):
+        """Exporta os gastos filtrados para um arquivo temporário, parte a parte"""
+        store = self._sincronizar(meses_no_periodo(inicio, fim))
+        return exportar(
+            store.iterar(self.sheet_id, inicio=inicio, fim=fim, categorias=categorias),
+            formato
+        )
+
+    def has_data(self) -> bool:
+        """Verifica se existem dados registrados"""
+        return not self.get_dataframe().empty
+
+class AIFinanceAssistant:
+    """Assistente de IA para processamento de mensagens e análise financeira"""
+    # Interpretação local das mensagens simples, antes do LLM
+    _parser = ExpenseParser(CATEGORIAS)
+
+    # Uso e latência por caminho (regras x cache x llm)
+    stats = PathStats()
+
+    # Classificação local das linhas de extrato, antes do LLM (criada no primeiro extrato)
+    _classifier = None
+    _classifier_lock = Lock()
+
+    # Categorizações já feitas pelo LLM
+    _cache = None
+    _cache_lock = Lock()
+
+    # Pipeline de fotos de comprovantes (criado na primeira imagem)
+    _receipts = None
+    _receipts_lock = Lock()
+
+    def __init__(self, openai_client):
+        self.client = openai_client
+
+    @classmethod
+    def get_cache(cls) -> CategorizationCache:
+        """Retorna o cache de categorizações do LLM"""
+        with cls._cache_lock:
+            if cls._cache is None:
+                cls._cache = CategorizationCache(
+                    maxsize=int(ConfigManager.get_secret("LLM_CACHE_SIZE", "5000")),
+                    path=ConfigManager.get_secret("LLM_CACHE_PATH", "") or None
+                )
+                atexit.register(cls._cache.salvar)
+                metrics.registrar_coletor("llm_cache", cls._cache.stats)
+            return cls._cache
+
+    @classmethod
+    def get_classifier(cls):
+        """Retorna o classificador local de extratos"""
+        from statement_classifier import StatementClassifier
+
+        with cls._classifier_lock:
+            if cls._classifier is None:
+                cls._classifier = StatementClassifier(CATEGORIAS)
+            return cls._classifier
+
+    def _processar_localmente(self, mensagem: str, usuario: str, inicio: float):
+        """Tenta resolver a mensagem pelas regras e pelo cache, sem chamar o LLM"""
+        resultado = AIFinanceAssistant._parser.parse(mensagem)
+        if resultado:
+            AIFinanceAssistant.stats.registrar('regras', time.perf_counter() - inicio)
+            return resultado
+
+        resultado = AIFinanceAssistant.get_cache().get(mensagem, usuario)
+        if resultado:
+            AIFinanceAssistant.stats.registrar('cache', time.perf_counter() - inicio)
+        return resultado
+
+    @staticmethod
+    def _guardar_resultado(mensagem: str, resultado: dict, usuario: str):
+        # Só reaproveitar categorizações que existem no registro
+        if resultado.get('sucesso') and validar_resultado(resultado):
+            AIFinanceAssistant.get_cache().set(mensagem, resultado, usuario)
+
+    def processar_mensagem(self, mensagem: str, usuario: str = None) -> dict:
+        """Processa mensagem do usuário, usando GPT-4 apenas quando regras e cache não resolvem"""
+        inicio = time.perf_counter()
+        resultado = self._processar_localmente(mensagem, usuario, inicio)
+        if resultado:
+            return resultado
+
+        try:
+            resultado = self._processar_mensagem_llm(mensagem)
+            self._guardar_resultado(mensagem, resultado, usuario)
+            return resultado
+        finally:
+            AIFinanceAssistant.stats.registrar('llm', time.perf_counter() - inicio)
+
+    def processar_mensagens(self, mensagens: list, usuario: str = None, agrupar_llm: bool = True) -> list:
+        """Processa várias mensagens do mesmo usuário, retornando um resultado por mensagem
+
+        As que regras e cache não resolvem vão ao LLM em uma única chamada
+        (agrupar_llm); se a resposta do lote vier incompleta, cada uma é
+        enviada separadamente.
+        """
+        inicio = time.perf_counter()
+        resultados = [self._processar_localmente(mensagem, usuario, inicio) for mensagem in mensagens]
+        pendentes = [i for i, resultado in enumerate(resultados) if not resultado]
+
+        if agrupar_llm and self.client and len(pendentes) > 1:
+            lote = self._processar_lote_llm([mensagens[i] for i in pendentes])
+            if lote is not None:
+                for i, resultado in zip(pendentes, lote):
+                    self._guardar_resultado(mensagens[i], resultado, usuario)
+                    resultados[i] = resultado
+                    AIFinanceAssistant.stats.registrar('llm', time.perf_counter() - inicio)
+                pendentes = []
+
+        for i in pendentes:
+            resultados[i] = self.processar_mensagem(mensagens[i], usuario)
+        return resultados
+
+    def _processar_lote_llm(self, mensagens: list):
+        """Categoriza várias mensagens em uma chamada; None se a resposta não cobrir todas"""
+        numeradas = "\n".join(f"{i}. {mensagem}" for i, mensagem in enumerate(mensagens, 1))
+        try:
+            response = self.client.chat_completion(
+                prioridade=PRIORIDADE_INTERATIVA,
+                model="gpt-4-turbo-preview",
+                messages=[
+                    {"role": "system", "content": PROMPT_SISTEMA_LOTE},
+                    {"role": "user", "content": numeradas}
+                ],
+                response_format={"type": "json_object"}
+            )
+            resultados = json.loads(response.choices[0].message.content).get("resultados")
+        except Exception:
+            return None
+
+        if not isinstance(resultados, list) or len(resultados) != len(mensagens) \
+                or not all(isinstance(resultado, dict) for resultado in resultados):
+            return None
+        # Reordenar pelo índice informado, se o modelo tiver trocado a ordem
+        if sorted(resultado.get("indice") for resultado in resultados
+                  if isinstance(resultado.get("indice"), int)) == list(range(1, len(mensagens) + 1)):
+            resultados = sorted(resultados, key=lambda resultado: resultado["indice"])
+        for resultado in resultados:
+            resultado.pop("indice", None)
+            resultado.setdefault("sucesso", False)
+            resultado.setdefault("mensagem", "Não foi possível interpretar a mensagem.")
+            validar_gasto(resultado)
+        return resultados
+
+    def _processar_mensagem_llm(self, mensagem: str) -> dict:
+        """Processa mensagem do usuário usando GPT-4"""
+        if not self.client:
+            return {
+                "sucesso": False,
+                "mensagem": "Cliente OpenAI não inicializado. Verifique as configurações."
+            }
+
+        try:
+            response = self.client.chat_completion(
+                prioridade=PRIORIDADE_INTERATIVA,
+                model="gpt-4-turbo-preview",
+                messages=[
+                    {"role": "system", "content": PROMPT_SISTEMA_MENSAGEM},
+                    {"role": "user", "content": mensagem}
+                ],
+                response_format={"type": "json_object"}
+            )
+            
+            resultado = json.loads(response.choices[0].message.content)
+            return validar_gasto(resultado)
+            
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao processar mensagem: {str(e)}"
+            }
+
+    def analyze_image(self, image_content: bytes) -> dict:
+        """Analisa a imagem (JPEG) de um comprovante usando GPT-4 Vision"""
+        from receipt_pipeline import extrair_json
+
+        try:
+            response = self.client.chat_completion(
+                prioridade=PRIORIDADE_INTERATIVA,
+                model="gpt-4-vision-preview",
+                messages=[
+                    {"role": "system", "content": PROMPT_SISTEMA_COMPROVANTE},
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": "Identifique os gastos nesta imagem."
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/jpeg;base64,{base64.b64encode(image_content).decode('ascii')}"
+                                }
+                            }
+                        ]
+                    }
+                ],
+                max_tokens=1000
+            )
+            
+            return extrair_json(response.choices[0].message.content)
+            
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao analisar imagem: {str(e)}"
+            }
+
+    @classmethod
+    def get_receipt_pipeline(cls):
+        """Retorna o pipeline de comprovantes compartilhado (com o cache de extrações)"""
+        from receipt_pipeline import ReceiptPipeline
+
+        with cls._receipts_lock:
+            if cls._receipts is None:
+                cls._receipts = ReceiptPipeline(
+                    ConfigManager.get_whatsapp_client().baixar_midia,
+                    max_pixels=int(ConfigManager.get_secret("RECEIPT_MAX_PIXELS", "1000000")),
+                    max_bytes=int(ConfigManager.get_secret("RECEIPT_MAX_BYTES", "300000")),
+                    cache_size=int(ConfigManager.get_secret("RECEIPT_CACHE_SIZE", "1000"))
+                )
+                metrics.registrar_coletor("comprovantes_cache", cls._receipts.cache_stats)
+            return cls._receipts
+
+    def processar_comprovante(self, media_id: str) -> dict:
+        """Baixa e analisa a foto de um comprovante recebida pelo WhatsApp
+
+        Retorna {'transacoes', 'cache', 'latencias'}; transacoes já vêm no
+        formato de save_transaction.
+        """
+        if not self.client:
+            return {'transacoes': [], 'cache': False, 'latencias': {}}
+        return AIFinanceAssistant.get_receipt_pipeline().processar(media_id, self.analyze_image)
+
+    def analyze_bank_csv(self, df, progresso=None) -> list:
+        """Analisa CSV do banco e identifica transações
+
+        As linhas reconhecidas pelas palavras-chave são classificadas
+        localmente; o restante do extrato (DataFrame ou arquivo CSV) é
+        dividido em blocos que cabem no orçamento de tokens e analisado em
+        paralelo. progresso(status) recebe o andamento a cada bloco concluído.
+        """
+        if not self.client:
+            return []
+
+        from statement_pipeline import StatementAnalyzer
+
+        analyzer = StatementAnalyzer(
+            self._analisar_bloco_csv,
+            tokens_por_bloco=int(ConfigManager.get_secret("CSV_CHUNK_TOKENS", "3000")),
+            max_paralelo=int(ConfigManager.get_secret("CSV_MAX_CONCURRENCY", "4")),
+            max_tentativas=int(ConfigManager.get_secret("CSV_MAX_RETRIES", "3")),
+            preclassificar=self._preclassificar_extrato
+        )
+        try:
+            return analyzer.analisar(df, progresso=progresso)
+        except Exception as e:
+            reportar_erro(f"Erro ao analisar extrato: {str(e)}")
+            return []
+
+    def _preclassificar_extrato(self, df: pd.DataFrame):
+        """Classifica localmente as linhas reconhecíveis do extrato"""
+        classificadas, restantes = AIFinanceAssistant.get_classifier().classificar(df)
+        return classificadas.to_dict('records'), restantes
+
+    def _analisar_bloco_csv(self, csv_text: str) -> list:
+        """Envia um bloco do extrato ao GPT-4 e retorna as transações encontradas"""
+        response = self.client.chat_completion(
+            prioridade=PRIORIDADE_EXTRATO,
+            model="gpt-4-turbo-preview",
+            messages=[
+                {"role": "system", "content": PROMPT_SISTEMA_EXTRATO},
+                {
+                    "role": "user",
+                    "content": f"Analise este trecho de extrato bancário (CSV) e identifique os gastos:\n\n{csv_text}"
+                }
+            ],
+            response_format={"type": "json_object"}
+        )
+        
+        resultado = json.loads(response.choices[0].message.content)
+        return resultado.get("transacoes", []) if isinstance(resultado, dict) else resultado
+
+    def analisar_padroes(self, dados) -> str:
+        """Análise avançada dos padrões de gastos (DataFrame ou MonthlyRollup)"""
+        if not self.client:
+            return "Cliente OpenAI não inicializado. Verifique as configurações."
+
+        from rollup import MonthlyRollup
+
+        rollup = dados if isinstance(dados, MonthlyRollup) else MonthlyRollup.from_dataframe(dados)
+        if rollup.vazio:
+            return "Ainda não há dados suficientes para análise."
+
+        resumo_categorias = rollup.resumo_categorias()
+        tendencia_mensal = rollup.tendencia_mensal()
+        
+        contexto = f"""
+        Analise os seguintes dados financeiros e forneça insights detalhados:
+
+        Resumo por categoria:
+        {resumo_categorias.to_string()}
+        
+        Tendência mensal:
+        {tendencia_mensal.to_string()}
+        
+        Forneça:
+        1. Principais insights sobre os padrões de gastos
+        2. Sugestões específicas de economia baseadas nos dados
+        3. Identificação de possíveis gastos anormais ou excessivos
+        4. Previsões e tendências futuras
+        5. Recomendações práticas para melhor gestão financeira
+        """
+
+        try:
+            response = self.client.chat_completion(
+                prioridade=PRIORIDADE_RELATORIO,
+                model="gpt-4-turbo-preview",
+                messages=[
+                    {"role": "system", "content": "Você é um analista financeiro especializado em finanças pessoais."},
+                    {"role": "user", "content": contexto}
+                ]
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            return f"Erro na análise: {str(e)}"
+
+    def gerar_relatorio_mensal(self, dados, com_grafico: bool = True):
+        """Gera relatório mensal com visualizações (a partir de DataFrame ou MonthlyRollup)"""
+        from rollup import MonthlyRollup
+
+        rollup = dados if isinstance(dados, MonthlyRollup) else MonthlyRollup.from_dataframe(dados)
+        if rollup.vazio:
+            return "Nenhum gasto registrado ainda.", None
+        
+        resumo = rollup.resumo_mes(datetime.now().strftime("%Y-%m"))
+        gastos_categoria = resumo['por_categoria']
+        
+        if gastos_categoria.empty:
+            return "Nenhum gasto registrado este mês.", None
+        
+        total_gasto = resumo['total']
+        media_diaria = resumo['media_diaria']
+        
+        fig = None
+        if com_grafico:
+            import plotly.express as px
+            fig = px.pie(
+                values=gastos_categoria.values,
+                names=gastos_categoria.index,
+                title='Distribuição de Gastos por Categoria'
+            )
+            fig.update_traces(textposition='inside', textinfo='percent+label')
+        
+        relatorio = f"""### 📊 Resumo Financeiro do Mês
+
+💰 **Total Gasto:** R$ {total_gasto:.2f}
+📅 **Média Diária:** R$ {media_diaria:.2f}
+
+#### Gastos por Categoria:
+"""
+        
+        for categoria, valor in gastos_categoria.items():
+            percentual = (valor / total_gasto) * 100
+            relatorio += f"- {categoria.title()}: R$ {valor:.2f} ({percentual:.1f}%)\n"
+        
+        return relatorio, fig
+
+def _chamadas_por_caminho() -> dict:
+    return {f"{caminho}_chamadas": dados['chamadas'] for caminho, dados in AIFinanceAssistant.stats.snapshot().items()}
+
+metrics.registrar_coletor("sheets_cache", SheetsManager.cache_stats)
+metrics.registrar_coletor("mensagens", _chamadas_por_caminho)
@@ -0,0 +1,172 @@
+"""Escrita em lote (write-behind) de transações no Google Sheets"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Status HTTP que indicam falha transitória da API do Sheets
+STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
+
+def _status_http(erro: Exception):
+    """Extrai o status HTTP de um erro do gspread, se houver"""
+    response = getattr(erro, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+class SheetsBatchWriter:
+    """Agrupa linhas pendentes por planilha e grava com um único append_rows
+
+    Sem gravação em andamento para a planilha, as linhas submetidas seguem
+    imediatamente; as que chegam durante uma gravação formam o próximo lote,
+    despachado assim que ela termina (group commit). Assim quem aguarda o
+    Future não espera por uma janela fixa. Falhas transitórias (429/5xx)
+    são retentadas com backoff exponencial; se as tentativas se esgotarem
+    as linhas voltam para o buffer e são regravadas após max_espera
+    segundos, garantindo entrega pelo menos uma vez.
+    """
+    def __init__(self, append_fn, max_linhas: int = 50, max_espera: float = 1.0,
+                 max_tentativas: int = 5, backoff_inicial: float = 1.0,
+                 backoff_maximo: float = 32.0, max_paralelo: int = 4):
+        self.append_fn = append_fn
+        self.max_linhas = max_linhas
+        self.max_espera = max_espera
+        self.max_tentativas = max_tentativas
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+        self._pendentes = {}  # sheet_id -> lista de (linha, future, enfileirado_em)
+        self._em_gravacao = set()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="sheets-writer")
+        self._fechado = False
+        self.stats = {'linhas': 0, 'lotes': 0, 'retentativas': 0, 'rate_limited': 0, 'falhas': 0}
+        self._thread = threading.Thread(target=self._run, name="sheets-writer-flusher", daemon=True)
+        self._thread.start()
+
+    def submit(self, sheet_id: str, linha: list) -> Future:
+        """Adiciona uma linha ao buffer; o Future resolve quando ela for gravada"""
+        future = Future()
+        with self._cond:
+            if self._fechado:
+                raise RuntimeError("SheetsBatchWriter já foi encerrado")
+            self._pendentes.setdefault(sheet_id, []).append((linha, future, time.monotonic()))
+            self._despachar(sheet_id)
+        return future
+
+    def submit_many(self, sheet_id: str, linhas: list) -> list:
+        """Adiciona várias linhas de uma vez, para que sigam no mesmo lote"""
+        futures = [Future() for _ in linhas]
+        agora = time.monotonic()
+        with self._cond:
+            if self._fechado:
+                raise RuntimeError("SheetsBatchWriter já foi encerrado")
+            self._pendentes.setdefault(sheet_id, []).extend(
+                (linha, future, agora) for linha, future in zip(linhas, futures)
+            )
+            self._despachar(sheet_id)
+        return futures
+
+    def flush(self, timeout: float = None):
+        """Força a gravação de todos os lotes pendentes e aguarda"""
+        futures = []
+        with self._cond:
+            for lote in self._pendentes.values():
+                futures.extend(item[1] for item in lote)
+            for sheet_id in list(self._pendentes):
+                self._despachar(sheet_id)
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    def close(self):
+        """Encerra o writer, gravando os lotes pendentes na thread que chamou
+
+        Não usa o executor: no encerramento do interpretador ele já não
+        aceita novas tarefas.
+        """
+        with self._cond:
+            if self._fechado:
+                return
+            self._fechado = True
+            self._cond.notify()
+        self._executor.shutdown(wait=True)
+        with self._cond:
+            pendentes, self._pendentes = self._pendentes, {}
+        for sheet_id, lote in pendentes.items():
+            self._gravar(sheet_id, lote)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._fechado:
+                    return
+                agora = time.monotonic()
+                proximo = self.max_espera
+                for sheet_id, lote in list(self._pendentes.items()):
+                    if not lote or sheet_id in self._em_gravacao:
+                        continue
+                    idade = agora - lote[0][2]
+                    if len(lote) >= self.max_linhas or idade >= self.max_espera:
+                        self._despachar(sheet_id)
+                    else:
+                        proximo = min(proximo, self.max_espera - idade)
+                self._cond.wait(max(proximo, 0.01))
+
+    def _despachar(self, sheet_id: str):
+        """Retira um lote do buffer e agenda a gravação (chamado com o lock)"""
+        if self._fechado or sheet_id in self._em_gravacao or not self._pendentes.get(sheet_id):
+            return
+        lote = self._pendentes.pop(sheet_id)
+        self._em_gravacao.add(sheet_id)
+        self._executor.submit(self._gravar, sheet_id, lote)
+
+    def _gravar(self, sheet_id: str, lote: list):
+        linhas = [item[0] for item in lote]
+        devolvido = False
+        try:
+            self._append_com_retentativa(sheet_id, linhas)
+            for _, future, _ in lote:
+                future.set_result(True)
+            self.stats['linhas'] += len(linhas)
+            self.stats['lotes'] += 1
+        except Exception as e:
+            if _status_http(e) in STATUS_RETENTAVEIS and not self._fechado:
+                # Devolver ao início do buffer para a próxima janela de gravação
+                logger.warning("Lote de %d linhas devolvido ao buffer: %s", len(linhas), e)
+                devolvido = True
+                with self._cond:
+                    self._pendentes[sheet_id] = [
+                        (linha, future, time.monotonic()) for linha, future, _ in lote
+                    ] + self._pendentes.get(sheet_id, [])
+            else:
+                logger.error("Falha ao gravar %d linhas na planilha %s: %s", len(linhas), sheet_id, e)
+                self.stats['falhas'] += len(linhas)
+                for _, future, _ in lote:
+                    future.set_exception(e)
+        finally:
+            with self._cond:
+                self._em_gravacao.discard(sheet_id)
+                if not devolvido:
+                    # Linhas que chegaram durante a gravação seguem no próximo lote
+                    self._despachar(sheet_id)
+                self._cond.notify()
+
+    def _append_com_retentativa(self, sheet_id: str, linhas: list):
+        espera = self.backoff_inicial
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                return self.append_fn(sheet_id, linhas)
+            except Exception as e:
+                status = _status_http(e)
+                if status not in STATUS_RETENTAVEIS or tentativa == self.max_tentativas:
+                    raise
+                if status == 429:
+                    self.stats['rate_limited'] += 1
+                self.stats['retentativas'] += 1
+                time.sleep(espera + random.uniform(0, espera / 2))
+                espera = min(espera * 2, self.backoff_maximo)
@@ -0,0 +1,136 @@
+"""Pré-classificação vetorizada de linhas de extrato bancário"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from expense_parser import construir_indice, normalizar_texto
+from transaction_store import COLUNAS
+
+# Estabelecimentos frequentes em extratos (sem acento, minúsculas)
+COMERCIANTES = {
+    "posto": ("transporte", "combustível"),
+    "shell": ("transporte", "combustível"),
+    "ipiranga": ("transporte", "combustível"),
+    "petrobras": ("transporte", "combustível"),
+    "drogasil": ("saude", "medicamentos"),
+    "droga raia": ("saude", "medicamentos"),
+    "drogaria": ("saude", "medicamentos"),
+    "pague menos": ("saude", "medicamentos"),
+    "carrefour": ("alimentacao", "supermercado"),
+    "assai": ("alimentacao", "supermercado"),
+    "atacadao": ("alimentacao", "supermercado"),
+    "pao de acucar": ("alimentacao", "supermercado"),
+    "supermerc": ("alimentacao", "supermercado"),
+    "panificadora": ("alimentacao", "padaria"),
+    "ifd": ("alimentacao", "delivery"),
+    "uber trip": ("transporte", "uber/99"),
+    "99app": ("transporte", "uber/99"),
+    "99 pop": ("transporte", "uber/99"),
+    "estapar": ("transporte", "estacionamento"),
+    "sem parar": ("transporte", "estacionamento"),
+    "disney": ("lazer", "streaming"),
+    "hbo": ("lazer", "streaming"),
+    "prime video": ("lazer", "streaming"),
+    "cinemark": ("lazer", "cinema/teatro"),
+    "smart fit": ("saude", "academia"),
+    "smartfit": ("saude", "academia"),
+    "sabesp": ("moradia", "água"),
+    "enel": ("moradia", "luz"),
+    "cemig": ("moradia", "luz"),
+    "copel": ("moradia", "luz"),
+}
+
+_NOMES_DESCRICAO = ("descricao", "historico", "lancamento", "estabelecimento", "memo", "description")
+_NOMES_VALOR = ("valor", "quantia", "montante", "amount", "debito")
+_NOMES_DATA = ("data", "date", "dt")
+
+
+def _encontrar_coluna(df: pd.DataFrame, nomes: tuple):
+    for coluna in df.columns:
+        nome = normalizar_texto(str(coluna))
+        if any(nome.startswith(candidato) for candidato in nomes):
+            return coluna
+    return None
+
+
+def _normalizar_serie(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de normalizar_texto"""
+    return (
+        serie.fillna("").astype(str).str.lower()
+        .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+        .str.replace(r"\s+", " ", regex=True)
+    )
+
+
+def _converter_valores(serie: pd.Series) -> pd.Series:
+    """Converte a coluna de valores (numérica ou texto em formato BR) em float"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    texto = serie.fillna("").astype(str).str.replace(r"[R$\s]", "", regex=True)
+    formato_br = texto.str.contains(",", regex=False)
+    texto = texto.where(~formato_br, texto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    return pd.to_numeric(texto, errors="coerce")
+
+
+class StatementClassifier:
+    """Classifica linhas de extrato por palavras-chave, sem chamar o LLM
+
+    Cada par (categoria, subcategoria) vira uma expressão regular aplicada
+    à coluna de descrição inteira; linhas com exatamente um par encontrado,
+    valor e data válidos são consideradas classificadas com confiança.
+    """
+    def __init__(self, categorias: dict, palavras_chave: dict = None, comerciantes: dict = None):
+        indice = construir_indice(categorias, palavras_chave)
+        indice.update(comerciantes if comerciantes is not None else COMERCIANTES)
+
+        termos_por_par = {}
+        for termo, par in indice.items():
+            termos_por_par.setdefault(par, []).append(termo)
+        self.categorias = np.array([par[0] for par in termos_por_par], dtype=object)
+        self.subcategorias = np.array([par[1] for par in termos_por_par], dtype=object)
+        self.padroes = [
+            r"\b(?:" + "|".join(re.escape(t) for t in sorted(termos, key=len, reverse=True)) + r")\b"
+            for termos in termos_por_par.values()
+        ]
+
+    def classificar(self, df: pd.DataFrame):
+        """Retorna (DataFrame classificado no formato da planilha, linhas restantes)"""
+        coluna_descricao = _encontrar_coluna(df, _NOMES_DESCRICAO)
+        coluna_valor = _encontrar_coluna(df, _NOMES_VALOR)
+        coluna_data = _encontrar_coluna(df, _NOMES_DATA)
+        if df.empty or coluna_descricao is None or coluna_valor is None:
+            return pd.DataFrame(columns=COLUNAS), df
+
+        texto = _normalizar_serie(df[coluna_descricao])
+        correspondencias = np.column_stack([
+            texto.str.contains(padrao, regex=True).to_numpy() for padrao in self.padroes
+        ])
+        quantidade = correspondencias.sum(axis=1)
+        par_encontrado = correspondencias.argmax(axis=1)
+
+        valores = _converter_valores(df[coluna_valor])
+        if coluna_data is not None:
+            datas = pd.to_datetime(df[coluna_data], dayfirst=True, errors="coerce")
+        else:
+            datas = pd.Series(pd.NaT, index=df.index)
+
+        # Em extratos com sinal, débitos são negativos; créditos ficam para o LLM
+        if (valores < 0).any():
+            debito = (valores < 0).to_numpy()
+        else:
+            debito = (valores > 0).to_numpy()
+
+        confiavel = (quantidade == 1) & debito & datas.notna().to_numpy()
+        if not confiavel.any():
+            return pd.DataFrame(columns=COLUNAS), df
+
+        indices = par_encontrado[confiavel]
+        classificadas = pd.DataFrame({
+            "data": datas[confiavel].to_numpy(),
+            "categoria": self.categorias[indices],
+            "subcategoria": self.subcategorias[indices],
+            "valor": valores[confiavel].abs().round(2).to_numpy(),
+            "descricao": df[coluna_descricao][confiavel].astype(str).str.strip().to_numpy(),
+        }, columns=COLUNAS)
+        return classificadas, df[~confiavel]
@@ -0,0 +1,116 @@
+"""Análise de extratos bancários em blocos paralelos"""
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Aproximação usual de caracteres por token para texto em português
+CARACTERES_POR_TOKEN = 4
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa barata do número de tokens de um texto"""
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+def dividir_em_blocos(df: pd.DataFrame, orcamento_tokens: int):
+    """Divide o DataFrame em blocos de linhas que cabem no orçamento de tokens"""
+    if df.empty:
+        return
+    # Tamanho em caracteres de cada linha no CSV (valores + separadores)
+    tamanhos = df.astype(str).apply(lambda coluna: coluna.str.len()).sum(axis=1) + len(df.columns)
+    limite = max(orcamento_tokens * CARACTERES_POR_TOKEN, 1)
+    grupos = (tamanhos.cumsum() - 1) // limite
+    for _, bloco in df.groupby(grupos.to_numpy(), sort=True):
+        yield bloco
+
+
+class StatementAnalyzer:
+    """Envia o extrato ao LLM em blocos concorrentes e junta os resultados
+
+    analisar_bloco recebe o texto CSV de um bloco e retorna a lista de
+    transações encontradas; exceções disparam novas tentativas com backoff.
+    preclassificar, se informado, recebe cada parte lida do extrato e
+    retorna (transações já classificadas, linhas que ainda vão ao LLM).
+    """
+    def __init__(self, analisar_bloco, tokens_por_bloco: int = 3000, max_paralelo: int = 4,
+                 max_tentativas: int = 3, backoff_inicial: float = 1.0, linhas_por_leitura: int = 5000,
+                 preclassificar=None):
+        self.analisar_bloco = analisar_bloco
+        self.preclassificar = preclassificar
+        self.tokens_por_bloco = tokens_por_bloco
+        self.max_paralelo = max_paralelo
+        self.max_tentativas = max_tentativas
+        self.backoff_inicial = backoff_inicial
+        self.linhas_por_leitura = linhas_por_leitura
+        self.falhas = []
+
+    def _ler_partes(self, origem):
+        """Gera partes do extrato a partir de um DataFrame ou de um arquivo CSV"""
+        if isinstance(origem, pd.DataFrame):
+            yield origem
+            return
+        yield from pd.read_csv(origem, chunksize=self.linhas_por_leitura)
+
+    def _analisar_com_retentativa(self, bloco: pd.DataFrame) -> list:
+        csv_text = bloco.to_csv(index=False)
+        espera = self.backoff_inicial
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                return self.analisar_bloco(csv_text)
+            except Exception as e:
+                if tentativa == self.max_tentativas:
+                    raise
+                logger.warning("Bloco do extrato falhou (tentativa %d): %s", tentativa, e)
+                time.sleep(espera + random.uniform(0, espera / 2))
+                espera *= 2
+
+    def analisar(self, origem, progresso=None) -> list:
+        """Analisa o extrato (DataFrame, caminho ou arquivo CSV)
+
+        progresso(status) é chamado a cada bloco concluído com as chaves
+        'concluidos', 'enviados', 'falhas', 'preclassificadas' e 'transacoes'.
+        """
+        self.falhas = []
+        transacoes = []
+        status = {'concluidos': 0, 'enviados': 0, 'falhas': 0, 'preclassificadas': 0, 'transacoes': 0}
+        pendentes = set()
+
+        def coletar(prontos):
+            for future in prontos:
+                pendentes.discard(future)
+                status['concluidos'] += 1
+                try:
+                    transacoes.extend(future.result())
+                except Exception as e:
+                    logger.error("Bloco do extrato descartado: %s", e)
+                    self.falhas.append(str(e))
+                    status['falhas'] += 1
+                status['transacoes'] = len(transacoes)
+                if progresso:
+                    progresso(dict(status))
+
+        with ThreadPoolExecutor(max_workers=self.max_paralelo) as executor:
+            for parte in self._ler_partes(origem):
+                if self.preclassificar:
+                    classificadas, parte = self.preclassificar(parte)
+                    transacoes.extend(classificadas)
+                    status['preclassificadas'] += len(classificadas)
+                    status['transacoes'] = len(transacoes)
+
+                for bloco in dividir_em_blocos(parte, self.tokens_por_bloco):
+                    # Limitar blocos em memória aguardando vaga no pool
+                    while len(pendentes) >= self.max_paralelo * 2:
+                        prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                        coletar(prontos)
+                    pendentes.add(executor.submit(self._analisar_com_retentativa, bloco))
+                    status['enviados'] += 1
+            while pendentes:
+                prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                coletar(prontos)
+
+        return transacoes
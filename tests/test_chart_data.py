@@ -0,0 +1,22 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from chart_data import barras_subcategoria  # noqa: E402
+
+
+def test_excedente_soma_na_subcategoria_outros_existente():
+    df = pd.DataFrame({
+        "subcategoria": ["mercado", "uber/99", "outros", "cinema", "farmácia"],
+        "valor": [100.0, 80.0, 60.0, 10.0, 5.0],
+    })
+
+    barras = barras_subcategoria(df, max_barras=3)
+
+    assert barras.to_dict() == {"outros": 75.0, "uber/99": 80.0, "mercado": 100.0}
+
+
+def test_poucas_subcategorias_ficam_intactas():
+    df = pd.DataFrame({"subcategoria": ["mercado", "cinema"], "valor": [100.0, 10.0]})
+
+    assert barras_subcategoria(df, max_barras=3).to_dict() == {"cinema": 10.0, "mercado": 100.0}
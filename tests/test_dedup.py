@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from dedup import MessageDeduplicator
+
+
+def test_mensagem_repetida_e_descartada():
+    dedup = MessageDeduplicator()
+
+    assert dedup.registrar("wamid.1")
+    assert not dedup.registrar("wamid.1")
+    assert dedup.registrar("wamid.2")
+    assert dedup.stats()["repetidas"] == 1
+
+
+def test_esquecer_permite_reprocessar():
+    dedup = MessageDeduplicator()
+    dedup.registrar("wamid.1")
+    dedup.esquecer("wamid.1")
+
+    assert dedup.registrar("wamid.1")
+
+
+def test_id_volta_a_valer_apos_a_janela(tmp_path):
+    dedup = MessageDeduplicator(janela=0.05, path=str(tmp_path / "dedup.db"))
+    dedup.registrar("wamid.1")
+    time.sleep(0.1)
+
+    assert dedup.registrar("wamid.1")
+
+
+def test_sqlite_compartilhado_cobre_outro_processo(tmp_path):
+    caminho = str(tmp_path / "dedup.db")
+    primeiro = MessageDeduplicator(path=caminho)
+    segundo = MessageDeduplicator(path=caminho)
+
+    assert primeiro.registrar("wamid.1")
+    assert not segundo.registrar("wamid.1")
+    assert segundo.registrar("wamid.2")
+
+
+def test_webhook_nao_enfileira_reentrega(monkeypatch):
+    pytest.importorskip("flask")
+    import webhook
+
+    enfileirados = []
+    pool = type("Pool", (), {"submit": lambda self, item: enfileirados.append(item) or True})()
+    monkeypatch.setattr(webhook, "get_worker_pool", lambda: pool)
+    monkeypatch.setattr(webhook, "get_deduplicator", lambda dedup=MessageDeduplicator(): dedup)
+    payload = {"entry": [{"changes": [{"value": {"messages": [
+        {"from": "5511999999999", "id": "wamid.1", "type": "text", "text": {"body": "uber 20"}}
+    ]}}]}]}
+    cliente = webhook.flask_app.test_client()
+
+    primeira = cliente.post("/webhook", json=payload)
+    segunda = cliente.post("/webhook", json=payload)
+
+    assert primeira.get_json()["status"] == "queued"
+    assert segunda.status_code == 200
+    assert segunda.get_json()["status"] == "duplicate"
+    assert len(enfileirados) == 1
@@ -0,0 +1,56 @@
+import pytest
+
+from categorias import CATEGORIAS
+from expense_parser import ExpenseParser, converter_valor, extrair_valor
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return ExpenseParser(CATEGORIAS)
+
+
+@pytest.mark.parametrize("texto, valor", [
+    ("150,90", 150.9),
+    ("1.234,56", 1234.56),
+    ("1.234", 1234.0),
+    ("45.9", 45.9),
+])
+def test_converter_valor(texto, valor):
+    assert converter_valor(texto) == valor
+
+
+def test_extrair_valor_prefere_o_explicito():
+    assert extrair_valor("2 pizzas por r$ 80") == 80.0
+    assert extrair_valor("paguei 10 e 20") is None
+
+
+@pytest.mark.parametrize("mensagem, categoria, subcategoria, valor", [
+    ("Gastei 50 reais no almoço", "alimentacao", "restaurante", 50.0),
+    ("uber 23,90", "transporte", "uber/99", 23.9),
+    ("mercado 187,45", "alimentacao", "supermercado", 187.45),
+    ("gasolina R$ 200", "transporte", "combustível", 200.0),
+    ("Uber Eats 42,50", "alimentacao", "delivery", 42.5),
+    ("pedido no ifood 35", "alimentacao", "delivery", 35.0),
+])
+def test_aceita_gastos_simples(parser, mensagem, categoria, subcategoria, valor):
+    resultado = parser.parse(mensagem)
+
+    assert resultado["sucesso"]
+    assert (resultado["categoria"], resultado["subcategoria"], resultado["valor"]) == \
+        (categoria, subcategoria, valor)
+
+
+@pytest.mark.parametrize("mensagem", [
+    "Vendi meu livro por 50",
+    "reembolso de 30 do uber",
+    "estorno de 120 no cartão",
+    "pix recebido de 200",
+    "recebi 1500 de salário",
+    "quanto gastei com uber?",
+    "almoço",
+    "uber 20 e mercado 30",
+    "comprei um presente de 89,90",
+    "relatorio",
+])
+def test_recusa_o_que_nao_e_gasto_simples(parser, mensagem):
+    assert parser.parse(mensagem) is None
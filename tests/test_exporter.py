@@ -0,0 +1,45 @@
+import gzip
+import io
+import os
+
+import pytest
+
+from exporter import exportar
+
+pd = pytest.importorskip("pandas")
+download_data_util = pytest.importorskip("streamlit.runtime.download_data_util")
+
+
+def _partes():
+    yield pd.DataFrame({"descricao": ["uber", "mercado"], "valor": [23.9, 187.45]})
+    yield pd.DataFrame({"descricao": ["farmácia"], "valor": [42.3]})
+
+
+def _para_bytes(arquivo) -> bytes:
+    """Mesma conversão que o st.download_button aplica ao parâmetro data"""
+    dados, _ = download_data_util.convert_data_to_bytes_and_infer_mime(
+        arquivo, unsupported_error=TypeError("Invalid binary data format")
+    )
+    return dados
+
+
+def test_csv_aceito_pelo_download_button():
+    arquivo = exportar(_partes(), "csv")
+    caminho = arquivo.caminho
+    with arquivo:
+        dados = _para_bytes(arquivo)
+
+    assert pd.read_csv(io.BytesIO(dados))["descricao"].tolist() == ["uber", "mercado", "farmácia"]
+    assert not os.path.exists(caminho)
+
+
+def test_csv_gz_aceito_pelo_download_button():
+    with exportar(_partes(), "csv.gz") as arquivo:
+        dados = _para_bytes(arquivo)
+
+    assert gzip.decompress(dados).decode("utf-8").splitlines()[0] == "descricao,valor"
+
+
+def test_formato_desconhecido():
+    with pytest.raises(ValueError):
+        exportar(_partes(), "xlsx")
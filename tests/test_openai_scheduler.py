@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from openai_scheduler import (
+    PRIORIDADE_EXTRATO,
+    PRIORIDADE_INTERATIVA,
+    PRIORIDADE_RELATORIO,
+    RateLimitExceeded,
+    RateLimitScheduler,
+    ScheduledOpenAI,
+    TokenBucket,
+    converter_duracao,
+)
+
+
+def _aguardar(condicao, timeout: float = 5.0):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite, "condição não atingida no tempo limite"
+        time.sleep(0.01)
+
+
+def _em_thread(scheduler: RateLimitScheduler, prioridade: int, ordem: list) -> threading.Thread:
+    def executar():
+        scheduler.acquire(10, prioridade, timeout=5)
+        ordem.append(prioridade)
+
+    thread = threading.Thread(target=executar)
+    thread.start()
+    return thread
+
+
+def test_converter_duracao():
+    assert converter_duracao("6m0s") == 360
+    assert converter_duracao("1.5s") == 1.5
+    assert converter_duracao("20ms") == pytest.approx(0.02)
+    assert converter_duracao(None) == 0
+
+
+def test_token_bucket_informa_espera_ate_reabastecer():
+    bucket = TokenBucket(60)  # uma ficha por segundo
+    bucket.consumir(60)
+    assert bucket.tempo_ate(1) == pytest.approx(1.0, abs=0.05)
+    bucket.limitar(0)
+    assert bucket.tempo_ate(30) == pytest.approx(30.0, abs=0.05)
+
+
+def test_chamadas_interativas_passam_na_frente():
+    scheduler = RateLimitScheduler()
+    scheduler.registrar_429(0.3)
+    ordem = []
+    threads = [_em_thread(scheduler, PRIORIDADE_RELATORIO, ordem)]
+    _aguardar(lambda: len(scheduler._fila) == 1)
+    threads.append(_em_thread(scheduler, PRIORIDADE_EXTRATO, ordem))
+    _aguardar(lambda: len(scheduler._fila) == 2)
+    threads.append(_em_thread(scheduler, PRIORIDADE_INTERATIVA, ordem))
+    for thread in threads:
+        thread.join(5)
+
+    assert ordem == [PRIORIDADE_INTERATIVA, PRIORIDADE_EXTRATO, PRIORIDADE_RELATORIO]
+
+
+def test_fila_cheia_descarta_apenas_chamadas_nao_interativas():
+    scheduler = RateLimitScheduler(max_fila=1)
+    scheduler.registrar_429(0.2)
+    ordem = []
+    thread = _em_thread(scheduler, PRIORIDADE_INTERATIVA, ordem)
+    _aguardar(lambda: len(scheduler._fila) == 1)
+
+    with pytest.raises(RateLimitExceeded):
+        scheduler.acquire(10, PRIORIDADE_EXTRATO)
+    scheduler.acquire(10, PRIORIDADE_INTERATIVA, timeout=5)
+    thread.join(5)
+
+    assert ordem == [PRIORIDADE_INTERATIVA]
+    assert scheduler.stats['descartadas'] == 1
+    assert scheduler.stats['chamadas'] == 2
+
+
+def test_429_pausa_novas_chamadas():
+    scheduler = RateLimitScheduler()
+    scheduler.registrar_429(0.2)
+    inicio = time.monotonic()
+    scheduler.acquire(10)
+
+    assert time.monotonic() - inicio >= 0.19
+    assert scheduler.stats['rate_limited'] == 1
+
+
+def test_espera_esgotada_levanta_rate_limit_exceeded():
+    scheduler = RateLimitScheduler()
+    scheduler.registrar_429(5)
+    with pytest.raises(RateLimitExceeded):
+        scheduler.acquire(10, timeout=0.05)
+
+
+def test_429_volta_pela_fila_do_agendador():
+    openai = pytest.importorskip("openai")
+    httpx = pytest.importorskip("httpx")
+
+    class Resposta:
+        headers = {}
+
+        def parse(self):
+            return type("Completion", (), {"usage": None})()
+
+    class Completions:
+        chamadas = 0
+
+        def create(self, **kwargs):
+            Completions.chamadas += 1
+            if Completions.chamadas == 1:
+                resposta = httpx.Response(
+                    429, headers={"retry-after": "0.1"}, request=httpx.Request("POST", "http://openai.local")
+                )
+                raise openai.RateLimitError("limite", response=resposta, body=None)
+            return Resposta()
+
+    cliente = type("Cliente", (), {})()
+    cliente.chat = type("Chat", (), {})()
+    cliente.chat.completions = type("ChatCompletions", (), {"with_raw_response": Completions()})()
+    scheduler = RateLimitScheduler()
+
+    inicio = time.monotonic()
+    ScheduledOpenAI(cliente, scheduler).chat_completion(messages=[{"role": "user", "content": "oi"}])
+
+    assert Completions.chamadas == 2
+    assert scheduler.stats['rate_limited'] == 1
+    assert time.monotonic() - inicio >= 0.09
@@ -0,0 +1,127 @@
+import threading
+from datetime import date
+
+import pytest
+
+pytest.importorskip("gspread")
+pytest.importorskip("pandas")
+
+from fakes import FakeSheetsClient, instalar_sheets_falso  # noqa: E402
+from services import (  # noqa: E402
+    DataManager,
+    SheetsManager,
+    meses_no_periodo,
+    particao_da_linha,
+    titulo_particao,
+)
+from transaction_store import LocalTransactionStore  # noqa: E402
+
+
+@pytest.fixture
+def sheets(tmp_path, monkeypatch):
+    cliente = FakeSheetsClient(latencia=0)
+    instalar_sheets_falso(cliente)
+    monkeypatch.setattr(DataManager, "_store", LocalTransactionStore(str(tmp_path / "transacoes.db")))
+    yield cliente
+    SheetsManager._handles.clear()
+
+
+def _nova_planilha(cliente: FakeSheetsClient) -> str:
+    url = SheetsManager().create_new_sheet("Teste")
+    return url.rstrip("/").split("/")[-1]
+
+
+def _linha(data: str, valor: float) -> list:
+    return [data, "alimentacao", "restaurante", valor, "Almoço"]
+
+
+def test_particao_da_linha():
+    assert particao_da_linha(["2024-03-15 12:00:00", "x"]) == "2024-03"
+    assert particao_da_linha(["5/1/2024", "x"]) == "2024-01"
+
+
+def test_meses_no_periodo():
+    assert meses_no_periodo(date(2023, 11, 20), date(2024, 2, 1)) == ["2023-11", "2023-12", "2024-01"]
+    assert meses_no_periodo(None, date(2024, 2, 1)) is None
+
+
+def test_planilha_nova_comeca_so_com_o_manifesto(sheets):
+    sheet_id = _nova_planilha(sheets)
+    planilha = sheets.planilhas[sheet_id]
+
+    assert [aba.title for aba in planilha.abas] == [SheetsManager.ABA_MANIFESTO]
+    assert planilha.sheet1.linhas == [SheetsManager.CABECALHO_MANIFESTO]
+    assert SheetsManager().particionada(sheet_id)
+
+
+def test_linhas_sao_gravadas_na_aba_do_mes_e_registradas_no_manifesto(sheets):
+    sheet_id = _nova_planilha(sheets)
+    SheetsManager._append_rows(sheet_id, [
+        _linha("2024-01-10 12:00:00", 30.0),
+        _linha("2024-02-03 12:00:00", 45.0),
+        _linha("2024-01-20 12:00:00", 12.5),
+    ])
+    SheetsManager._append_rows(sheet_id, [_linha("2024-02-04 12:00:00", 8.0)])
+
+    planilha = sheets.planilhas[sheet_id]
+    abas = {aba.title: aba.linhas for aba in planilha.abas}
+    assert abas[titulo_particao("2024-01")] == [
+        SheetsManager.CABECALHO, _linha("2024-01-10 12:00:00", 30.0), _linha("2024-01-20 12:00:00", 12.5)
+    ]
+    assert len(abas[titulo_particao("2024-02")]) == 3
+
+    manifesto = SheetsManager().ler_manifesto(sheet_id)
+    assert {ano_mes: ultima for ano_mes, (_, ultima) in manifesto.items()} == {"2024-01": 3, "2024-02": 3}
+    # Uma linha por partição: a segunda gravação de fevereiro atualiza a existente
+    assert len(abas[SheetsManager.ABA_MANIFESTO]) == 3
+
+
+def test_sincroniza_apenas_os_meses_pedidos(sheets):
+    sheet_id = _nova_planilha(sheets)
+    SheetsManager._append_rows(sheet_id, [_linha("2024-01-10", 30.0), _linha("2024-02-03", 45.0)])
+
+    rollup = DataManager(sheet_id).get_rollup(meses=["2024-02"])
+    store = DataManager.get_store()
+
+    assert store.particoes(sheet_id) == {"2024-01": 2, "2024-02": 2}
+    assert [ano_mes for ano_mes, _, _ in store.particoes_desatualizadas(sheet_id)] == ["2024-01"]
+    assert rollup.resumo_mes("2024-02")["total"] == 45.0
+    assert rollup.resumo_mes("2024-01")["total"] == 0.0
+
+
+def test_aba_do_mes_criada_por_outro_worker_e_reaberta(sheets):
+    sheet_id = _nova_planilha(sheets)
+    planilha = sheets.planilhas[sheet_id]
+    worksheet_original = planilha.worksheet
+    barreira = threading.Barrier(2)
+    consultas = []
+
+    def worksheet_concorrente(titulo):
+        # Os dois workers veem a aba inexistente antes de qualquer um criá-la
+        try:
+            return worksheet_original(titulo)
+        finally:
+            consultas.append(titulo)
+            if consultas.count(titulo_particao("2024-03")) <= 2 and titulo == titulo_particao("2024-03"):
+                barreira.wait(5)
+
+    planilha.worksheet = worksheet_concorrente
+    erros = []
+
+    def gravar(valor):
+        try:
+            SheetsManager()._append_particao(sheet_id, "2024-03", [_linha("2024-03-01", valor)])
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=gravar, args=(valor,)) for valor in (1.0, 2.0)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert erros == []
+    assert sheets.chamadas["add_worksheet"] == 2
+    titulos = [aba.title for aba in planilha.abas]
+    assert titulos.count(titulo_particao("2024-03")) == 1
+    assert len(planilha.worksheet(titulo_particao("2024-03")).linhas) == 3
@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from receipt_pipeline import ReceiptPipeline
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+
+def _comprovante(loja: str, valor: str) -> bytes:
+    """Foto sintética de comprovante: fundo branco e poucas linhas de texto"""
+    imagem = Image.new("RGB", (600, 900), "white")
+    desenho = ImageDraw.Draw(imagem)
+    desenho.text((40, 40), loja, fill="black")
+    desenho.text((40, 120), "CUPOM FISCAL", fill="black")
+    desenho.text((40, 800), f"TOTAL R$ {valor}", fill="black")
+    saida = io.BytesIO()
+    imagem.save(saida, format="JPEG", quality=90)
+    return saida.getvalue()
+
+
+def _pipeline(midias: dict) -> ReceiptPipeline:
+    return ReceiptPipeline(midias.__getitem__, max_pixels=200_000, max_bytes=100_000)
+
+
+def _extrator(valores: dict):
+    chamadas = []
+
+    def extrair(jpeg: bytes) -> dict:
+        chamadas.append(jpeg)
+        return {"gastos": [{"data": "2024-01-15", "categoria": "alimentacao", "subcategoria": "supermercado",
+                            "valor": valores[len(chamadas)], "descricao": "Mercado"}]}
+    return extrair, chamadas
+
+
+def test_comprovantes_distintos_nao_compartilham_extracao():
+    midias = {"a": _comprovante("MERCADO BOM PRECO", "87,50"), "b": _comprovante("PADARIA CENTRAL", "12,30")}
+    pipeline = _pipeline(midias)
+    extrair, chamadas = _extrator({1: 87.5, 2: 12.3})
+
+    primeiro = pipeline.processar("a", extrair)
+    segundo = pipeline.processar("b", extrair)
+
+    assert len(chamadas) == 2
+    assert not segundo["cache"]
+    assert primeiro["transacoes"][0]["valor"] == 87.5
+    assert segundo["transacoes"][0]["valor"] == 12.3
+
+
+def test_mesma_foto_reaproveita_extracao():
+    midias = {"a": _comprovante("MERCADO BOM PRECO", "87,50")}
+    midias["a2"] = midias["a"]
+    pipeline = _pipeline(midias)
+    extrair, chamadas = _extrator({1: 87.5})
+
+    pipeline.processar("a", extrair)
+    repetido = pipeline.processar("a2", extrair)
+
+    assert len(chamadas) == 1
+    assert repetido["cache"]
+    assert repetido["transacoes"][0]["valor"] == 87.5
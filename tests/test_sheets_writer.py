@@ -0,0 +1,89 @@
+import threading
+import time
+
+from sheets_writer import SheetsBatchWriter
+
+
+class ErroAPI(Exception):
+    """Erro com o formato das exceções do gspread (status em response.status_code)"""
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Resposta", (), {"status_code": status})()
+
+
+class AppendFalso:
+    """append_fn que registra os lotes; pode bloquear a primeira gravação ou falhar com status"""
+    def __init__(self, falhas: list = None, bloquear: bool = False):
+        self.lotes = []
+        self.falhas = list(falhas or [])
+        self.iniciou = threading.Event()
+        self.liberar = threading.Event()
+        if not bloquear:
+            self.liberar.set()
+
+    def __call__(self, sheet_id: str, linhas: list):
+        self.iniciou.set()
+        self.liberar.wait(5)
+        if self.falhas:
+            raise ErroAPI(self.falhas.pop(0))
+        self.lotes.append((sheet_id, list(linhas)))
+
+
+def _aguardar(condicao, timeout: float = 5.0):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite, "condição não atingida no tempo limite"
+        time.sleep(0.01)
+
+
+def test_linhas_que_chegam_durante_a_gravacao_seguem_juntas_no_proximo_lote():
+    append = AppendFalso(bloquear=True)
+    writer = SheetsBatchWriter(append, max_espera=60)
+    try:
+        primeiro = writer.submit("planilha", ["a"])
+        assert append.iniciou.wait(5)
+        seguintes = [writer.submit("planilha", [linha]) for linha in ("b", "c", "d")]
+        append.liberar.set()
+
+        assert all(future.result(5) for future in [primeiro] + seguintes)
+        assert append.lotes == [("planilha", [["a"]]), ("planilha", [["b"], ["c"], ["d"]])]
+    finally:
+        writer.close()
+
+
+def test_lote_volta_ao_buffer_apos_429_e_e_regravado():
+    append = AppendFalso(falhas=[429])
+    writer = SheetsBatchWriter(append, max_espera=0.05, max_tentativas=1)
+    try:
+        futures = writer.submit_many("planilha", [["a"], ["b"]])
+
+        assert all(future.result(5) for future in futures)
+        assert append.lotes == [("planilha", [["a"], ["b"]])]
+        assert writer.stats["falhas"] == 0
+    finally:
+        writer.close()
+
+
+def test_erro_nao_transitorio_falha_os_futures():
+    append = AppendFalso(falhas=[400])
+    writer = SheetsBatchWriter(append, max_tentativas=1)
+    try:
+        future = writer.submit("planilha", ["a"])
+
+        assert isinstance(future.exception(5), ErroAPI)
+        assert writer.stats["falhas"] == 1
+    finally:
+        writer.close()
+
+
+def test_close_grava_as_linhas_ainda_no_buffer():
+    # O 429 devolve o lote ao buffer com uma janela longa: só o close o grava
+    append = AppendFalso(falhas=[429])
+    writer = SheetsBatchWriter(append, max_espera=60, max_tentativas=1)
+    future = writer.submit("planilha", ["a"])
+    _aguardar(lambda: writer._pendentes)
+
+    writer.close()
+
+    assert future.result(0) is True
+    assert append.lotes == [("planilha", [["a"]])]
@@ -0,0 +1,335 @@
+"""Armazenamento local das transações com sincronização incremental da planilha"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from rollup import MonthlyRollup
+
+# Colunas do DataFrame de transações, na ordem das colunas A:E da planilha
+COLUNAS = ["data", "categoria", "subcategoria", "valor", "descricao"]
+
+# Data zero das datas seriais do Google Sheets
+_EPOCH_SHEETS = datetime(1899, 12, 30)
+
+# Em planilhas particionadas, a linha local é AAAAMM * LINHAS_POR_PARTICAO + linha da aba
+LINHAS_POR_PARTICAO = 1_000_000
+
+
+def chave_particao(sheet_id: str, ano_mes: str) -> str:
+    """Chave do estado de sincronização de uma partição (aba AAAA-MM)"""
+    return f"{sheet_id}#{ano_mes}"
+
+
+def _base_particao(ano_mes: str) -> int:
+    return int(ano_mes.replace("-", "")) * LINHAS_POR_PARTICAO
+
+
+def _normalizar_data(valor) -> str:
+    """Converte a célula de data (texto ou serial do Sheets) em texto ISO"""
+    if isinstance(valor, (int, float)):
+        return (_EPOCH_SHEETS + timedelta(days=valor)).strftime("%Y-%m-%d %H:%M:%S")
+    texto = str(valor).strip()
+    try:
+        return datetime.fromisoformat(texto).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        pass
+    for formato in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(texto, formato).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    return texto
+
+
+def _normalizar_valor(valor) -> float:
+    """Converte a célula de valor em float, aceitando vírgula decimal"""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor).replace("R$", "").strip()
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return 0.0
+
+
+class LocalTransactionStore:
+    """Cópia local (SQLite) das transações de cada planilha
+
+    A planilha continua sendo o espelho durável; a leitura é feita aqui e
+    apenas as linhas novas (após a última linha sincronizada) são baixadas.
+    """
+    def __init__(self, path: str = "transacoes.db", intervalo_sync: float = 30.0,
+                 intervalo_completo: float = 3600.0):
+        self.path = path
+        self.intervalo_sync = intervalo_sync
+        self.intervalo_completo = intervalo_completo
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS transacoes (
+                    sheet_id TEXT NOT NULL,
+                    linha INTEGER NOT NULL,
+                    data TEXT,
+                    categoria TEXT,
+                    subcategoria TEXT,
+                    valor REAL,
+                    descricao TEXT,
+                    PRIMARY KEY (sheet_id, linha)
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transacoes_data ON transacoes (sheet_id, data)"
+            )
+            # Agregados mensais, atualizados junto com as transações
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup (
+                    sheet_id TEXT NOT NULL,
+                    ano_mes TEXT NOT NULL,
+                    categoria TEXT NOT NULL,
+                    subcategoria TEXT NOT NULL,
+                    total REAL NOT NULL,
+                    quantidade INTEGER NOT NULL,
+                    PRIMARY KEY (sheet_id, ano_mes, categoria, subcategoria)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_dias (
+                    sheet_id TEXT NOT NULL,
+                    ano_mes TEXT NOT NULL,
+                    dia INTEGER NOT NULL,
+                    PRIMARY KEY (sheet_id, ano_mes, dia)
+                )
+            """)
+            # Linhas de cada partição segundo o manifesto da planilha
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS particoes (
+                    sheet_id TEXT NOT NULL,
+                    ano_mes TEXT NOT NULL,
+                    linhas_remotas INTEGER NOT NULL,
+                    PRIMARY KEY (sheet_id, ano_mes)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sincronizacao (
+                    sheet_id TEXT PRIMARY KEY,
+                    ultima_linha INTEGER NOT NULL DEFAULT 1,
+                    sincronizado_em REAL NOT NULL DEFAULT 0,
+                    completo_em REAL NOT NULL DEFAULT 0,
+                    desatualizado INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+
+    def _estado(self, sheet_id: str):
+        row = self._conn.execute(
+            "SELECT ultima_linha, sincronizado_em, completo_em, desatualizado "
+            "FROM sincronizacao WHERE sheet_id = ?", (sheet_id,)
+        ).fetchone()
+        return row or (1, 0.0, 0.0, 1)
+
+    def ultima_linha(self, sheet_id: str) -> int:
+        """Última linha da planilha já copiada (1 = cabeçalho)"""
+        with self._lock:
+            return self._estado(sheet_id)[0]
+
+    def precisa_sincronizar(self, sheet_id: str) -> bool:
+        """Indica se a cópia local pode estar atrás da planilha"""
+        with self._lock:
+            _, sincronizado_em, _, desatualizado = self._estado(sheet_id)
+        return bool(desatualizado) or time.time() - sincronizado_em >= self.intervalo_sync
+
+    def precisa_recarregar(self, sheet_id: str) -> bool:
+        """Indica se é hora de uma recarga completa (captura edições e exclusões)"""
+        with self._lock:
+            completo_em = self._estado(sheet_id)[2]
+        return time.time() - completo_em >= self.intervalo_completo
+
+    def marcar_desatualizado(self, sheet_id: str):
+        """Sinaliza que há linhas novas na planilha"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sincronizacao (sheet_id, desatualizado) VALUES (?, 1) "
+                "ON CONFLICT(sheet_id) DO UPDATE SET desatualizado = 1",
+                (sheet_id,)
+            )
+
+    def registrar_manifesto(self, sheet_id: str, manifesto: dict):
+        """Guarda o número de linhas de cada partição ({AAAA-MM: última linha}) lido da planilha"""
+        agora = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO particoes VALUES (?, ?, ?)
+                ON CONFLICT(sheet_id, ano_mes) DO UPDATE SET linhas_remotas = excluded.linhas_remotas
+            """, [(sheet_id, ano_mes, linhas) for ano_mes, linhas in manifesto.items()])
+            self._conn.execute("""
+                INSERT INTO sincronizacao (sheet_id, sincronizado_em, desatualizado) VALUES (?, ?, 0)
+                ON CONFLICT(sheet_id) DO UPDATE SET
+                    sincronizado_em = excluded.sincronizado_em, desatualizado = 0
+            """, (sheet_id, agora))
+
+    def particoes(self, sheet_id: str) -> dict:
+        """Última linha de cada partição segundo o último manifesto lido"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT ano_mes, linhas_remotas FROM particoes WHERE sheet_id = ?", (sheet_id,)
+            ).fetchall())
+
+    def particoes_desatualizadas(self, sheet_id: str, meses: list = None) -> list:
+        """Partições cuja cópia local difere do manifesto: [(ano_mes, última linha local, remota)]
+
+        Partições sem mudança no manifesto não são lidas de novo; como os
+        meses encerrados raramente mudam, ficam efetivamente imutáveis.
+        """
+        with self._lock:
+            linhas = self._conn.execute("""
+                SELECT p.ano_mes, COALESCE(s.ultima_linha, 1), p.linhas_remotas
+                FROM particoes p LEFT JOIN sincronizacao s ON s.sheet_id = p.sheet_id || '#' || p.ano_mes
+                WHERE p.sheet_id = ? ORDER BY p.ano_mes
+            """, (sheet_id,)).fetchall()
+        return [
+            (ano_mes, local, remota) for ano_mes, local, remota in linhas
+            if local != remota and (meses is None or ano_mes in meses)
+        ]
+
+    def aplicar_linhas(self, sheet_id: str, primeira_linha: int, linhas: list, completo: bool = False,
+                       particao: str = None):
+        """Grava as linhas baixadas da planilha (ou da aba da partição) a partir de primeira_linha"""
+        base = _base_particao(particao) if particao else 0
+        registros = []
+        for offset, linha in enumerate(linhas):
+            linha = list(linha) + [""] * (len(COLUNAS) - len(linha))
+            if not any(str(celula).strip() for celula in linha[:len(COLUNAS)]):
+                continue
+            registros.append((
+                sheet_id,
+                base + primeira_linha + offset,
+                _normalizar_data(linha[0]),
+                str(linha[1]),
+                str(linha[2]),
+                _normalizar_valor(linha[3]),
+                str(linha[4])
+            ))
+
+        ultima = primeira_linha + len(linhas) - 1
+        agora = time.time()
+        chave = chave_particao(sheet_id, particao) if particao else sheet_id
+        with self._lock, self._conn:
+            if completo and particao:
+                self._conn.execute(
+                    "DELETE FROM transacoes WHERE sheet_id = ? AND linha >= ? AND linha < ?",
+                    (sheet_id, base, base + LINHAS_POR_PARTICAO)
+                )
+                self._conn.execute("DELETE FROM rollup WHERE sheet_id = ? AND ano_mes = ?", (sheet_id, particao))
+                self._conn.execute("DELETE FROM rollup_dias WHERE sheet_id = ? AND ano_mes = ?", (sheet_id, particao))
+            elif completo:
+                self._conn.execute("DELETE FROM transacoes WHERE sheet_id = ?", (sheet_id,))
+                self._conn.execute("DELETE FROM rollup WHERE sheet_id = ?", (sheet_id,))
+                self._conn.execute("DELETE FROM rollup_dias WHERE sheet_id = ?", (sheet_id,))
+            for registro in registros:
+                inserido = self._conn.execute(
+                    "INSERT OR IGNORE INTO transacoes VALUES (?, ?, ?, ?, ?, ?, ?)", registro
+                ).rowcount
+                if inserido:
+                    self._somar_rollup(registro)
+            self._conn.execute("""
+                INSERT INTO sincronizacao (sheet_id, ultima_linha, sincronizado_em, completo_em, desatualizado)
+                VALUES (?, ?, ?, ?, 0)
+                ON CONFLICT(sheet_id) DO UPDATE SET
+                    ultima_linha = MAX(excluded.ultima_linha, CASE WHEN ? THEN 1 ELSE ultima_linha END),
+                    sincronizado_em = excluded.sincronizado_em,
+                    completo_em = CASE WHEN ? THEN excluded.sincronizado_em ELSE completo_em END,
+                    desatualizado = 0
+            """, (chave, max(ultima, primeira_linha - 1), agora, agora if completo else 0.0,
+                  completo, completo))
+
+    def _somar_rollup(self, registro: tuple):
+        """Soma uma transação ao agregado mensal (chamado dentro da transação SQL)"""
+        sheet_id, _, data, categoria, subcategoria, valor, _ = registro
+        if len(data) < 10 or data[4] != "-":
+            return
+        ano_mes, dia = data[:7], int(data[8:10])
+        self._conn.execute("""
+            INSERT INTO rollup VALUES (?, ?, ?, ?, ?, 1)
+            ON CONFLICT(sheet_id, ano_mes, categoria, subcategoria)
+            DO UPDATE SET total = total + excluded.total, quantidade = quantidade + 1
+        """, (sheet_id, ano_mes, categoria, subcategoria, valor))
+        self._conn.execute(
+            "INSERT OR IGNORE INTO rollup_dias VALUES (?, ?, ?)", (sheet_id, ano_mes, dia)
+        )
+
+    def carregar_rollup(self, sheet_id: str, meses: list = None) -> MonthlyRollup:
+        """Retorna os agregados mensais da planilha (apenas dos meses informados, se houver)"""
+        from rollup import MonthlyRollup
+
+        filtro, params = "", (sheet_id,)
+        if meses:
+            filtro = f" AND ano_mes IN ({', '.join('?' * len(meses))})"
+            params += tuple(meses)
+        with self._lock:
+            celulas = self._conn.execute(
+                "SELECT ano_mes, categoria, subcategoria, total, quantidade FROM rollup WHERE sheet_id = ?" + filtro,
+                params
+            ).fetchall()
+            dias = self._conn.execute(
+                "SELECT ano_mes, dia FROM rollup_dias WHERE sheet_id = ?" + filtro, params
+            ).fetchall()
+        return MonthlyRollup.from_rows(celulas, dias)
+
+    def ler(self, sheet_id: str) -> pd.DataFrame:
+        """Retorna todas as transações locais da planilha"""
+        import pandas as pd
+
+        with self._lock:
+            df = pd.read_sql_query(
+                "SELECT data, categoria, subcategoria, valor, descricao FROM transacoes "
+                "WHERE sheet_id = ? ORDER BY linha",
+                self._conn, params=(sheet_id,)
+            )
+        if not df.empty:
+            df['data'] = pd.to_datetime(df['data'], errors='coerce')
+        return df
+
+    def iterar(self, sheet_id: str, inicio=None, fim=None, categorias: list = None,
+               linhas_por_parte: int = 5000):
+        """Gera as transações em partes de até linhas_por_parte linhas
+
+        Os filtros de período (inicio <= data < fim) e de categorias são
+        aplicados na consulta SQL. A leitura usa uma conexão própria, para
+        não bloquear a sincronização enquanto a exportação é consumida.
+        """
+        import pandas as pd
+
+        condicoes = ["sheet_id = ?"]
+        params = [sheet_id]
+        if inicio is not None:
+            condicoes.append("data >= ?")
+            params.append(pd.Timestamp(inicio).strftime("%Y-%m-%d %H:%M:%S"))
+        if fim is not None:
+            condicoes.append("data < ?")
+            params.append(pd.Timestamp(fim).strftime("%Y-%m-%d %H:%M:%S"))
+        if categorias:
+            condicoes.append(f"categoria IN ({', '.join('?' * len(categorias))})")
+            params.extend(categorias)
+
+        conn = sqlite3.connect(self.path)
+        try:
+            partes = pd.read_sql_query(
+                "SELECT data, categoria, subcategoria, valor, descricao FROM transacoes "
+                f"WHERE {' AND '.join(condicoes)} ORDER BY data, linha",
+                conn, params=params, chunksize=linhas_por_parte
+            )
+            for parte in partes:
+                parte['data'] = pd.to_datetime(parte['data'], errors='coerce')
+                yield parte
+        finally:
+            conn.close()
@@ -0,0 +1,107 @@
+"""Armazenamento compartilhado do estado dos usuários"""
+import sqlite3
+import threading
+import time
+
+from cache import LRUCache
+
+# Campos persistidos do estado do usuário
+CAMPOS = ('status', 'name', 'email', 'sheet_id')
+
+
+def estado_inicial() -> dict:
+    """Estado de um usuário que ainda não iniciou o cadastro"""
+    return {
+        'status': 'new',  # new, pending_name, pending_email, creating_sheet, active
+        'name': None,
+        'email': None,
+        'sheet_id': None
+    }
+
+
+def _validar_campos(updates: dict):
+    invalidos = set(updates) - set(CAMPOS)
+    if invalidos:
+        raise ValueError(f"Campos de usuário inválidos: {', '.join(sorted(invalidos))}")
+
+
+class SQLiteUserStore:
+    """Estado dos usuários em SQLite, seguro para várias threads e processos"""
+    def __init__(self, path: str = "usuarios.db"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS usuarios (
+                    phone_number TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'new',
+                    name TEXT,
+                    email TEXT,
+                    sheet_id TEXT,
+                    atualizado_em REAL NOT NULL
+                )
+            """)
+
+    def get(self, phone_number: str) -> dict:
+        """Retorna o estado do usuário, criando-o se necessário"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO usuarios (phone_number, atualizado_em) VALUES (?, ?)",
+                (phone_number, time.time())
+            )
+            row = self._conn.execute(
+                f"SELECT {', '.join(CAMPOS)} FROM usuarios WHERE phone_number = ?",
+                (phone_number,)
+            ).fetchone()
+        return dict(zip(CAMPOS, row))
+
+    def update(self, phone_number: str, updates: dict):
+        """Atualiza campos do estado do usuário"""
+        self.transition(phone_number, None, updates)
+
+    def transition(self, phone_number: str, status_atual, updates: dict) -> bool:
+        """Aplica updates apenas se o status ainda for status_atual (atômico)
+
+        Com status_atual=None a atualização é incondicional.
+        """
+        _validar_campos(updates)
+        atribuicoes = ", ".join(f"{campo} = ?" for campo in updates)
+        params = list(updates.values()) + [time.time(), phone_number]
+        sql = f"UPDATE usuarios SET {atribuicoes}, atualizado_em = ? WHERE phone_number = ?"
+        if status_atual is not None:
+            sql += " AND status = ?"
+            params.append(status_atual)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO usuarios (phone_number, atualizado_em) VALUES (?, ?)",
+                (phone_number, time.time())
+            )
+            return self._conn.execute(sql, params).rowcount == 1
+
+
+class CachedUserStore:
+    """Cache LRU em memória na frente de outro armazenamento de usuários
+
+    O TTL curto limita o tempo em que outro processo pode ver um estado
+    antigo; transições continuam sendo validadas no armazenamento de origem.
+    """
+    def __init__(self, backend, maxsize: int = 10000, ttl: float = 5.0):
+        self.backend = backend
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, phone_number: str) -> dict:
+        return dict(self._cache.get_or_set(phone_number, lambda: self.backend.get(phone_number)))
+
+    def update(self, phone_number: str, updates: dict):
+        self.backend.update(phone_number, updates)
+        self._cache.invalidate(phone_number)
+
+    def transition(self, phone_number: str, status_atual, updates: dict) -> bool:
+        ok = self.backend.transition(phone_number, status_atual, updates)
+        self._cache.invalidate(phone_number)
+        return ok
+
+    def stats(self) -> dict:
+        return self._cache.stats()
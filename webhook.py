@@ -0,0 +1,372 @@
+"""Servidor do webhook do WhatsApp, independente da interface Streamlit
+
+Uso:
+    python -m webhook serve-webhook --workers 2 --threads 8
+
+Cada processo tem seu próprio pool de workers da fila; com
+WEBHOOK_QUEUE_BACKEND=sqlite a fila sobrevive a reinícios, e com
+WEBHOOK_DEDUP_PATH os processos compartilham o índice de mensagens vistas.
+"""
+import argparse
+import atexit
+import logging
+import os
+import sys
+from datetime import datetime
+from threading import Lock, Thread
+
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+
+import metrics
+from config import ConfigManager, reportar_erro
+from dedup import MessageDeduplicator
+from message_queue import MemoryQueueBackend, SQLiteQueueBackend, WorkerPool
+from services import AIFinanceAssistant, DataManager, SheetsManager, UserManager
+
+flask_app = Flask(__name__)
+CORS(flask_app)
+
+def extrair_mensagens(data: dict) -> list:
+    """Mensagens do payload, no envelope da Cloud API ou na lista 'messages' direta
+
+    O envelope é entry[].changes[].value.messages[]; todas as mensagens de
+    todas as entradas são retornadas, na ordem do payload.
+    """
+    mensagens = []
+    if isinstance(data.get('messages'), list):
+        mensagens.extend(data['messages'])
+    for entry in data.get('entry') or []:
+        if not isinstance(entry, dict):
+            continue
+        for change in entry.get('changes') or []:
+            value = change.get('value') if isinstance(change, dict) else None
+            if isinstance(value, dict) and isinstance(value.get('messages'), list):
+                mensagens.extend(value['messages'])
+    return mensagens
+
+def mensagem_de_texto(message) -> bool:
+    """Indica se a mensagem tem remetente e corpo de texto"""
+    return isinstance(message, dict) and 'from' in message \
+        and isinstance(message.get('text'), dict) \
+        and isinstance(message['text'].get('body'), str)
+
+def mensagem_de_imagem(message) -> bool:
+    """Indica se a mensagem é uma foto (comprovante) com id de mídia"""
+    return isinstance(message, dict) and 'from' in message \
+        and isinstance(message.get('image'), dict) \
+        and isinstance(message['image'].get('id'), str)
+
+# Rota única para o webhook
+@flask_app.route('/webhook', methods=['GET', 'POST'])
+def webhook():
+    if request.method == 'GET':
+        try:
+            verify_token = ConfigManager.get_secret("VERIFY_TOKEN")
+            mode = request.args.get('hub.mode')
+            token = request.args.get('hub.verify_token')
+            challenge = request.args.get('hub.challenge')
+
+            if mode == 'subscribe' and token == verify_token:
+                if challenge:
+                    return str(challenge), 200
+                return "OK", 200
+            return "Unauthorized", 403
+        except Exception as e:
+            reportar_erro(f"Erro na verificação: {str(e)}")
+            return str(e), 500
+            
+    elif request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"status": "error", "message": "Payload inválido"}), 400
+
+        try:
+            with metrics.medir("webhook_parse"):
+                mensagens = extrair_mensagens(data)
+                deduplicator = get_deduplicator()
+                lotes = {}
+                ignoradas = duplicadas = 0
+                for message in mensagens:
+                    if not (mensagem_de_texto(message) or mensagem_de_imagem(message)):
+                        # Outros tipos de mensagem são confirmados para evitar reenvio
+                        ignoradas += 1
+                        continue
+                    # Reentregas da mesma mensagem param aqui, antes de LLM e planilha
+                    message_id = message.get('id')
+                    if message_id and not deduplicator.registrar(str(message_id)):
+                        duplicadas += 1
+                        continue
+                    lotes.setdefault(message['from'], []).append(message)
+            if not mensagens:
+                return jsonify({"status": "success"}), 200
+            metrics.incrementar("webhook_mensagens", ignoradas, status="ignorada")
+            metrics.incrementar("webhook_mensagens", duplicadas, status="duplicada")
+
+            # Um item na fila por usuário, com todas as mensagens dele neste payload
+            rejeitados = 0
+            for numero, lote in lotes.items():
+                if not get_worker_pool().submit({'from': numero, 'mensagens': lote}):
+                    rejeitados += 1
+                    metrics.incrementar("webhook_mensagens", len(lote), status="rejeitada")
+                    for message in lote:
+                        if message.get('id'):
+                            deduplicator.esquecer(str(message['id']))
+
+            contadores = {
+                "mensagens": len(mensagens),
+                "lotes": len(lotes),
+                "ignoradas": ignoradas,
+                "duplicadas": duplicadas
+            }
+            if rejeitados:
+                # Fila cheia: o WhatsApp reenviará o payload; o que já entrou é descartado como repetido
+                return jsonify({"status": "busy", **contadores}), 503
+            metrics.incrementar(
+                "webhook_mensagens", sum(len(lote) for lote in lotes.values()), status="recebida"
+            )
+            if lotes:
+                return jsonify({"status": "queued", **contadores}), 200
+            status = "duplicate" if duplicadas else "ignored"
+            return jsonify({"status": status, **contadores}), 200
+        except Exception as e:
+            reportar_erro(f"Erro no webhook: {str(e)}")
+            return jsonify({"status": "error", "message": str(e)}), 500
+
+@flask_app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas do processo no formato de exposição do Prometheus"""
+    return Response(metrics.REGISTRY.exportar_prometheus(), mimetype="text/plain; version=0.0.4")
+
+def _formatar_resultado(resultado: dict, salvo: bool) -> str:
+    if not resultado['sucesso']:
+        return resultado['mensagem']
+    if not salvo:
+        return "❌ Erro ao salvar o gasto."
+    return f"""✅ Gasto registrado com sucesso!
+                    
+Categoria: {resultado['categoria']}
+Valor: R$ {resultado['valor']:.2f}
+Descrição: {resultado['descricao']}"""
+
+def _campos_resposta(resultado: dict) -> dict:
+    # Só o que a resposta usa, serializável em JSON para a fila persistente
+    return {campo: resultado.get(campo) for campo in ('sucesso', 'mensagem', 'categoria', 'valor', 'descricao')}
+
+def _formatar_gravados(resultados: list, comprovantes: list, salvos: list) -> list:
+    """Respostas das mensagens de gasto e dos comprovantes, na ordem em que chegaram"""
+    salvos = iter(salvos)
+    respostas = [_formatar_resultado(resultado, resultado['sucesso'] and next(salvos)) for resultado in resultados]
+    for transacoes in comprovantes:
+        if transacoes is None:
+            respostas.append("❌ Não consegui ler o comprovante. Tente enviar outra foto.")
+        elif not transacoes:
+            respostas.append("Não encontrei gastos no comprovante.")
+        else:
+            respostas.extend(
+                _formatar_resultado({**transacao, 'sucesso': True}, next(salvos)) for transacao in transacoes
+            )
+    return respostas
+
+def processar_lote_webhook(lote: dict):
+    """Processa as mensagens de um usuário recebidas juntas (executado pelos workers da fila)
+
+    Os gastos do lote são categorizados juntos e gravados em um único append;
+    o usuário recebe uma resposta com o resultado de cada mensagem. As
+    mensagens concluídas saem de lote['mensagens'] e suas respostas ficam em
+    lote['respostas']: se uma etapa posterior falhar, a fila devolve o mesmo
+    item e a retentativa não grava os gastos de novo.
+    """
+    # Itens gravados na fila persistente antes do lote têm uma única mensagem
+    if 'mensagens' not in lote:
+        mensagem = dict(lote)
+        lote.clear()
+        lote.update({'from': mensagem['from'], 'mensagens': [mensagem]})
+    numero = lote['from']
+    mensagens = lote['mensagens']
+    respostas = lote.setdefault('respostas', [])
+    textos = [message for message in mensagens if mensagem_de_texto(message)]
+    imagens = [message for message in mensagens if mensagem_de_imagem(message)]
+    
+    # Inicializar gerenciadores
+    user_manager = UserManager()
+    
+    # Usuário ainda não completou o onboarding: uma etapa por mensagem, em ordem
+    while textos and user_manager.get_user_state(numero)['status'] != 'active':
+        message = textos.pop(0)
+        respostas.append(user_manager.handle_user_message(numero, message['text']['body']))
+        mensagens.remove(message)
+    
+    if imagens and user_manager.get_user_state(numero)['status'] != 'active':
+        respostas.append("Conclua o cadastro antes de enviar comprovantes.")
+        for message in imagens:
+            mensagens.remove(message)
+        imagens = []
+    
+    if textos or imagens or 'gravados' in lote:
+        # Usuário já ativo, processar normalmente
+        user_data = user_manager.get_user_state(numero)
+        data_manager = DataManager(user_data['sheet_id'])
+        ai_assistant = AIFinanceAssistant(ConfigManager.initialize_openai())
+        
+        gastos = [message for message in textos if message['text']['body'].lower() != 'relatorio']
+        relatorios = [message for message in textos if message not in gastos]
+        if gastos or imagens:
+            resultados = ai_assistant.processar_mensagens(
+                [message['text']['body'] for message in gastos],
+                usuario=numero,
+                agrupar_llm=ConfigManager.get_secret("LLM_BATCH_MESSAGES", "true") == "true"
+            )
+            
+            # Fotos de comprovantes viram um ou mais gastos cada
+            comprovantes = []
+            for message in imagens:
+                try:
+                    comprovantes.append(ai_assistant.processar_comprovante(message['image']['id'])['transacoes'])
+                except Exception as e:
+                    reportar_erro(f"Erro ao processar comprovante: {str(e)}")
+                    comprovantes.append(None)
+            
+            novos = [r for r in resultados if r['sucesso']] + \
+                [transacao for transacoes in comprovantes if transacoes for transacao in transacoes]
+            # Gastos gravados: o resultado fica no item antes de formatar as respostas,
+            # para que nenhuma retentativa a partir daqui os grave de novo
+            salvos = list(data_manager.adicionar_gastos(novos))
+            lote['gravados'] = {
+                'resultados': [_campos_resposta(resultado) for resultado in resultados],
+                'comprovantes': [
+                    None if transacoes is None else [_campos_resposta(transacao) for transacao in transacoes]
+                    for transacoes in comprovantes
+                ],
+                'salvos': salvos
+            }
+            for message in gastos + imagens:
+                mensagens.remove(message)
+        
+        if 'gravados' in lote:
+            respostas.extend(_formatar_gravados(**lote['gravados']))
+            del lote['gravados']
+        
+        if relatorios:
+            relatorio, _ = ai_assistant.gerar_relatorio_mensal(
+                data_manager.get_rollup(meses=[datetime.now().strftime("%Y-%m")]), com_grafico=False
+            )
+            respostas.append(relatorio)
+            for message in relatorios:
+                mensagens.remove(message)
+    
+    if respostas:
+        ConfigManager.send_whatsapp_message(numero, "\n\n".join(respostas))
+
+_deduplicator = None
+_deduplicator_lock = Lock()
+
+def get_deduplicator() -> MessageDeduplicator:
+    """Retorna o índice de mensagens já recebidas"""
+    global _deduplicator
+    with _deduplicator_lock:
+        if _deduplicator is None:
+            _deduplicator = MessageDeduplicator(
+                janela=float(ConfigManager.get_secret("WEBHOOK_DEDUP_WINDOW", "86400")),
+                maxsize=int(ConfigManager.get_secret("WEBHOOK_DEDUP_SIZE", "100000")),
+                path=ConfigManager.get_secret("WEBHOOK_DEDUP_PATH", "") or None
+            )
+            metrics.registrar_coletor("dedup", _deduplicator.stats)
+        return _deduplicator
+
+_worker_pool = None
+_worker_pool_lock = Lock()
+
+def get_worker_pool() -> WorkerPool:
+    """Retorna o pool de workers da fila do webhook, iniciando-o se necessário"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            queue_size = int(ConfigManager.get_secret("WEBHOOK_QUEUE_SIZE", "1000"))
+            if ConfigManager.get_secret("WEBHOOK_QUEUE_BACKEND", "memory") == "sqlite":
+                backend = SQLiteQueueBackend(
+                    ConfigManager.get_secret("WEBHOOK_QUEUE_PATH", "webhook_queue.db"),
+                    maxsize=queue_size
+                )
+            else:
+                backend = MemoryQueueBackend(maxsize=queue_size)
+            
+            _worker_pool = WorkerPool(
+                processar_lote_webhook,
+                backend=backend,
+                num_workers=int(ConfigManager.get_secret("WEBHOOK_WORKERS", "4"))
+            )
+            _worker_pool.start()
+            metrics.registrar_coletor("fila", _worker_pool.metrics)
+        return _worker_pool
+
+def encerrar():
+    """Drena a fila e só então encerra o writer da planilha
+
+    Um único hook garante a ordem: as mensagens drenadas ainda gravam seus
+    gastos antes que o buffer de escrita seja fechado.
+    """
+    with _worker_pool_lock:
+        pool = _worker_pool
+    if pool is not None:
+        pool.drain()
+    SheetsManager.fechar_writer()
+
+atexit.register(encerrar)
+
+_thread_embutida = None
+_thread_embutida_lock = Lock()
+
+def iniciar_em_thread(host: str = "0.0.0.0", port: int = 5000) -> Thread:
+    """Sobe o servidor de desenvolvimento do Flask em uma thread (modo embutido)"""
+    global _thread_embutida
+    with _thread_embutida_lock:
+        if _thread_embutida is None or not _thread_embutida.is_alive():
+            _thread_embutida = Thread(
+                target=lambda: flask_app.run(host=host, port=port, use_reloader=False),
+                name="webhook-embutido",
+                daemon=True
+            )
+            _thread_embutida.start()
+        return _thread_embutida
+
+def serve_webhook(bind: str, workers: int, threads: int, timeout: int = 30):
+    """Executa o webhook no gunicorn com processos e threads configuráveis"""
+    from gunicorn.app.base import BaseApplication
+
+    class WebhookServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", bind)
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", timeout)
+            # O pool da fila e os clientes são criados em cada worker, após o fork
+            self.cfg.set("preload_app", False)
+
+        def load(self):
+            return flask_app
+
+    WebhookServer().run()
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="python -m webhook", description=__doc__.splitlines()[0])
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    serve = comandos.add_parser("serve-webhook", help="Executa o webhook em servidor WSGI de produção")
+    serve.add_argument("--bind", default=os.environ.get("WEBHOOK_BIND", "0.0.0.0:5000"))
+    serve.add_argument("--workers", type=int, default=int(ConfigManager.get_secret("WEBHOOK_PROCESSES", "2")),
+                       help="Processos do servidor")
+    serve.add_argument("--threads", type=int, default=int(ConfigManager.get_secret("WEBHOOK_THREADS", "8")),
+                       help="Threads por processo")
+    serve.add_argument("--timeout", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO"),
+        format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+    )
+    if args.comando == "serve-webhook":
+        serve_webhook(args.bind, args.workers, args.threads, args.timeout)
+
+if __name__ == "__main__":
+    sys.exit(main())
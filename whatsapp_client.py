@@ -0,0 +1,143 @@
+"""Cliente HTTP da API de mensagens do WhatsApp (Graph API)"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+GRAPH_API_URL = "https://graph.facebook.com/v17.0"
+
+# Tamanho máximo do corpo de uma mensagem de texto
+LIMITE_TEXTO = 4096
+
+
+def dividir_mensagem(texto: str, limite: int = LIMITE_TEXTO) -> list:
+    """Divide um texto longo em partes de até limite caracteres, quebrando por linha"""
+    if len(texto) <= limite:
+        return [texto]
+
+    partes = []
+    atual = ""
+    for linha in texto.splitlines(keepends=True):
+        while len(linha) > limite:
+            if atual:
+                partes.append(atual)
+                atual = ""
+            partes.append(linha[:limite])
+            linha = linha[limite:]
+        if len(atual) + len(linha) > limite:
+            partes.append(atual)
+            atual = ""
+        atual += linha
+    if atual:
+        partes.append(atual)
+    return partes
+
+
+class _RetryEnvio(Retry):
+    """Retentativas que não duplicam mensagens
+
+    Um POST só é repetido em 429 ou em falha de conexão (quando a
+    requisição não chegou ao servidor); após um 5xx ou timeout de leitura a
+    mensagem pode já ter sido aceita. GETs seguem as regras normais.
+    """
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method and method.upper() == "POST":
+            return status_code == 429
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class WhatsAppClient:
+    """Envia mensagens reutilizando conexões, com timeout e retentativas
+
+    A sessão mantém um pool de conexões keep-alive com o Graph API. Envios
+    são retentados em 429 e falhas de conexão; downloads de mídia também em
+    5xx, com backoff exponencial (respeitando Retry-After). base_url pode
+    apontar para um servidor simulado local.
+    """
+    def __init__(self, token: str, phone_number_id: str, base_url: str = GRAPH_API_URL,
+                 timeout: tuple = (3.05, 10), max_tentativas: int = 3, backoff: float = 0.5,
+                 pool_maxsize: int = 20, max_paralelo: int = 8):
+        self.base_url = base_url.rstrip('/')
+        self.url = f"{self.base_url}/{phone_number_id}/messages"
+        self.timeout = timeout
+
+        retry = _RetryEnvio(
+            total=max_tentativas,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        })
+        self._executor = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="whatsapp-sender")
+
+    def _post(self, phone_number: str, body: str) -> bool:
+        data = {
+            "messaging_product": "whatsapp",
+            "to": phone_number,
+            "type": "text",
+            "text": {"body": body}
+        }
+        with metrics.medir("whatsapp_send"):
+            response = self.session.post(self.url, json=data, timeout=self.timeout)
+        # Tentativas feitas pelo urllib3 antes desta resposta
+        historico = getattr(getattr(response.raw, "retries", None), "history", None) or ()
+        if historico:
+            metrics.incrementar("retentativas", len(historico), servico="whatsapp")
+            metrics.incrementar("rate_limited", sum(1 for h in historico if h.status == 429), servico="whatsapp")
+        if response.status_code != 200:
+            logger.warning("WhatsApp respondeu %s: %s", response.status_code, response.text[:200])
+        return response.status_code == 200
+
+    def send_text(self, phone_number: str, message: str) -> bool:
+        """Envia uma mensagem de texto, dividindo-a em partes se for longa"""
+        return all([self._post(phone_number, parte) for parte in dividir_mensagem(message)])
+
+    def send_text_async(self, phone_number: str, message: str) -> Future:
+        """Agenda o envio e retorna um Future com o resultado (bool)"""
+        return self._executor.submit(self.send_text, phone_number, message)
+
+    def send_many(self, mensagens: list) -> list:
+        """Envia vários (telefone, mensagem) em paralelo e retorna os resultados na ordem"""
+        futures = [self.send_text_async(phone_number, message) for phone_number, message in mensagens]
+        resultados = []
+        for future in futures:
+            try:
+                resultados.append(future.result())
+            except Exception as e:
+                logger.error("Erro ao enviar mensagem WhatsApp: %s", e)
+                resultados.append(False)
+        return resultados
+
+    def baixar_midia(self, media_id: str, max_bytes: int = 16 * 1024 * 1024) -> bytes:
+        """Baixa o conteúdo de uma mídia recebida (a URL do Graph API expira em minutos)"""
+        response = self.session.get(f"{self.base_url}/{media_id}", timeout=self.timeout)
+        response.raise_for_status()
+        url = response.json()["url"]
+
+        with self.session.get(url, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            conteudo = bytearray()
+            for pedaco in response.iter_content(chunk_size=64 * 1024):
+                conteudo.extend(pedaco)
+                if len(conteudo) > max_bytes:
+                    raise ValueError(f"Mídia {media_id} maior que {max_bytes} bytes")
+        return bytes(conteudo)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()